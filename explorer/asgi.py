@@ -3,6 +3,11 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve through it (e.g. ``uvicorn explorer.asgi:application``) to run the
+async Spotify views and to serve download progress streams
+(/api/download/events/<task_id>/), which hold no thread while open. Under
+WSGI that endpoint answers 503 and the page polls instead.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
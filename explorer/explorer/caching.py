@@ -0,0 +1,98 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 30
+WAIT_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+STATS_KEYS = ('value-cache:hits', 'value-cache:misses', 'value-cache:waits')
+
+
+def _count(name):
+    try:
+        cache.incr(name)
+    except ValueError:
+        if not cache.add(name, 1, timeout=None):
+            cache.incr(name)
+
+
+def _cached_or_lock(key):
+    """
+    Returns (entry, owns_lock). On a miss only one caller in the cluster gets
+    the lock and recomputes; the others wait for its result, falling back to
+    recomputing themselves if it doesn't show up within WAIT_TIMEOUT.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        _count('value-cache:hits')
+        return entry, False
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        _count('value-cache:misses')
+        return None, True
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            _count('value-cache:waits')
+            return entry, False
+        if not cache.get(lock_key):
+            # Either the owner just finished or it gave up on an error response.
+            entry = cache.get(key)
+            if entry is not None:
+                _count('value-cache:waits')
+                return entry, False
+            break
+    _count('value-cache:misses')
+    return None, cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+
+
+def cached_value(key, compute, timeout):
+    """
+    Get-or-compute for a plain value in the shared cache, with
+    lock-and-recompute so an expiring entry is rebuilt once rather than by
+    every concurrent request. `compute()` returns (value, error) and only
+    error-free values are stored; so does this.
+    """
+    entry, owns_lock = _cached_or_lock(key)
+    if entry is not None:
+        return entry, None
+    try:
+        value, error = compute()
+        if error is None:
+            cache.set(key, value, timeout)
+        return value, error
+    finally:
+        if owns_lock:
+            cache.delete(f'{key}:lock')
+
+
+async def acached_value(key, compute, timeout):
+    """`cached_value` for a `compute()` that returns an awaitable."""
+    entry, owns_lock = await sync_to_async(_cached_or_lock, thread_sensitive=False)(key)
+    if entry is not None:
+        return entry, None
+    try:
+        value, error = await compute()
+        if error is None:
+            await sync_to_async(cache.set)(key, value, timeout)
+        return value, error
+    finally:
+        if owns_lock:
+            await sync_to_async(cache.delete)(f'{key}:lock')
+
+
+def get_value_cache_stats():
+    """Cluster-wide counters. `waits` are requests served by someone else's recompute."""
+    hits, misses, waits = (cache.get(name) or 0 for name in STATS_KEYS)
+    lookups = hits + misses + waits
+    return {
+        'hits': hits,
+        'misses': misses,
+        'waits': waits,
+        'hit_ratio': round((hits + waits) / lookups, 3) if lookups else 0.0,
+    }
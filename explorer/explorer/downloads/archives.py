@@ -0,0 +1,357 @@
+"""
+Playlist archives under DOWNLOADS['ROOT'].
+
+Archives are zips with STORED entries: MP3, Opus and AAC don't compress,
+so deflating them only costs CPU. A finished archive is served straight from disk with
+byte-range support and removed ARCHIVE_TTL seconds after the job finished.
+
+Streaming jobs have no finished archive. The worker publishes each track
+into the job's directory as it finishes, and `stream_archive` sends it on
+as the next entry of a zip written with data descriptors (sizes and CRCs
+after the data), deleting it once sent. Disk then only ever holds the
+tracks the client hasn't received yet. `astream_archive` does the same
+under ASGI, where Django would otherwise collect a sync iterator into a
+list and send nothing until the job ended.
+"""
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+
+from asgiref.sync import sync_to_async
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+from yt_dlp.utils import sanitize_filename
+
+from ..models import DownloadJob
+from .jobs import get_download_settings
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def archive_name(title, taken, extension='mp3'):
+    """A unique file name for a zip entry; `taken` collects names used so far."""
+    base = sanitize_filename(title) or 'track'
+    name, n = f'{base}.{extension}', 1
+    while name in taken:
+        n += 1
+        name = f'{base} ({n}).{extension}'
+    taken.add(name)
+    return name
+
+
+def _extension(path):
+    return os.path.splitext(path)[1].lstrip('.')
+
+
+def write_archive(job, files):
+    """Zip `files`, a list of TrackFile, under DOWNLOADS['ROOT']. Returns the archive path."""
+    root = get_download_settings()['ROOT']
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f'{job.pk}.zip')
+    names = set()
+    # Written under a temporary name of its own so a half-written archive is
+    # never served, nor written into by another attempt at the same job.
+    fd, partial = tempfile.mkstemp(dir=root, prefix=f'{job.pk}.', suffix='.zip.part')
+    with os.fdopen(fd, 'wb') as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as zip_file:
+        for track in files:
+            zip_file.write(track.path, archive_name(track.title, names, _extension(track.path)))
+    os.replace(partial, path)
+    return path
+
+
+def job_dir(job):
+    return os.path.join(get_download_settings()['ROOT'], str(job.pk))
+
+
+def publish_track(job, index, track):
+    """
+    Hand a finished track to the job's stream. The file belongs to the audio
+    cache, so it's hard-linked (or copied, across filesystems) under a
+    temporary name; the rename makes it appear whole.
+    """
+    directory = job_dir(job)
+    os.makedirs(directory, exist_ok=True)
+    name = f'{index:05d}-{sanitize_filename(track.title) or "track"}.{_extension(track.path)}'
+    target = os.path.join(directory, name)
+    try:
+        os.link(track.path, target + '.part')
+    except OSError:
+        shutil.copyfile(track.path, target + '.part')
+    os.replace(target + '.part', target)
+
+
+def _published(directory):
+    """Published tracks not yet claimed by a stream, in playlist order."""
+    try:
+        return sorted(name for name in os.listdir(directory) if not name.endswith(('.part', '.sending')))
+    except FileNotFoundError:
+        return []
+
+
+class _StreamBuffer:
+    """
+    A write-only sink for `ZipFile`. It can't seek, so zipfile writes each
+    entry with a data descriptor instead of going back to patch its header.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _stream_zip(job, sent):
+    """
+    The zip behind `stream_archive` and `astream_archive`, which do the
+    waiting. Yields chunks of it, or None when nothing is ready to send;
+    the caller then sends back whether the job is over. The index of each
+    track written whole is appended to `sent`.
+    """
+    directory = job_dir(job)
+    buffer = _StreamBuffer()
+    names = set()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+        while True:
+            published = _published(directory)
+            for name in published:
+                path = os.path.join(directory, name)
+                sending = path + '.sending'
+                try:
+                    os.rename(path, sending)  # claim it, in case of a second stream
+                except FileNotFoundError:
+                    continue
+                title, extension = os.path.splitext(name[6:])
+                entry = zipfile.ZipInfo(archive_name(title, names, extension.lstrip('.')), datetime.now().timetuple()[:6])
+                finished = False
+                try:
+                    with open(sending, 'rb') as source, archive.open(entry, 'w') as target:
+                        while chunk := source.read(CHUNK_SIZE):
+                            target.write(chunk)
+                            yield buffer.drain()
+                    finished = True
+                    sent.append(int(name[:5]))
+                finally:
+                    # If the client went away mid-track, leave it for the next stream.
+                    if finished:
+                        os.remove(sending)
+                    else:
+                        os.replace(sending, path)
+                yield buffer.drain()
+
+            if not published:
+                over = yield None
+                if over and not _published(directory):
+                    break
+    yield buffer.drain()
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def _step(chunks, value=None):
+    """(next chunk, whether `chunks` is exhausted)."""
+    try:
+        return chunks.send(value), False
+    except StopIteration:
+        return None, True
+
+
+def stream_archive(job, poll_interval=None, on_sent=None):
+    """
+    Yield a zip of the job's tracks as the worker publishes them, ending
+    once the job is over and everything published has been sent. For WSGI,
+    where it holds its thread for as long as the job runs. `on_sent` is
+    called with the indices of the tracks in the zip once the server has
+    sent its last chunk on; not if the client went away before that.
+    """
+    poll_interval = poll_interval or get_download_settings()['POLL_INTERVAL']
+    sent = []
+    chunks = _stream_zip(job, sent)
+    try:
+        chunk, exhausted = _step(chunks)
+        while not exhausted:
+            if chunk is not None:
+                yield chunk
+                chunk, exhausted = _step(chunks)
+                continue
+            job.refresh_from_db(fields=['status'])
+            over = job.status not in (DownloadJob.PENDING, DownloadJob.DOWNLOADING)
+            if not over:
+                time.sleep(poll_interval)
+            chunk, exhausted = _step(chunks, over)
+        if on_sent:
+            on_sent(sent)
+    finally:
+        chunks.close()
+
+
+async def astream_archive(job, poll_interval=None, on_sent=None):
+    """
+    `stream_archive` for ASGI: waits without holding a thread, and reads the
+    files off the event loop.
+    """
+    poll_interval = poll_interval or get_download_settings()['POLL_INTERVAL']
+    sent = []
+    chunks = _stream_zip(job, sent)
+    step = sync_to_async(_step, thread_sensitive=False)
+    try:
+        chunk, exhausted = await step(chunks)
+        while not exhausted:
+            if chunk is not None:
+                yield chunk
+                chunk, exhausted = await step(chunks)
+                continue
+            await sync_to_async(job.refresh_from_db)(fields=['status'])
+            over = job.status not in (DownloadJob.PENDING, DownloadJob.DOWNLOADING)
+            if not over:
+                await asyncio.sleep(poll_interval)
+            chunk, exhausted = await step(chunks, over)
+        if on_sent:
+            await sync_to_async(on_sent)(sent)
+    finally:
+        try:
+            await sync_to_async(chunks.close, thread_sensitive=False)()
+        except ValueError:
+            pass  # cancelled mid-step; the generator is closed once collected
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to send the
+    whole file (no header, or a form we don't serve, like multiple ranges),
+    or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start, end = int(start), min(int(end) if end else size - 1, size - 1)
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read(path, start, length, on_sent=None):
+    """
+    `length` bytes of `path` from `start`. `on_sent` is called once the
+    server asks for more after the last chunk, that is once it has sent
+    them all; a client that goes away first never gets there.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    if on_sent and length == 0:
+        on_sent()
+
+
+async def _aread(path, start, length, on_sent=None):
+    """`_read` for ASGI, reading the file off the event loop."""
+    chunks = _read(path, start, length)
+    step = sync_to_async(_step, thread_sensitive=False)
+    while length > 0:
+        chunk, exhausted = await step(chunks)
+        if exhausted:
+            return
+        yield chunk
+        length -= len(chunk)
+    if on_sent:
+        # The client has every byte and may hang up right away, which
+        # cancels the response; the delivery happened all the same.
+        await asyncio.shield(sync_to_async(on_sent)())
+
+
+def archive_response(request, path, filename, on_sent=None, asynchronous=False):
+    """
+    The archive at `path` as an attachment, honouring a single `Range`
+    (and `If-Range`) so interrupted downloads can resume. `on_sent` is
+    called once a response has sent the archive's last byte, whether it
+    sent the whole file or resumed it. Pass `asynchronous` under ASGI, where
+    Django would collect a sync iterator whole before sending any of it.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = f'"{int(stat.st_mtime)}-{size}"'
+
+    byte_range = parse_range(request.headers.get('Range'), size)
+    if_range = request.headers.get('If-Range')
+    if byte_range is not None and if_range and if_range != etag:
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range or on_sent:
+        start, end = byte_range or (0, size - 1)
+        if end < size - 1:
+            on_sent = None
+        if asynchronous:
+            chunks = _aread(path, start, end - start + 1, on_sent)
+        else:
+            chunks = _read(path, start, end - start + 1, on_sent)
+        response = StreamingHttpResponse(chunks, status=206 if byte_range else 200, content_type='application/zip')
+        response['Content-Length'] = str(end - start + 1)
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    else:
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type='application/zip')
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    return response
+
+
+def expire_archives():
+    """
+    Delete archives of jobs finished more than ARCHIVE_TTL seconds ago and
+    mark those jobs EXPIRED, along with anything else under ROOT that old
+    (a `.part` left by a crashed worker, tracks of an abandoned stream).
+    Returns how many jobs expired.
+    """
+    config = get_download_settings()
+    ttl = config['ARCHIVE_TTL']
+    expired = DownloadJob.objects.filter(
+        status=DownloadJob.COMPLETED, finished_at__lt=timezone.now() - timedelta(seconds=ttl),
+    )
+    count = 0
+    for job in expired.only('pk', 'archive_path'):
+        if job.archive_path and os.path.exists(job.archive_path):
+            os.remove(job.archive_path)
+        count += DownloadJob.objects.filter(pk=job.pk, status=DownloadJob.COMPLETED).update(
+            status=DownloadJob.EXPIRED, archive_path='',
+        )
+
+    root = config['ROOT']
+    if os.path.isdir(root):
+        cutoff = time.time() - ttl
+        for entry in os.scandir(root):
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)  # tracks of a stream nobody collected
+            else:
+                os.remove(entry.path)
+    return count
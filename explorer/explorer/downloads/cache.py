@@ -0,0 +1,207 @@
+"""
+Shared on-disk cache of finished audio files, reused across users,
+playlists and jobs.
+
+Entries are keyed by (Spotify track id, output format) in the `CachedAudio`
+table, while the files themselves are content-addressed: stored once under
+their sha256 digest, so two tracks that resolve to the same audio share a
+file. A hit is checked against the recorded size before use; `verify`
+re-hashes everything. Once the cache outgrows QUOTA bytes, the least
+recently used entries are evicted, except those used since the oldest
+running download job started: that job may still be reading them.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Count, Min, Sum
+from django.utils import timezone
+
+from ..models import CachedAudio, DownloadJob
+
+DEFAULTS = {
+    'ROOT': 'audio-cache',
+    'QUOTA': 10 * 1024 ** 3,  # bytes
+}
+
+# A track ready to go into an archive.
+TrackFile = namedtuple('TrackFile', 'path title video_id')
+
+HASH_CHUNK = 1024 * 1024
+
+
+def get_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'AUDIO_CACHE', {})}
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AudioCache:
+    def __init__(self, root=None, quota=None):
+        config = get_cache_settings()
+        self.root = str(root or config['ROOT'])
+        self.quota = quota or config['QUOTA']
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.corrupt = 0
+        self.evictions = 0
+
+    def path(self, digest, fmt):
+        extension = fmt.split('-')[0]
+        return os.path.join(self.root, digest[:2], f'{digest}.{extension}')
+
+    def _drop(self, entries):
+        """Delete entries, and their files once nothing else points at them."""
+        entries = list(entries)
+        CachedAudio.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+        still_used = set(
+            CachedAudio.objects.filter(digest__in={entry.digest for entry in entries})
+            .values_list('digest', 'format')
+        )
+        for entry in entries:
+            if (entry.digest, entry.format) not in still_used:
+                try:
+                    os.remove(self.path(entry.digest, entry.format))
+                except FileNotFoundError:
+                    pass
+
+    def get_many(self, track_ids, fmt):
+        """{track_id: TrackFile} for the cached ones among `track_ids`, marking them used."""
+        found, broken = {}, []
+        entries = CachedAudio.objects.filter(spotify_track_id__in=set(track_ids), format=fmt)
+        # Marked used before the files are checked, so `evict` leaves them be.
+        entries.update(last_used_at=timezone.now())
+        for entry in entries:
+            path = self.path(entry.digest, fmt)
+            try:
+                intact = os.path.getsize(path) == entry.size
+            except OSError:
+                intact = False
+            if intact:
+                found[entry.spotify_track_id] = TrackFile(path, entry.title, entry.youtube_video_id)
+            else:
+                broken.append(entry)
+        if broken:
+            self._drop(broken)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(set(track_ids)) - len(found)
+            self.corrupt += len(broken)
+        return found
+
+    def put(self, track_id, fmt, track_file):
+        """Move a finished file into the cache. Returns its cached TrackFile."""
+        digest = file_digest(track_file.path)
+        path = self.path(digest, fmt)
+        # The row goes first: if that fails the file is left where it was,
+        # and a row whose file never arrives is dropped by the size check.
+        CachedAudio.objects.update_or_create(
+            spotify_track_id=track_id, format=fmt,
+            defaults={
+                'digest': digest, 'size': os.path.getsize(track_file.path), 'title': track_file.title[:255],
+                'youtube_video_id': track_file.video_id or '', 'last_used_at': timezone.now(),
+            },
+        )
+        if os.path.exists(path):
+            os.remove(track_file.path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Copy next to the target first (the source may be on another
+            # filesystem), then rename so the file appears whole.
+            fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+            os.close(fd)
+            shutil.move(track_file.path, partial)
+            os.replace(partial, path)
+        with self._lock:
+            self.stored += 1
+        return TrackFile(path, track_file.title, track_file.video_id)
+
+    def size(self):
+        return CachedAudio.objects.aggregate(total=Sum('size'))['total'] or 0
+
+    def evict(self):
+        """
+        Drop least recently used entries until the cache fits QUOTA, or only
+        entries still in use are left. Returns how many were dropped.
+        """
+        total = self.size()
+        evicted = 0
+        candidates = CachedAudio.objects.order_by('last_used_at')
+        # Every entry a running job took or stored was used after it started.
+        in_use_since = DownloadJob.objects.filter(status=DownloadJob.DOWNLOADING).aggregate(
+            since=Min('started_at'),
+        )['since']
+        if in_use_since:
+            candidates = candidates.filter(last_used_at__lt=in_use_since)
+        while total > self.quota:
+            batch = list(candidates[:100])
+            if not batch:
+                break
+            victims = []
+            for entry in batch:
+                if total <= self.quota:
+                    break
+                victims.append(entry)
+                total -= entry.size
+            self._drop(victims)
+            evicted += len(victims)
+        with self._lock:
+            self.evictions += evicted
+        return evicted
+
+    def verify(self):
+        """Re-hash every cached file and drop entries that don't match. Returns (checked, dropped)."""
+        checked, broken = 0, []
+        for entry in CachedAudio.objects.iterator():
+            checked += 1
+            path = self.path(entry.digest, entry.format)
+            if not os.path.exists(path) or file_digest(path) != entry.digest:
+                broken.append(entry)
+        if broken:
+            self._drop(broken)
+        with self._lock:
+            self.corrupt += len(broken)
+        return checked, len(broken)
+
+    def stats(self):
+        """This process's counters, plus what the whole cache holds."""
+        usage = CachedAudio.objects.aggregate(entries=Count('pk'), bytes=Sum('size'))
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': usage['entries'],
+                'bytes': usage['bytes'] or 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stored': self.stored,
+                'corrupt': self.corrupt,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'quota': self.quota,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_audio_cache():
+    """Process-wide `AudioCache`, built lazily from `settings.AUDIO_CACHE`."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AudioCache()
+    return _cache
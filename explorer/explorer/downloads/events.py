@@ -0,0 +1,131 @@
+"""
+Download progress pushed to the browser as Server-Sent Events.
+
+The worker publishes an event per finished track and one when the job
+ends, on a Redis channel per job. `astream` turns a job's channel into an
+event stream for a response. It's only served under ASGI (see
+explorer/asgi.py), where a connection costs no thread while it waits;
+under WSGI each open tab would hold a worker for the whole job, so the page
+polls DownloadStatus instead. Without REDIS_URL there is no channel between
+the worker and the web processes, so the stream reads the job row every
+DOWNLOADS['POLL_INTERVAL'] seconds instead; still a single query rather
+than a full authenticated request per client poll.
+
+Events:
+    status  the job as DownloadStatus reports it; sent first
+    track   {index, name, ok, completed, total} as each track finishes
+    done    {status, message} once the job is over; the stream then ends
+"""
+import asyncio
+import json
+import threading
+
+import redis
+import redis.asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from ..models import DownloadJob
+from .jobs import get_download_settings, job_status
+
+# Seconds between keep-alive comments, so proxies don't drop an idle stream.
+HEARTBEAT = 15
+RUNNING = (DownloadJob.PENDING, DownloadJob.DOWNLOADING)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def channel(job_id):
+    return f'download-events:{job_id}'
+
+
+def get_redis():
+    """Process-wide Redis client for publishing, or None without REDIS_URL."""
+    global _client
+    if _client is None and settings.REDIS_URL:
+        with _client_lock:
+            if _client is None:
+                _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+def publish(job, event, **data):
+    """Send an event to whoever is watching `job`. Never fails the job."""
+    client = get_redis()
+    if client is None:
+        return
+    try:
+        client.publish(channel(job.pk), json.dumps({'event': event, 'data': data}))
+    except redis.RedisError as e:
+        print(f"Failed to publish {event} for download job {job.pk}: {e}")
+
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def _done(job):
+    return sse('done', {'status': job.status, 'message': job_status(job).get('message', '')})
+
+
+def _message(raw):
+    """An SSE frame for a pub/sub message, and whether it ends the stream."""
+    message = json.loads(raw['data'])
+    return sse(message['event'], message['data']), message['event'] == 'done'
+
+
+async def _poll(job):
+    """Changes to the job row, as events, until it's over."""
+    interval = get_download_settings()['POLL_INTERVAL']
+    last, idle = None, 0
+    while True:
+        await sync_to_async(job.refresh_from_db)()
+        state = job_status(job)
+        if state != last:
+            last, idle = state, 0
+            yield sse('status', state)
+        if job.status not in RUNNING:
+            yield _done(job)
+            return
+        await asyncio.sleep(interval)
+        idle += interval
+        if idle >= HEARTBEAT:
+            idle = 0
+            yield ': keep-alive\n\n'
+
+
+async def astream(job):
+    """Events for `job` until it's over."""
+    if not settings.REDIS_URL:
+        async for frame in _poll(job):
+            yield frame
+        return
+    client = redis.asyncio.Redis.from_url(settings.REDIS_URL)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    try:
+        # Subscribed before reading the row, so nothing in between is missed.
+        await pubsub.subscribe(channel(job.pk))
+        await sync_to_async(job.refresh_from_db)()
+        yield sse('status', job_status(job))
+        if job.status not in RUNNING:
+            yield _done(job)
+            return
+        while True:
+            raw = await pubsub.get_message(timeout=HEARTBEAT)
+            if raw is None:
+                # Quiet for a while: make sure the job didn't end unannounced
+                # (failed by `requeue_stale` after its worker died).
+                await sync_to_async(job.refresh_from_db)(fields=['status', 'message'])
+                if job.status not in RUNNING:
+                    yield _done(job)
+                    return
+                yield ': keep-alive\n\n'
+                continue
+            frame, done = _message(raw)
+            yield frame
+            if done:
+                return
+    finally:
+        await pubsub.aclose()
+        await client.aclose()
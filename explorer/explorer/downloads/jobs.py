@@ -0,0 +1,266 @@
+"""
+Database-backed queue of playlist download jobs.
+
+The API enqueues `DownloadJob` rows and reads their state back, so any web
+process can answer a status poll. `manage.py download_worker` processes
+claim jobs with a compare-and-set update, so two workers never run the same
+job. Jobs are taken round robin between users (each user's oldest job
+first), at most MAX_JOBS_PER_USER at a time. A job whose worker
+stopped heartbeating for STALE_AFTER seconds is put back in the queue, up
+to MAX_ATTEMPTS times.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F, Max, Min
+from django.utils import timezone
+
+from ..models import DeliveredTrack, DownloadJob
+from ..spotify.library import bulk_upsert
+
+DEFAULTS = {
+    'ROOT': 'downloads',  # where finished archives are written
+    'ARCHIVE_TTL': 60 * 60 * 24,  # seconds an archive is kept after its job finished
+    'WORKERS': 4,  # jobs one worker process runs at a time
+    'MAX_JOBS_PER_USER': 1,
+    'POLL_INTERVAL': 2,
+    'STALE_AFTER': 60 * 10,
+    'HEARTBEAT_INTERVAL': 30,  # seconds between a running job's heartbeats
+    'MAX_ATTEMPTS': 3,
+    # Per worker process, shared by its jobs (see pipeline.py).
+    'SEARCH_CONCURRENCY': 4,
+    'DOWNLOAD_CONCURRENCY': 4,
+    'TRANSCODE_CONCURRENCY': None,  # None: one per core
+    'TRACKS_IN_FLIGHT': 6,  # tracks one job has in those pools at once
+    'DEFAULT_FORMAT': 'mp3-192k',  # a key of transcode.FORMATS
+    'MATCH_MISS_TTL': 60 * 60 * 24 * 7,  # seconds a search without result is remembered (see matches.py)
+    'FFMPEG': 'ffmpeg',
+    'TOKEN_TTL': 60 * 60,  # seconds a job's download token is accepted (see job_token)
+}
+
+TOKEN_SALT = 'explorer.downloads.job'
+
+
+def get_download_settings():
+    return {**DEFAULTS, **getattr(settings, 'DOWNLOADS', {})}
+
+
+def job_tracks(items):
+    """The parts of playlist track items a worker needs."""
+    return [
+        {
+            'id': item['track'].get('id'),
+            'name': item['track'].get('name'),
+            'artists': [artist.get('name') for artist in item['track'].get('artists', [])],
+        }
+        for item in items if item.get('track')
+    ]
+
+
+def delivered_tracks(user, playlist_id):
+    """
+    {spotify id: track} for the tracks of a playlist that a download has
+    handed to `user`, shaped like `job_tracks`.
+    """
+    return {
+        track_id: {'id': track_id, 'name': title, 'artists': artists}
+        for track_id, title, artists in DeliveredTrack.objects.filter(user=user, playlist_id=playlist_id).values_list(
+            'spotify_track_id', 'title', 'artists',
+        )
+    }
+
+
+def record_delivery(job, indices):
+    """
+    Note that the tracks of `job` at `indices` reached its user, and forget
+    the removed ones the job reported: the user has been told about those.
+    Called once the user has the file, not when the worker made it.
+    """
+    now = timezone.now()
+    rows = [
+        DeliveredTrack(
+            user_id=job.user_id, playlist_id=job.playlist_id, spotify_track_id=track['id'],
+            title=(track.get('name') or '')[:255], artists=track.get('artists') or [], delivered_at=now,
+        )
+        for track in (job.tracks[index] for index in indices) if track.get('id')
+    ]
+    bulk_upsert(DeliveredTrack, rows, ['user', 'playlist_id', 'spotify_track_id'], ['title', 'artists', 'delivered_at'])
+    if job.removed:
+        DeliveredTrack.objects.filter(
+            user_id=job.user_id, playlist_id=job.playlist_id, spotify_track_id__in=[track['id'] for track in job.removed],
+        ).delete()
+
+
+def split_delta(items, delivered):
+    """
+    (playlist items not delivered yet, delivered tracks no longer in
+    `items`). Local files have no id to recognise them by, so they're
+    always kept.
+    """
+    current = {item['track'].get('id') for item in items if item.get('track')}
+    added = [item for item in items if not (item.get('track') and item['track'].get('id') in delivered)]
+    removed = [track for track_id, track in delivered.items() if track_id not in current]
+    return added, removed
+
+
+def enqueue(user, playlist_id, playlist_name, items, stream=False, fmt=None, delta=False, removed=()):
+    tracks = job_tracks(items)
+    return DownloadJob.objects.create(
+        user=user, playlist_id=playlist_id, playlist_name=playlist_name, tracks=tracks, total=len(tracks),
+        stream=stream, format=fmt or get_download_settings()['DEFAULT_FORMAT'], delta=delta, removed=list(removed),
+    )
+
+
+def job_token(job):
+    """
+    A signed token standing in for the owner's credentials on requests the
+    browser makes itself (a download link, an EventSource), which can't
+    carry an Authorization header. It only grants access to this job, and
+    only for DOWNLOADS['TOKEN_TTL'] seconds.
+    """
+    return signing.dumps(str(job.pk), salt=TOKEN_SALT)
+
+
+def token_allows(token, job):
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=get_download_settings()['TOKEN_TTL']) == str(job.pk)
+    except signing.BadSignature:  # tampered with, or expired
+        return False
+
+
+def find_job(job_id):
+    try:
+        return DownloadJob.objects.filter(pk=job_id).first()
+    except ValidationError:  # not a UUID
+        return None
+
+
+def claim_next(worker_id):
+    """
+    Take the next job for `worker_id`, or None if nothing is runnable. Two
+    workers may both pass the per-user check at once, so the cap can be
+    exceeded by a job briefly; a job itself is only ever claimed once.
+    """
+    config = get_download_settings()
+    running = dict(
+        DownloadJob.objects.filter(status=DownloadJob.DOWNLOADING)
+        .values('user_id').annotate(jobs=Count('pk')).values_list('user_id', 'jobs')
+    )
+    oldest = {}
+    pending = DownloadJob.objects.filter(status=DownloadJob.PENDING).order_by('created_at')
+    for pk, user_id in pending.values_list('pk', 'user_id')[:500]:
+        oldest.setdefault(user_id, pk)
+
+    # Round robin: users with the fewest running jobs first, then whoever
+    # was served least recently (never served first), then the oldest job.
+    last_served = dict(
+        DownloadJob.objects.filter(user_id__in=list(oldest), started_at__isnull=False)
+        .values('user_id').annotate(last=Max('started_at')).values_list('user_id', 'last')
+    )
+
+    def turn(candidate):
+        last = last_served.get(candidate[0])
+        return running.get(candidate[0], 0), last is not None, last or 0
+
+    for user_id, pk in sorted(oldest.items(), key=turn):
+        if running.get(user_id, 0) >= config['MAX_JOBS_PER_USER']:
+            break
+        now = timezone.now()
+        claimed = DownloadJob.objects.filter(pk=pk, status=DownloadJob.PENDING).update(
+            status=DownloadJob.DOWNLOADING, worker=worker_id, attempts=F('attempts') + 1,
+            started_at=now, heartbeat_at=now, completed=0, message='',
+        )
+        if claimed:
+            return DownloadJob.objects.get(pk=pk)
+    return None
+
+
+def job_status(job):
+    """The job as DownloadStatus and the progress events report it."""
+    data = {
+        'status': job.status,
+        'completed': job.completed,
+        'total': job.total,
+        'stream': job.stream,
+        'format': job.format,
+        'delta': job.delta,
+        'removed': job.removed,
+    }
+    if job.status == DownloadJob.FAILED:
+        data['message'] = job.message or 'An unknown error occurred.'
+    elif job.status == DownloadJob.EXPIRED:
+        data['message'] = 'This download has expired.'
+    return data
+
+
+def _claimed(job):
+    """
+    `job`'s row, as long as the claim `job` was loaded with still holds. Once
+    a job is requeued and claimed again, its first worker's writes match
+    nothing and are dropped.
+    """
+    return DownloadJob.objects.filter(
+        pk=job.pk, status=DownloadJob.DOWNLOADING, worker=job.worker, attempts=job.attempts,
+    )
+
+
+def update_progress(job, completed):
+    """Record progress; doubles as the job's heartbeat. Returns False if the job is no longer this worker's."""
+    job.completed = completed
+    return bool(_claimed(job).update(completed=completed, heartbeat_at=timezone.now()))
+
+
+def heartbeat(job):
+    """Mark the job's worker alive. Returns False if the job is no longer this worker's."""
+    return bool(_claimed(job).update(heartbeat_at=timezone.now()))
+
+
+def complete(job, archive_path, fetched=()):
+    """
+    `fetched` are the indices of the tracks in the download. Returns False,
+    writing nothing, if the job is no longer this worker's.
+    """
+    job.fetched = list(fetched)
+    return bool(_claimed(job).update(
+        status=DownloadJob.COMPLETED, archive_path=archive_path, fetched=job.fetched, finished_at=timezone.now(),
+    ))
+
+
+def fail(job, message):
+    """Returns False, writing nothing, if the job is no longer this worker's."""
+    return bool(_claimed(job).update(
+        status=DownloadJob.FAILED, message=message, finished_at=timezone.now(),
+    ))
+
+
+def requeue_stale():
+    """Return jobs of dead workers to the queue, or fail them after MAX_ATTEMPTS. Returns (requeued, failed)."""
+    config = get_download_settings()
+    stale = DownloadJob.objects.filter(
+        status=DownloadJob.DOWNLOADING,
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=config['STALE_AFTER']),
+    )
+    failed = stale.filter(attempts__gte=config['MAX_ATTEMPTS']).update(
+        status=DownloadJob.FAILED, message='The download worker stopped responding.', finished_at=timezone.now(),
+    )
+    requeued = stale.update(status=DownloadJob.PENDING, worker='')
+    return requeued, failed
+
+
+def queue_stats():
+    by_status = dict(DownloadJob.objects.values('status').annotate(jobs=Count('pk')).values_list('status', 'jobs'))
+    pending = DownloadJob.objects.filter(status=DownloadJob.PENDING)
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    running = DownloadJob.objects.filter(status=DownloadJob.DOWNLOADING)
+    return {
+        'pending': by_status.get(DownloadJob.PENDING, 0),
+        'running': by_status.get(DownloadJob.DOWNLOADING, 0),
+        'completed': by_status.get(DownloadJob.COMPLETED, 0),
+        'failed': by_status.get(DownloadJob.FAILED, 0),
+        'expired': by_status.get(DownloadJob.EXPIRED, 0),
+        'pending_users': pending.values('user_id').distinct().count(),
+        'oldest_pending_seconds': round((timezone.now() - oldest).total_seconds(), 1) if oldest else 0.0,
+        'workers': running.values('worker').distinct().count(),
+    }
@@ -0,0 +1,68 @@
+"""
+Persistent index of which YouTube video each track resolved to, so a track
+is only ever searched for once.
+
+Matches are stored under two keys: the Spotify track id, and a digest of
+the normalized title and artists, which also covers the same song under
+another id (a single and its album release, regional copies). Searches
+that found nothing are remembered too, for DOWNLOADS['MATCH_MISS_TTL']
+seconds, after which the track is searched again.
+"""
+import hashlib
+import re
+import unicodedata
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ..models import TrackMatch
+from ..spotify.library import bulk_upsert
+from .jobs import get_download_settings
+
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize(name, artists):
+    """Title and artists folded to lowercase ASCII words, artists in a stable order."""
+    def fold(text):
+        text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+        return NON_WORD_RE.sub(' ', text.casefold()).strip()
+    return ' - '.join([fold(name), ', '.join(sorted(fold(artist) for artist in artists or []))])
+
+
+def match_keys(track):
+    """Index keys for a job track, most specific first."""
+    query = normalize(track.get('name'), track.get('artists'))
+    keys = [f"id:{track['id']}"] if track.get('id') else []
+    return keys + [f"q:{hashlib.sha1(query.encode()).hexdigest()}"]
+
+
+def lookup(tracks):
+    """
+    Known matches for `tracks`, as {index: video_id}, with '' for tracks
+    recently searched without result. Tracks not in the dict need a search.
+    """
+    keys = {index: match_keys(track) for index, track in enumerate(tracks)}
+    miss_cutoff = timezone.now() - timedelta(seconds=get_download_settings()['MATCH_MISS_TTL'])
+    found = {
+        match.key: match.video_id
+        for match in TrackMatch.objects.filter(key__in={key for track_keys in keys.values() for key in track_keys})
+        if match.video_id or match.checked_at >= miss_cutoff
+    }
+    known = {}
+    for index, track_keys in keys.items():
+        video_id = next((found[key] for key in track_keys if key in found), None)
+        if video_id is not None:
+            known[index] = video_id
+    return known
+
+
+def record(matches):
+    """Store search outcomes, an iterable of (track, video_id or '', title)."""
+    now = timezone.now()
+    rows = {}
+    for track, video_id, title in matches:
+        for key in match_keys(track):
+            rows[key] = TrackMatch(key=key, video_id=video_id, title=(title or '')[:255], checked_at=now)
+    if rows:
+        bulk_upsert(TrackMatch, list(rows.values()), ['key'], ['video_id', 'title', 'checked_at'])
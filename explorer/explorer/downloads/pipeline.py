@@ -0,0 +1,246 @@
+"""
+Per-track download pipeline: YouTube search, audio download and
+conversion to the job's format (transcode.py) as separate stages, each with its own concurrency limit.
+
+Tracks without a known match in the match index (matches.py) are searched
+for in parallel and the results stored in one write at the end, so re-runs
+skip searching entirely. Each track moves on to download and transcode as
+soon as its match is known, independently of the others, so one track can
+be transcoding while others are still being searched for or downloaded.
+
+The stage pools are shared by every job in a worker process, so the limits
+hold however many jobs run at once. A job keeps at most TRACKS_IN_FLIGHT
+of its tracks in them, feeding the next as one finishes, so jobs running
+side by side share the pools instead of queueing behind one another.
+Transcodes run in a process pool, one ffmpeg per core by default.
+
+Tracks already in the audio cache (cache.py) skip every stage; the rest
+are added to it as they finish, so later jobs for the same tracks are
+served from disk.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+
+from yt_dlp import YoutubeDL
+
+from . import matches
+from .cache import TrackFile, get_audio_cache
+from .jobs import get_download_settings
+from .transcode import FORMATS, convert, source_format
+
+YDL_OPTIONS = {'quiet': True, 'noplaylist': True}
+VIDEO_URL = 'https://www.youtube.com/watch?v={}'
+
+
+def search(track):
+    """The first YouTube result for a track. Only the search page is read."""
+    query = f"{track['name']} {', '.join(track['artists'])} audio"
+    with YoutubeDL(YDL_OPTIONS) as ydl:
+        result = ydl.extract_info(f'ytsearch1:{query}', download=False, process=False)
+    entry = next(iter(result.get('entries') or []), None)
+    if entry is None:
+        raise LookupError(f'No YouTube results for {query!r}')
+    return entry
+
+
+def download(video_id, temp_dir, selector='bestaudio/best'):
+    """
+    Download a video's audio stream picked by yt-dlp format `selector`.
+    Returns (TrackFile, the stream's codec as yt-dlp names it).
+    """
+    options = {**YDL_OPTIONS, 'format': selector, 'outtmpl': os.path.join(temp_dir, '%(id)s.%(ext)s')}
+    with YoutubeDL(options) as ydl:
+        info = ydl.extract_info(VIDEO_URL.format(video_id), download=True)
+        return TrackFile(ydl.prepare_filename(info), info.get('title') or video_id, video_id), info.get('acodec') or ''
+
+
+class DownloadPipeline:
+    def __init__(self, search_workers=None, download_workers=None, transcode_workers=None, in_flight=None):
+        config = get_download_settings()
+        self.default_format = config['DEFAULT_FORMAT']
+        self.in_flight = in_flight or config['TRACKS_IN_FLIGHT']
+        self.ffmpeg = config['FFMPEG']
+        self.searches = ThreadPoolExecutor(
+            max_workers=search_workers or config['SEARCH_CONCURRENCY'], thread_name_prefix='search',
+        )
+        self.downloads = ThreadPoolExecutor(
+            max_workers=download_workers or config['DOWNLOAD_CONCURRENCY'], thread_name_prefix='download',
+        )
+        # Spawned, not forked: the worker process is multi-threaded by now.
+        self.transcodes = ProcessPoolExecutor(
+            max_workers=transcode_workers or config['TRANSCODE_CONCURRENCY'] or os.cpu_count(),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+
+    def resolve(self, tracks, on_found=None):
+        """
+        {index: video_id} for `tracks`, '' where there is no match. Tracks
+        missing from the match index are searched for in parallel, at most
+        `in_flight` at a time, and each outcome recorded as it comes in, so
+        an interrupted job doesn't search again; a search that errored,
+        rather than finding nothing, is left out so it's retried next time. `on_found(index, video_id or '' or None)` is called from
+        the calling thread for each track as soon as its outcome is known,
+        None meaning the search errored.
+        """
+        on_found = on_found or (lambda index, video_id: None)
+        video_ids = matches.lookup(tracks)
+        for index, video_id in video_ids.items():
+            on_found(index, video_id)
+        waiting = deque(index for index in range(len(tracks)) if index not in video_ids)
+        searches = {}
+        while waiting or searches:
+            while waiting and len(searches) < self.in_flight:
+                index = waiting.popleft()
+                searches[self.searches.submit(search, tracks[index])] = index
+            done, _ = wait(searches, return_when=FIRST_COMPLETED)
+            found = {}
+            for future in done:
+                index = searches.pop(future)
+                try:
+                    entry = future.result()
+                except LookupError:
+                    entry = {'id': '', 'title': ''}
+                except Exception as e:
+                    print(f"Failed to find {tracks[index]['name']}: {e}")
+                    on_found(index, None)
+                    continue
+                video_ids[index] = entry['id']
+                found[index] = entry
+            matches.record((tracks[index], entry['id'], entry.get('title')) for index, entry in found.items())
+            for index, entry in found.items():
+                on_found(index, entry['id'])
+        return video_ids
+
+    def run(self, tracks, temp_dir, fmt=None, on_progress=None, on_result=None):
+        """
+        Push every track through the stages, ending up in `fmt`, one of
+        transcode.FORMATS (default: DOWNLOADS['DEFAULT_FORMAT']). As tracks
+        finish, successfully or not, `on_result(index, TrackFile or None)`
+        and then `on_progress(completed)` are called from the calling thread;
+        cached tracks first, then the rest while searches are still running.
+        Returns [TrackFile or None per track], in track order; the files
+        live in the audio cache, so callers must not move or delete them.
+        """
+        fmt = fmt or self.default_format
+        extension = FORMATS[fmt]['extension']
+        cache = get_audio_cache()
+        cached = cache.get_many([track['id'] for track in tracks if track.get('id')], fmt)
+        finished = queue.Queue()
+
+        def fail(index, stage, error):
+            print(f"Failed to {stage} {tracks[index]['name']}: {error}")
+            finished.put((index, None))
+
+        def downloaded(index, future):
+            try:
+                source, codec = future.result()
+            except Exception as e:
+                return fail(index, 'download', e)
+            target = os.path.join(temp_dir, f'{index}.{extension}')
+            try:
+                self.transcodes.submit(convert, source.path, target, fmt, self.ffmpeg, codec).add_done_callback(
+                    partial(transcoded, index, source)
+                )
+            except Exception as e:  # pool shut down or broken
+                fail(index, 'transcode', e)
+
+        def transcoded(index, source, future):
+            try:
+                finished.put((index, source._replace(path=future.result())))
+            except Exception as e:
+                fail(index, 'transcode', e)
+
+        waiting, started = deque(), set()
+
+        def start_downloads():
+            # Only `in_flight` of this job's tracks sit in the shared pools at
+            # once, so other jobs' tracks are interleaved with its own.
+            while waiting and len(started) < self.in_flight:
+                index, video_id = waiting.popleft()
+                started.add(index)
+                try:
+                    self.downloads.submit(download, video_id, temp_dir, source_format(fmt)).add_done_callback(
+                        partial(downloaded, index)
+                    )
+                except Exception as e:  # pool shut down
+                    fail(index, 'download', e)
+
+        results = [None] * len(tracks)
+        completed = 0
+
+        def collect(index, result):
+            nonlocal completed
+            completed += 1
+            if index in started:
+                started.discard(index)
+                start_downloads()
+            track_id = tracks[index].get('id')
+            if result and not os.path.exists(result.path):
+                print(f"Failed to fetch {tracks[index]['name']}: {result.path} is gone")
+                result = None
+            if result and track_id and track_id not in cached:
+                # Cached here, not in a stage callback: those run on pool threads.
+                try:
+                    result = cache.put(track_id, fmt, result)
+                except Exception as e:
+                    print(f"Failed to cache {tracks[index]['name']}: {e}")
+            results[index] = result
+            if on_result:
+                on_result(index, result)
+            if on_progress:
+                on_progress(completed)
+
+        def collect_ready():
+            while True:
+                try:
+                    item = finished.get_nowait()
+                except queue.Empty:
+                    return
+                collect(*item)
+
+        pending = []
+        for index, track in enumerate(tracks):
+            if track.get('id') in cached:
+                finished.put((index, cached[track['id']]))
+            else:
+                pending.append(index)
+        collect_ready()
+
+        def found(position, video_id):
+            index = pending[position]
+            if video_id:
+                waiting.append((index, video_id))
+                start_downloads()
+            else:
+                if video_id == '':
+                    print(f"Failed to find {tracks[index]['name']}: no match")
+                finished.put((index, None))
+            collect_ready()
+
+        self.resolve([tracks[index] for index in pending], on_found=found)
+        while completed < len(tracks):
+            collect(*finished.get())
+        return results
+
+    def shutdown(self):
+        for pool in (self.searches, self.downloads, self.transcodes):
+            pool.shutdown(wait=True)
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Process-wide `DownloadPipeline`, built lazily from `settings.DOWNLOADS`."""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = DownloadPipeline()
+    return _pipeline
@@ -0,0 +1,64 @@
+"""
+CPU-bound half of the download pipeline, run in a process pool. Kept free
+of Django and yt-dlp imports so spawned pool processes start quickly.
+
+A job's output format is one of FORMATS. MP3s are re-encoded from the
+downloaded stream, which is most of a worker's CPU time. The native
+formats ask YouTube for a stream already in that codec and only rewrap it
+in the target container (`-codec:a copy`): no decode, no quality loss, and
+a small fraction of the CPU. If no such stream exists the download falls
+back to whatever audio there is, and unless its codec is one the target
+container plays as is, that one is encoded.
+"""
+import os
+import subprocess
+
+FORMATS = {
+    'mp3-128k': {'extension': 'mp3', 'codec': 'libmp3lame', 'bitrate': '128k'},
+    'mp3-192k': {'extension': 'mp3', 'codec': 'libmp3lame', 'bitrate': '192k'},
+    'mp3-320k': {'extension': 'mp3', 'codec': 'libmp3lame', 'bitrate': '320k'},
+    # YouTube's own streams: Opus in WebM, AAC in MP4. `copy` lists the
+    # source codecs (as yt-dlp names them, up to the first dot) that the
+    # container takes as they are.
+    'opus': {'extension': 'opus', 'codec': 'libopus', 'bitrate': '160k', 'copy': ('opus',), 'source': 'bestaudio[acodec=opus]'},
+    'm4a': {'extension': 'm4a', 'codec': 'aac', 'bitrate': '192k', 'copy': ('mp4a', 'aac'), 'source': 'bestaudio[ext=m4a]'},
+}
+
+
+def source_format(fmt):
+    """The yt-dlp format selector to download for an output format."""
+    preferred = FORMATS[fmt].get('source')
+    return f'{preferred}/bestaudio/best' if preferred else 'bestaudio/best'
+
+
+def can_copy(fmt, source_codec):
+    """Whether a stream in `source_codec` (yt-dlp's `acodec`) goes into `fmt` without re-encoding."""
+    return (source_codec or '').split('.')[0].lower() in FORMATS[fmt].get('copy', ())
+
+
+def _ffmpeg(ffmpeg, source, target, *codec):
+    subprocess.run(
+        [ffmpeg, '-y', '-loglevel', 'error', '-i', source, '-vn', *codec, target],
+        check=True, capture_output=True,
+    )
+
+
+def convert(source, target, fmt='mp3-192k', ffmpeg='ffmpeg', source_codec=None):
+    """
+    Convert `source` to `fmt` at `target`, removing `source`. Returns
+    `target`. The stream is only copied when `source_codec` is one `fmt`
+    plays back as is: ffmpeg would happily put Opus in an .m4a, which
+    Apple devices then can't play.
+    """
+    spec = FORMATS[fmt]
+    copied = False
+    if can_copy(fmt, source_codec):
+        try:
+            _ffmpeg(ffmpeg, source, target, '-codec:a', 'copy')
+            copied = True
+        except subprocess.CalledProcessError:
+            pass  # a damaged or odd stream; encode it
+    if not copied:
+        _ffmpeg(ffmpeg, source, target, '-codec:a', spec['codec'], '-b:a', spec['bitrate'])
+    os.remove(source)
+    return target
@@ -0,0 +1,161 @@
+"""
+The download worker: a bounded pool of threads running queued jobs (see
+jobs.py), started by `manage.py download_worker`. Each job pushes its
+tracks through the shared stage pools in pipeline.py. Run as many worker
+processes as the host allows; they coordinate through the database.
+"""
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+from django.db import close_old_connections, connection
+
+from ..models import DownloadJob, Track
+from . import events, jobs
+from .archives import expire_archives, publish_track, write_archive
+from .cache import get_audio_cache
+from .pipeline import get_pipeline
+
+# How often a worker sweeps for archives past DOWNLOADS['ARCHIVE_TTL'].
+EXPIRE_INTERVAL = 60 * 5
+
+
+def finished_track(job, index, result):
+    """Pipeline `on_result`: hand the track to a streaming download and tell anyone watching."""
+    if result and job.stream:
+        publish_track(job, index, result)
+    # Runs just before the pipeline's `on_progress` counts this track.
+    events.publish(
+        job, 'track', index=index, name=job.tracks[index]['name'], ok=bool(result),
+        completed=job.completed + 1, total=job.total,
+    )
+
+
+def finish(job, status, message='', archive_path='', fetched=()):
+    """
+    Record how the job ended, then tell anyone watching. Returns False, and
+    does neither, if the job was requeued and claimed by another worker.
+    """
+    if status == DownloadJob.COMPLETED:
+        finished = jobs.complete(job, archive_path, fetched)
+    else:
+        finished = jobs.fail(job, message)
+    if not finished:
+        print(f"Download job {job.pk} was taken over by another worker; dropping its result")
+        return False
+    events.publish(job, 'done', status=status, message=message)
+    return True
+
+
+def record_tracks(job, results):
+    """
+    Note on the user's synced copy of the playlist which tracks were
+    fetched, and from where. Whether the user got them is recorded apart,
+    once they do (see jobs.record_delivery).
+    """
+    by_id = {track['id']: result for track, result in zip(job.tracks, results) if track.get('id')}
+    rows = list(Track.objects.filter(
+        playlist__user_id=job.user_id, playlist__spotify_id=job.playlist_id, spotify_track_id__in=by_id,
+    ))
+    for row in rows:
+        result = by_id[row.spotify_track_id]
+        row.status = 'success' if result else 'failed'
+        if result:
+            row.youtube_video_id = result.video_id
+            row.downloaded_path = result.path
+    Track.objects.bulk_update(rows, ['status', 'youtube_video_id', 'downloaded_path'], batch_size=500)
+
+
+def keep_alive(job, stop):
+    """
+    Heartbeat `job` every DOWNLOADS['HEARTBEAT_INTERVAL'] seconds until
+    `stop` is set. Runs beside the pipeline, so a job whose tracks are
+    waiting behind other jobs' isn't mistaken for a dead one.
+    """
+    interval = jobs.get_download_settings()['HEARTBEAT_INTERVAL']
+    try:
+        while not stop.wait(interval):
+            if not jobs.heartbeat(job):
+                print(f"Download job {job.pk} was taken over by another worker")
+                return
+    finally:
+        connection.close()
+
+
+def run_job(job):
+    temp_dir = tempfile.mkdtemp()
+    stop = threading.Event()
+    threading.Thread(target=keep_alive, args=(job, stop), name=f'heartbeat-{job.pk}', daemon=True).start()
+    try:
+        results = get_pipeline().run(
+            job.tracks, temp_dir, job.format, partial(jobs.update_progress, job),
+            on_result=partial(finished_track, job),
+        )
+        downloaded_files = [result for result in results if result]
+        if not downloaded_files:
+            record_tracks(job, results)
+            finish(job, DownloadJob.FAILED, 'Could not download any tracks.')
+            return
+        archive_path = '' if job.stream else write_archive(job, downloaded_files)
+        fetched = [index for index, result in enumerate(results) if result]
+        if finish(job, DownloadJob.COMPLETED, archive_path=archive_path, fetched=fetched):
+            record_tracks(job, results)
+    except Exception as e:
+        finish(job, DownloadJob.FAILED, str(e))
+    finally:
+        stop.set()
+        shutil.rmtree(temp_dir)
+        try:
+            evicted = get_audio_cache().evict()
+            if evicted:
+                print(f"Evicted {evicted} track(s) from the audio cache")
+        except Exception as e:
+            print(f"Audio cache eviction failed: {e}")
+        close_old_connections()
+
+
+class DownloadWorker:
+    def __init__(self, workers=None, poll_interval=None):
+        config = jobs.get_download_settings()
+        self.workers = workers or config['WORKERS']
+        self.poll_interval = poll_interval or config['POLL_INTERVAL']
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        self._stopping = threading.Event()
+        self._expired_at = 0
+
+    def stop(self):
+        """Stop claiming jobs; `run` returns once the running ones finish."""
+        self._stopping.set()
+
+    def run(self):
+        print(f"Download worker {self.worker_id} started with {self.workers} slots")
+        active = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='download') as executor:
+            while not self._stopping.is_set():
+                requeued, failed = jobs.requeue_stale()
+                if requeued or failed:
+                    print(f"Requeued {requeued} stale download job(s), failed {failed}")
+                if time.monotonic() - self._expired_at >= EXPIRE_INTERVAL:
+                    self._expired_at = time.monotonic()
+                    expired = expire_archives()
+                    if expired:
+                        print(f"Removed {expired} expired archive(s)")
+
+                while len(active) < self.workers and not self._stopping.is_set():
+                    job = jobs.claim_next(self.worker_id)
+                    if job is None:
+                        break
+                    print(f"Claimed download job {job.pk} ({job.total} tracks) for user {job.user_id}")
+                    active.add(executor.submit(run_job, job))
+
+                if active:
+                    _, active = wait(active, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    self._stopping.wait(self.poll_interval)
+        get_pipeline().shutdown()
+        print(f"Download worker {self.worker_id} stopped")
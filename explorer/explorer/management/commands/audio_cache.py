@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from ...downloads.cache import get_audio_cache
+
+
+class Command(BaseCommand):
+    help = "Show how much the shared audio cache holds, optionally checking or trimming it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Re-hash every file and drop corrupt entries.')
+        parser.add_argument('--evict', action='store_true', help="Evict least recently used entries down to AUDIO_CACHE['QUOTA'].")
+
+    def handle(self, *args, verify, evict, **options):
+        cache = get_audio_cache()
+        if verify:
+            checked, dropped = cache.verify()
+            self.stdout.write(f'Checked {checked} file(s), dropped {dropped}')
+        if evict:
+            self.stdout.write(f'Evicted {cache.evict()} cache entries')
+        stats = cache.stats()
+        for key in ('entries', 'bytes', 'quota'):
+            self.stdout.write(f'{key}: {stats[key]}')
@@ -0,0 +1,178 @@
+import json
+import os
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from ...middleware import compress, get_compression_settings
+from ...models import SpotifyUser
+from ...renderers import ORJSONRenderer
+from ...spotify.projections import project_playlist, project_track
+from ...spotify.tokens import request_as
+
+MARKETS = [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase][:185]
+
+
+def _spotify_id(rng):
+    return ''.join(rng.choices(string.ascii_letters + string.digits, k=22))
+
+
+def _images(rng):
+    return [
+        {'url': f'https://i.scdn.co/image/{_spotify_id(rng)}', 'height': size, 'width': size}
+        for size in (640, 300, 64)
+    ]
+
+
+def _object(rng, kind, name, **extra):
+    spotify_id = _spotify_id(rng)
+    return {
+        'external_urls': {'spotify': f'https://open.spotify.com/{kind}/{spotify_id}'},
+        'href': f'https://api.spotify.com/v1/{kind}s/{spotify_id}',
+        'id': spotify_id,
+        'name': name,
+        'type': kind,
+        'uri': f'spotify:{kind}:{spotify_id}',
+        **extra,
+    }
+
+
+def _track(rng, n):
+    artists = [_object(rng, 'artist', f'Artist {n}-{i}') for i in range(rng.randint(1, 3))]
+    album = _object(
+        rng, 'album', f'Album {n}',
+        album_type='album', artists=artists[:1], available_markets=MARKETS, images=_images(rng),
+        release_date='2019-05-17', release_date_precision='day', total_tracks=12,
+    )
+    return _object(
+        rng, 'track', f'Track {n}',
+        album=album, artists=artists, available_markets=MARKETS, disc_number=1,
+        duration_ms=rng.randint(120000, 360000), explicit=rng.random() < 0.2,
+        external_ids={'isrc': f'USRC1{n:07d}'}, is_local=False, popularity=rng.randint(0, 100),
+        preview_url=None, track_number=rng.randint(1, 12),
+    )
+
+
+def sample_top_tracks(rng, limit=50):
+    """A `/me/top/tracks?limit=50` response."""
+    return {
+        'items': [_track(rng, n) for n in range(limit)],
+        'total': limit, 'limit': limit, 'offset': 0,
+        'href': f'https://api.spotify.com/v1/me/top/tracks?limit={limit}&offset=0',
+        'next': None, 'previous': None,
+    }
+
+
+def sample_playlist(rng, size=1000):
+    """A `/playlists/{id}` response with every track inlined."""
+    return _object(
+        rng, 'playlist', 'Benchmark playlist',
+        description='', collaborative=False, public=True, images=_images(rng),
+        owner={'id': 'bench', 'display_name': 'Bench', 'type': 'user'},
+        snapshot_id=_spotify_id(rng),
+        tracks={
+            'total': size,
+            'items': [
+                {'added_at': '2024-01-01T00:00:00Z', 'is_local': False, 'track': _track(rng, n)}
+                for n in range(size)
+            ],
+        },
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare render time and payload size of the JSON renderers and '
+        'response compression on real top-tracks and playlist responses, '
+        'captured live or replayed from files.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='Captured Spotify JSON responses to use as fixtures.')
+        parser.add_argument(
+            '--user',
+            help='Capture live fixtures (top tracks and a playlist) as this spotify_id '
+                 '(default: the most recently active user).',
+        )
+        parser.add_argument('--playlist', help="Playlist id to capture (default: the user's largest synced playlist).")
+        parser.add_argument('--save', metavar='DIR', help='Also write the captured fixtures to DIR, to replay later.')
+        parser.add_argument('--synthetic', action='store_true', help='Use generated fixtures instead of real responses.')
+        parser.add_argument('--tracks', type=int, default=1000, help='Size of the synthetic playlist.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per measurement.')
+
+    def capture(self, user, playlist_id, save):
+        """Real responses for `user`, which is a spotify_id or None for the most recently active user."""
+        users = SpotifyUser.objects.exclude(refresh_token='')
+        if user:
+            try:
+                user = users.get(spotify_id=user)
+            except SpotifyUser.DoesNotExist:
+                raise CommandError(f'Unknown user: {user}')
+        else:
+            user = users.order_by('-updated_at').first()
+            if user is None:
+                raise CommandError('No user to capture fixtures as; log in once, or pass files or --synthetic.')
+        if not playlist_id:
+            playlist_id = user.playlists.order_by('-track_count').values_list('spotify_id', flat=True).first()
+
+        endpoints = [('top-tracks', '/me/top/tracks', {'limit': 50})]
+        if playlist_id:
+            endpoints.append(('playlist', f'/playlists/{playlist_id}', None))
+        for name, endpoint, params in endpoints:
+            data = request_as(user, endpoint, params)
+            if 'error' in data:
+                raise CommandError(f"{endpoint}: {data['error']}")
+            if save:
+                os.makedirs(save, exist_ok=True)
+                with open(os.path.join(save, f'{name}.json'), 'w') as f:
+                    json.dump(data, f)
+            yield name, data
+
+    def fixtures(self, files, user, playlist_id, save, synthetic, tracks):
+        if files:
+            for path in files:
+                with open(path) as f:
+                    yield path, json.load(f)
+        elif synthetic:
+            rng = random.Random(15)
+            yield 'synthetic top-tracks', sample_top_tracks(rng)
+            yield f'synthetic playlist ({tracks})', sample_playlist(rng, tracks)
+        else:
+            yield from self.capture(user, playlist_id, save)
+
+    @staticmethod
+    def project(data):
+        if 'tracks' in data:
+            return project_playlist(data)
+        return {**data, 'items': [project_track(track) for track in data.get('items', [])]}
+
+    def timed(self, func, repeat):
+        """Median milliseconds per call, and the last result."""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), result
+
+    def handle(self, *args, files, user, playlist, save, synthetic, tracks, repeat, **options):
+        config = get_compression_settings()
+        renderers = [('drf', JSONRenderer()), ('orjson', ORJSONRenderer())]
+
+        self.stdout.write(f"{'fixture':<34} {'renderer':<8} {'render ms':>10} {'bytes':>10} "
+                          f"{'gzip':>9} {'gzip ms':>8} {'br':>9} {'br ms':>7}")
+        for name, data in self.fixtures(files, user, playlist, save, synthetic, tracks):
+            for variant, payload in (('raw', data), ('projected', self.project(data))):
+                label = f'{name} {variant}'
+                for renderer_name, renderer in renderers:
+                    render_ms, body = self.timed(lambda: renderer.render(payload), repeat)
+                    gzip_ms, gzipped = self.timed(lambda: compress('gzip', body, config), repeat)
+                    br_ms, brotlied = self.timed(lambda: compress('br', body, config), repeat)
+                    self.stdout.write(
+                        f'{label:<34} {renderer_name:<8} {render_ms:>10.2f} {len(body):>10} '
+                        f'{len(gzipped):>9} {gzip_ms:>8.2f} {len(brotlied):>9} {br_ms:>7.2f}'
+                    )
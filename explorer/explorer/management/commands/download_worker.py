@@ -0,0 +1,27 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from ...downloads.jobs import queue_stats
+from ...downloads.worker import DownloadWorker
+
+
+class Command(BaseCommand):
+    help = "Run queued playlist downloads. Start one per host; they share the queue through the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Jobs to run at once (default: DOWNLOADS['WORKERS']).")
+        parser.add_argument('--stats', action='store_true', help='Print the queue depth and exit.')
+
+    def handle(self, *args, workers, stats, **options):
+        if stats:
+            for key, value in queue_stats().items():
+                self.stdout.write(f'{key}: {value}')
+            return
+
+        worker = DownloadWorker(workers=workers)
+        # Finish the running jobs on SIGTERM/Ctrl+C; a hard kill leaves them
+        # to be requeued once their heartbeat goes stale.
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: worker.stop())
+        worker.run()
@@ -0,0 +1,54 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import SpotifyUser
+from ...spotify import analytics, history
+from ...spotify.tokens import request_as
+
+
+class Command(BaseCommand):
+    help = (
+        "Record users' top tracks, artists and genres for every time range in "
+        "their top-items history. Meant to run periodically, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('spotify_ids', nargs='*', help='Users to snapshot (default: everyone).')
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Snapshot even users recorded less than SPOTIFY_HISTORY['MIN_INTERVAL'] ago.",
+        )
+
+    def handle(self, *args, spotify_ids, force, **options):
+        users = SpotifyUser.objects.exclude(refresh_token='')
+        if spotify_ids:
+            users = users.filter(spotify_id__in=spotify_ids)
+            missing = set(spotify_ids) - set(users.values_list('spotify_id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+
+        failures = skipped = 0
+        for user in users.iterator():
+            if not force and not history.is_due(user):
+                skipped += 1
+                continue
+            try:
+                bundle, error = analytics.get_bundle(user, partial(request_as, user))
+            except Exception as e:
+                bundle, error = None, {'error': str(e)}
+            if error:
+                failures += 1
+                self.stderr.write(f"{user.spotify_id}: {error.get('error')}")
+                continue
+            rows = history.record_snapshot(user, bundle)
+            keyframes = sum(row.keyframe for row in rows)
+            self.stdout.write(
+                f"{user.spotify_id}: recorded {len(rows)} series"
+                + (f" ({keyframes} keyframes)" if keyframes else '')
+            )
+
+        if skipped:
+            self.stdout.write(f"Skipped {skipped} user(s) snapshotted recently")
+        if failures:
+            raise CommandError(f'{failures} user(s) failed to snapshot.')
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import SpotifyUser
+from ...spotify.catalog import get_catalog
+from ...spotify.library import sync_library
+
+
+class Command(BaseCommand):
+    help = "Mirror users' Spotify playlists and tracks into the database, re-fetching only changed playlists."
+
+    def add_arguments(self, parser):
+        parser.add_argument('spotify_ids', nargs='*', help='Users to sync (default: everyone).')
+        parser.add_argument('--force', action='store_true', help='Re-fetch tracks even for unchanged playlists.')
+
+    def handle(self, *args, spotify_ids, force, **options):
+        users = SpotifyUser.objects.exclude(refresh_token='')
+        if spotify_ids:
+            users = users.filter(spotify_id__in=spotify_ids)
+            missing = set(spotify_ids) - set(users.values_list('spotify_id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+
+        failures = 0
+        for user in users.iterator():
+            try:
+                summary, error = sync_library(user, force=force)
+            except Exception as e:
+                summary, error = None, {'error': str(e)}
+            if error:
+                failures += 1
+                self.stderr.write(f"{user.spotify_id}: {error.get('error')}")
+                continue
+            self.stdout.write(
+                f"{user.spotify_id}: {summary['playlists']} playlists, {summary['synced']} re-synced"
+                + (f", {len(summary['failed'])} failed" if summary['failed'] else '')
+            )
+
+        pruned = get_catalog().prune()
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} expired catalog entries")
+
+        if failures:
+            raise CommandError(f'{failures} user(s) failed to sync.')
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+def resync_tracks(apps, schema_editor):
+    # Stored tracks have no artist ids yet; make the next sync re-fetch them.
+    Playlist = apps.get_model('explorer', 'Playlist')
+    Playlist.objects.update(tracks_snapshot_id='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0002_library_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='artists',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(resync_tracks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0003_track_artists'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('spotify_id', models.CharField(max_length=100)),
+                ('data', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['updated_at'], name='catalog_updated_at_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'spotify_id'), name='unique_catalog_entry')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0004_catalog_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopItemsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('time_range', models.CharField(max_length=20)),
+                ('taken_at', models.DateTimeField()),
+                ('keyframe', models.BooleanField(default=False)),
+                ('ids', models.JSONField(default=list)),
+                ('counts', models.JSONField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='top_history', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'kind', 'time_range', 'taken_at'], name='top_history_series_idx')],
+            },
+        ),
+    ]
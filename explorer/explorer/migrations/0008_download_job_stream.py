@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0007_download_job_expired'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadjob',
+            name='stream',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0008_download_job_stream'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedAudio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('spotify_track_id', models.CharField(max_length=100)),
+                ('format', models.CharField(max_length=20)),
+                ('digest', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('youtube_video_id', models.CharField(blank=True, default='', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_used_at'], name='cached_audio_lru_idx'), models.Index(fields=['digest'], name='cached_audio_digest_idx')],
+                'constraints': [models.UniqueConstraint(fields=('spotify_track_id', 'format'), name='unique_cached_audio')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0009_cached_audio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('video_id', models.CharField(blank=True, default='', max_length=100)),
+                ('title', models.CharField(blank=True, default='', max_length=255)),
+                ('checked_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0010_track_match'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadjob',
+            name='format',
+            field=models.CharField(default='mp3-192k', max_length=20),
+        ),
+    ]
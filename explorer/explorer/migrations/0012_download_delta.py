@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0011_download_job_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadjob',
+            name='delta',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='downloadjob',
+            name='removed',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
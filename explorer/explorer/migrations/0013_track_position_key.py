@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+def resync_tracks(apps, schema_editor):
+    # Local files and repeated tracks were left out; make the next sync store
+    # them. Positions must also be unique per playlist before the constraint.
+    Playlist = apps.get_model('explorer', 'Playlist')
+    Track = apps.get_model('explorer', 'Track')
+    Playlist.objects.update(tracks_snapshot_id='')
+    changed = []
+    for playlist_id in Track.objects.values_list('playlist_id', flat=True).distinct():
+        for position, track in enumerate(Track.objects.filter(playlist_id=playlist_id).order_by('position', 'pk')):
+            if track.position != position:
+                track.position = position
+                changed.append(track)
+    Track.objects.bulk_update(changed, ['position'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0012_download_delta'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='track',
+            name='unique_playlist_track',
+        ),
+        migrations.RemoveIndex(
+            model_name='track',
+            name='track_playlist_position_idx',
+        ),
+        migrations.AlterField(
+            model_name='track',
+            name='spotify_track_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.RunPython(resync_tracks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['playlist', 'spotify_track_id'], name='track_playlist_track_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='track',
+            constraint=models.UniqueConstraint(fields=('playlist', 'position'), name='unique_playlist_position'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_deliveries(apps, schema_editor):
+    # Deliveries move off the synced Track rows, which a sync deletes.
+    Track = apps.get_model('explorer', 'Track')
+    DeliveredTrack = apps.get_model('explorer', 'DeliveredTrack')
+    rows, seen = [], set()
+    delivered = Track.objects.filter(delivered_at__isnull=False).exclude(spotify_track_id=None).select_related('playlist')
+    for track in delivered.order_by('-delivered_at'):
+        key = (track.playlist.user_id, track.playlist.spotify_id, track.spotify_track_id)
+        if key in seen:
+            continue
+        seen.add(key)
+        rows.append(DeliveredTrack(
+            user_id=key[0], playlist_id=key[1], spotify_track_id=key[2], title=track.title,
+            artists=[artist.get('name') for artist in track.artists] or [track.artist], delivered_at=track.delivered_at,
+        ))
+    DeliveredTrack.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('explorer', '0013_track_position_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='downloadjob',
+            name='fetched',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.CreateModel(
+            name='DeliveredTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('playlist_id', models.CharField(max_length=100)),
+                ('spotify_track_id', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=255)),
+                ('artists', models.JSONField(blank=True, default=list)),
+                ('delivered_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivered_tracks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'playlist_id', 'spotify_track_id'), name='unique_delivered_track')],
+            },
+        ),
+        migrations.RunPython(copy_deliveries, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='track',
+            name='delivered_at',
+        ),
+    ]
@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
@@ -11,6 +13,7 @@ class SpotifyUser(AbstractUser):
     scope = models.TextField()
     token_expires_in = models.IntegerField(null=True, blank=True)
     token_expires_at = models.DateTimeField(null=True, blank=True)
+    library_synced_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
@@ -25,7 +28,24 @@ class Playlist(models.Model):
     user = models.ForeignKey(SpotifyUser, on_delete=models.CASCADE, related_name='playlists')
     spotify_id = models.CharField(max_length=100)
     name = models.CharField(max_length=255)
+    description = models.TextField(blank=True, default='')
+    image_url = models.URLField(max_length=500, blank=True, null=True)
+    external_url = models.URLField(max_length=500, blank=True, null=True)
+    owner_name = models.CharField(max_length=255, blank=True, default='')
+    position = models.IntegerField(default=0)  # order in the user's library
+    track_count = models.IntegerField(default=0)
+    snapshot_id = models.CharField(max_length=100, blank=True, default='')  # latest seen on Spotify
+    tracks_snapshot_id = models.CharField(max_length=100, blank=True, default='')  # what `tracks` reflects
     created_at = models.DateTimeField(auto_now_add=True)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'spotify_id'], name='unique_user_playlist'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'position'], name='playlist_user_position_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.spotify_id})"
@@ -33,13 +53,179 @@ class Playlist(models.Model):
 
 class Track(models.Model):
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name='tracks')
-    spotify_track_id = models.CharField(max_length=100)
+    spotify_track_id = models.CharField(max_length=100, blank=True, null=True)  # None for local files
     title = models.CharField(max_length=255)
     artist = models.CharField(max_length=255)
+    artists = models.JSONField(default=list, blank=True)  # [{'id', 'name'}, ...]
     youtube_video_id = models.CharField(max_length=100, blank=True, null=True)
     downloaded_path = models.TextField(blank=True, null=True)
     status = models.CharField(max_length=20, default="pending")  # pending, success, failed
+    album = models.CharField(max_length=255, blank=True, default='')
+    image_url = models.URLField(max_length=500, blank=True, null=True)
+    duration_ms = models.IntegerField(default=0)
+    position = models.IntegerField(default=0)  # order in the playlist
+    spotify_added_at = models.DateTimeField(null=True, blank=True)
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Keyed by position: a playlist may hold the same track twice, and
+        # local files have no id at all.
+        constraints = [
+            models.UniqueConstraint(fields=['playlist', 'position'], name='unique_playlist_position'),
+        ]
+        indexes = [
+            models.Index(fields=['playlist', 'spotify_track_id'], name='track_playlist_track_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} - {self.artist}"
+
+
+class CatalogEntry(models.Model):
+    """Shared copy of a non-personal Spotify object (track, album, artist)."""
+    kind = models.CharField(max_length=20)
+    spotify_id = models.CharField(max_length=100)
+    data = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'spotify_id'], name='unique_catalog_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['updated_at'], name='catalog_updated_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.spotify_id}"
+
+
+class TopItemsSnapshot(models.Model):
+    """
+    A user's top tracks, artists or genres for one time range at one point in
+    time. Unless `keyframe` is set, `ids` is delta-encoded against the
+    previous row of the same series (see explorer/explorer/spotify/history.py).
+    """
+    user = models.ForeignKey(SpotifyUser, on_delete=models.CASCADE, related_name='top_history')
+    kind = models.CharField(max_length=20)  # tracks, artists, genres
+    time_range = models.CharField(max_length=20)
+    taken_at = models.DateTimeField()
+    keyframe = models.BooleanField(default=False)
+    ids = models.JSONField(default=list)
+    counts = models.JSONField(null=True, blank=True)  # genres only, aligned with the decoded ids
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'kind', 'time_range', 'taken_at'], name='top_history_series_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.kind}:{self.time_range}@{self.taken_at:%Y-%m-%d %H:%M}"
+
+
+class DownloadJob(models.Model):
+    """A playlist download, queued by the API and run by `manage.py download_worker`."""
+    PENDING = 'PENDING'
+    DOWNLOADING = 'DOWNLOADING'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+    EXPIRED = 'EXPIRED'  # completed, archive since removed
+    STATUSES = [
+        (PENDING, 'Pending'), (DOWNLOADING, 'Downloading'), (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'), (EXPIRED, 'Expired'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(SpotifyUser, on_delete=models.CASCADE, related_name='download_jobs')
+    playlist_id = models.CharField(max_length=100)
+    playlist_name = models.CharField(max_length=255)
+    tracks = models.JSONField(default=list)  # [{'id', 'name', 'artists': [names]}, ...]
+    status = models.CharField(max_length=20, choices=STATUSES, default=PENDING)
+    total = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    message = models.TextField(blank=True, default='')
+    archive_path = models.TextField(blank=True, default='')
+    stream = models.BooleanField(default=False)  # tracks are streamed as they finish, no archive is kept
+    format = models.CharField(max_length=20, default='mp3-192k')  # a key of downloads.transcode.FORMATS
+    delta = models.BooleanField(default=False)  # only tracks not delivered before
+    removed = models.JSONField(default=list, blank=True)  # delta: delivered tracks since removed, [{'id', 'name', 'artists'}]
+    fetched = models.JSONField(default=list, blank=True)  # indices into `tracks` that made it into the download
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True, default='')  # host:pid of the claiming worker
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='download_job_queue_idx'),
+            models.Index(fields=['user', 'status'], name='download_job_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.playlist_name} ({self.status})"
+
+
+class DeliveredTrack(models.Model):
+    """
+    A track a download handed to its user, so a delta download of the same
+    playlist can leave it out. Kept apart from `Track`, whose rows a sync
+    deletes along with the tracks removed from the playlist.
+    """
+    user = models.ForeignKey(SpotifyUser, on_delete=models.CASCADE, related_name='delivered_tracks')
+    playlist_id = models.CharField(max_length=100)
+    spotify_track_id = models.CharField(max_length=100)
+    title = models.CharField(max_length=255)
+    artists = models.JSONField(default=list, blank=True)  # [names]
+    delivered_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'playlist_id', 'spotify_track_id'], name='unique_delivered_track'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}:{self.playlist_id}:{self.spotify_track_id}"
+
+
+class CachedAudio(models.Model):
+    """
+    A finished audio file in the shared on-disk cache, stored under its
+    content digest (see explorer/explorer/downloads/cache.py).
+    """
+    spotify_track_id = models.CharField(max_length=100)
+    format = models.CharField(max_length=20)  # e.g. mp3-192k
+    digest = models.CharField(max_length=64)  # sha256 of the file, also its name on disk
+    size = models.BigIntegerField()
+    title = models.CharField(max_length=255)
+    youtube_video_id = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['spotify_track_id', 'format'], name='unique_cached_audio'),
+        ]
+        indexes = [
+            models.Index(fields=['last_used_at'], name='cached_audio_lru_idx'),
+            models.Index(fields=['digest'], name='cached_audio_digest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.spotify_track_id}:{self.format}"
+
+
+class TrackMatch(models.Model):
+    """
+    The YouTube video a track resolved to, keyed by Spotify track id or by
+    normalized title and artists (see explorer/explorer/downloads/matches.py).
+    An empty `video_id` records a search that found nothing.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    video_id = models.CharField(max_length=100, blank=True, default='')
+    title = models.CharField(max_length=255, blank=True, default='')
+    checked_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} -> {self.video_id or '(none)'}"
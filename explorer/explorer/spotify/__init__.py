@@ -0,0 +1,4 @@
+from .client import SpotifyClient, get_client
+from .aio import AsyncSpotifyClient, get_async_client
+
+__all__ = ['SpotifyClient', 'get_client', 'AsyncSpotifyClient', 'get_async_client']
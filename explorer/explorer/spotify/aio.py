@@ -0,0 +1,161 @@
+import asyncio
+import json
+import os
+import weakref
+
+import httpx
+from asgiref.sync import sync_to_async
+
+from .cache import get_response_cache
+from .client import api_url, get_http_settings
+from .ratelimit import get_limiter, get_rate_limit_settings, parse_retry_after
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class AsyncSpotifyClient:
+    """
+    asyncio counterpart of `SpotifyClient`, used by the async views when the
+    app is served through `explorer.asgi`.
+
+    httpx connection pools are bound to the event loop that created them, so
+    one `httpx.AsyncClient` is kept per running loop (normally exactly one per
+    ASGI worker). Error handling follows `SpotifyClient.api_get`.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None, max_retries=None,
+                 backoff_factor=None, pool_maxsize=None, limiter=None, response_cache=None):
+        config = get_http_settings()
+        self.timeout = httpx.Timeout(
+            read_timeout if read_timeout is not None else config['READ_TIMEOUT'],
+            connect=connect_timeout if connect_timeout is not None else config['CONNECT_TIMEOUT'],
+        )
+        self.max_retries = max_retries if max_retries is not None else config['MAX_RETRIES']
+        self.backoff_factor = backoff_factor if backoff_factor is not None else config['BACKOFF_FACTOR']
+        self.pool_maxsize = pool_maxsize or config['POOL_MAXSIZE']
+        self.limiter = limiter or get_limiter()
+        self.throttle_retries = get_rate_limit_settings()['MAX_THROTTLE_RETRIES']
+        self.response_cache = response_cache or get_response_cache()
+
+        self._clients = weakref.WeakKeyDictionary()
+        self._inflight = weakref.WeakKeyDictionary()
+        self._requests = 0
+        self._errors = 0
+
+    def _build_http(self):
+        # Transport-level retries only cover connection failures; 5xx retries
+        # for idempotent requests are handled in `request` below.
+        transport = httpx.AsyncHTTPTransport(
+            retries=self.max_retries,
+            limits=httpx.Limits(
+                max_connections=self.pool_maxsize,
+                max_keepalive_connections=self.pool_maxsize,
+            ),
+        )
+        return httpx.AsyncClient(transport=transport, timeout=self.timeout)
+
+    @property
+    def http(self):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            client = self._build_http()
+            self._clients[loop] = client
+        return client
+
+    async def request(self, method, url, **kwargs):
+        """Send a request through this loop's pool. Raises `httpx.HTTPError`."""
+        attempt = 0
+        while True:
+            self._requests += 1
+            try:
+                response = await self.http.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                self._errors += 1
+                raise
+            if (method in ('GET', 'HEAD') and response.status_code in RETRY_STATUSES
+                    and attempt < self.max_retries):
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                attempt += 1
+                continue
+            return response
+
+    async def api_get(self, endpoint, access_token, params=None, cache_as=None, cache_ttl=None):
+        url = api_url(endpoint)
+        if cache_as is None:
+            return (await self._api_get(url, access_token, params))[0]
+
+        cache = self.response_cache
+        key = cache.make_key(cache_as, url, params)
+        body = cache.get(key)
+        if body is None:
+            # Concurrent coroutines asking for the same resource share one
+            # upstream call instead of each missing the cache.
+            inflight = self._inflight.setdefault(asyncio.get_running_loop(), {})
+            task = inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._fetch_into_cache(key, url, access_token, params, cache_ttl))
+                inflight[key] = task
+                task.add_done_callback(lambda _: inflight.pop(key, None))
+            else:
+                cache.count_coalesced()
+            data, body = await asyncio.shield(task)
+            if body is None:
+                return data
+        return json.loads(body)
+
+    async def _fetch_into_cache(self, key, url, access_token, params, cache_ttl):
+        data, body = await self._api_get(url, access_token, params)
+        if body is not None:
+            self.response_cache.set(key, body, ttl=cache_ttl)
+        return data, body
+
+    async def _api_get(self, url, access_token, params):
+        headers = {'Authorization': f'Bearer {access_token}'}
+        try:
+            for attempt in range(self.throttle_retries + 1):
+                if not await self.limiter.acquire_async():
+                    return {'error': 'Spotify rate limit exceeded.', 'status_code': 429}, None
+                response = await self.request('GET', url, headers=headers, params=params)
+                if response.status_code != 429:
+                    break
+                await sync_to_async(self.limiter.backoff)(parse_retry_after(response))
+            response.raise_for_status()
+            return response.json(), response.content
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 401:
+                return {'error': 'Spotify token may have expired.', 'status_code': 401}, None
+            return {'error': str(e), 'status_code': e.response.status_code}, None
+        except httpx.HTTPError as e:
+            return {'error': f'Network error: {str(e)}', 'status_code': 503}, None
+
+    def stats(self):
+        # httpcore keeps no lifetime counters; report what is pooled right now.
+        connections = 0
+        for client in list(self._clients.values()):
+            pool = getattr(client._transport, '_pool', None)
+            if pool is not None:
+                connections += len(pool.connections)
+        return {
+            'pid': os.getpid(),
+            'event_loops': len(self._clients),
+            'requests': self._requests,
+            'errors': self._errors,
+            'open_connections': connections,
+        }
+
+    async def aclose(self):
+        for client in list(self._clients.values()):
+            await client.aclose()
+        self._clients.clear()
+
+
+_client = None
+
+
+def get_async_client():
+    """Process-wide `AsyncSpotifyClient`, built lazily from `settings.SPOTIFY_HTTP`."""
+    global _client
+    if _client is None:
+        _client = AsyncSpotifyClient()
+    return _client
@@ -0,0 +1,268 @@
+"""
+Top tracks/artists for every time range, with the genre and album counts
+derived from them, computed together as one cached bundle per user.
+"""
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from asgiref.sync import sync_to_async
+
+from ..caching import acached_value, cached_value
+from .artists import aresolve_artists, artist_ids, genre_breakdown
+from .catalog import get_catalog
+from .client import get_http_settings, pooled
+
+TIME_RANGES = ('short_term', 'medium_term', 'long_term')
+TOP_LIMIT = 50
+BUNDLE_TTL = 60 * 5
+SNAPSHOT_SIZE = 5
+
+
+def bundle_key(user):
+    return f'top-bundle:{user.pk}'
+
+
+def _requests():
+    """(kind, time_range, endpoint, params) for every payload a bundle needs."""
+    return [
+        (kind, time_range, f'/me/top/{kind}', {'limit': TOP_LIMIT, 'time_range': time_range})
+        for time_range in TIME_RANGES
+        for kind in ('tracks', 'artists')
+    ]
+
+
+def count_genres(artists, limit=None):
+    """Most common genres across `artists` as (genre, count) pairs."""
+    return Counter(genre for artist in artists for genre in artist.get('genres', [])).most_common(limit)
+
+
+def count_albums(tracks, limit=None):
+    """Albums that appear most often across `tracks` as (album, count) pairs."""
+    album_counts = Counter()
+    unique_albums = {}
+    for track in tracks:
+        album = track.get('album')
+        if album:
+            album_counts[album['id']] += 1
+            unique_albums.setdefault(album['id'], album)
+    return [(unique_albums[album_id], count) for album_id, count in album_counts.most_common(limit)]
+
+
+def build_range(tracks, artists):
+    return {
+        'tracks': tracks,
+        'artists': artists,
+        'genres': [{'genre': genre, 'count': count} for genre, count in count_genres(artists, TOP_LIMIT)],
+        'albums': [{**album, 'count': count} for album, count in count_albums(tracks, TOP_LIMIT)],
+    }
+
+
+def build_snapshot(top_range):
+    """The dashboard summary, sliced from an already aggregated time range."""
+    return {
+        'top_tracks': top_range['tracks'][:SNAPSHOT_SIZE],
+        'top_artists': top_range['artists'][:SNAPSHOT_SIZE],
+        'top_genres': [entry['genre'] for entry in top_range['genres'][:SNAPSHOT_SIZE]],
+        'top_albums': [
+            {key: value for key, value in album.items() if key != 'count'}
+            for album in top_range['albums'][:SNAPSHOT_SIZE]
+        ],
+    }
+
+
+def build_bundle(payloads):
+    """
+    Assemble a bundle from the `_requests()` payloads, in the same order.
+    Returns (bundle, error); the first upstream error wins.
+    """
+    items = {}
+    for (kind, time_range, _, _), data in zip(_requests(), payloads):
+        if 'error' in data:
+            return None, data
+        items[kind, time_range] = data.get('items', [])
+
+    bundle = {
+        time_range: build_range(items['tracks', time_range], items['artists', time_range])
+        for time_range in TIME_RANGES
+    }
+    bundle['snapshot'] = build_snapshot(bundle['short_term'])
+    return bundle, None
+
+
+def _all_tracks(bundle):
+    return [track for time_range in TIME_RANGES for track in bundle[time_range]['tracks']]
+
+
+def add_track_genres(bundle, artists_by_id):
+    """
+    Genres weighted by top tracks rather than top artists, so artists who
+    only appear on tracks count too.
+    """
+    for time_range in TIME_RANGES:
+        bundle[time_range]['track_genres'] = genre_breakdown(bundle[time_range]['tracks'], artists_by_id, TOP_LIMIT)
+    return bundle
+
+
+def _finish_bundle(payloads, resolved):
+    """Build the bundle from `_requests()` payloads and the (artists_by_id, error) of each resolve."""
+    bundle, error = build_bundle(payloads)
+    if error:
+        return None, error
+    artists_by_id = {}
+    for found, error in resolved:
+        if error:
+            return None, error
+        artists_by_id.update(found)
+    return add_track_genres(bundle, artists_by_id), None
+
+
+def load_bundle(fetch):
+    """
+    Fetch all six payloads concurrently with a `spotify_request`-style
+    `fetch`. The artists on each top-tracks payload are resolved for their
+    genres as soon as it arrives, their batches fetched on the same pool
+    alongside the fetches still running. The catalog is only read and
+    written on this thread.
+    """
+    print("Re-fetching top items bundle")
+    requests = _requests()
+    catalog = get_catalog()
+    payloads = [None] * len(requests)
+    resolving, submitted = [], set()
+    with ThreadPoolExecutor(max_workers=len(requests) + get_http_settings()['PAGE_CONCURRENCY']) as executor:
+        pending = {
+            executor.submit(pooled(fetch), endpoint, params, cache=True): index
+            for index, (_, _, endpoint, params) in enumerate(requests)
+        }
+        for future in as_completed(pending):
+            index = pending[future]
+            data = payloads[index] = future.result()
+            if 'error' in data:
+                continue  # build_bundle reports it
+            if requests[index][0] == 'artists':
+                catalog.put_many('artist', data.get('items', []))
+                continue
+            ids = [artist_id for artist_id in artist_ids(data.get('items', [])) if artist_id not in submitted]
+            submitted.update(ids)
+            resolving.append(catalog.submit('artist', ids, fetch, executor))
+        resolved = [catalog.collect(pending) for pending in resolving]
+    return _finish_bundle(payloads, resolved)
+
+
+async def aload_bundle(fetch):
+    print("Re-fetching top items bundle")
+    catalog = get_catalog()
+    resolving, submitted = [], set()
+
+    async def load(kind, endpoint, params):
+        data = await fetch(endpoint, params, cache=True)
+        if 'error' in data:
+            return data
+        if kind == 'artists':
+            await sync_to_async(catalog.put_many)('artist', data.get('items', []))
+        else:
+            ids = [artist_id for artist_id in artist_ids(data.get('items', [])) if artist_id not in submitted]
+            submitted.update(ids)
+            resolving.append(asyncio.ensure_future(aresolve_artists(fetch, ids)))
+        return data
+
+    payloads = await asyncio.gather(*(load(kind, endpoint, params) for kind, _, endpoint, params in _requests()))
+    resolved = await asyncio.gather(*resolving)
+    return _finish_bundle(payloads, resolved)
+
+
+# The per-user cache holds only ids and counts; the tracks, artists and
+# albums themselves are shared between users through the catalog.
+CATALOG_SECTIONS = (('track', 'tracks'), ('artist', 'artists'), ('album', 'albums'))
+
+
+def _catalog_bundle_objects(catalog, bundle):
+    tracks = _all_tracks(bundle)
+    catalog.put_many('track', tracks)
+    catalog.put_many('album', [track.get('album') for track in tracks])
+
+
+def dehydrate(bundle):
+    """A bundle with every object replaced by its id."""
+    return {
+        time_range: {
+            'tracks': [track['id'] for track in bundle[time_range]['tracks']],
+            'artists': [artist['id'] for artist in bundle[time_range]['artists']],
+            'genres': bundle[time_range]['genres'],
+            'albums': [{'id': album['id'], 'count': album['count']} for album in bundle[time_range]['albums']],
+            'track_genres': bundle[time_range]['track_genres'],
+        }
+        for time_range in TIME_RANGES
+    }
+
+
+def _stored_ids(stored, section):
+    return list(dict.fromkeys(
+        entry['id'] if isinstance(entry, dict) else entry
+        for time_range in TIME_RANGES
+        for entry in stored[time_range][section]
+    ))
+
+
+def hydrate(stored, objects):
+    """Rebuild a full bundle from `dehydrate`'s output and {kind: {id: object}}."""
+    tracks, artists, albums = objects['track'], objects['artist'], objects['album']
+    bundle = {
+        time_range: {
+            'tracks': [tracks[track_id] for track_id in stored[time_range]['tracks'] if track_id in tracks],
+            'artists': [artists[artist_id] for artist_id in stored[time_range]['artists'] if artist_id in artists],
+            'genres': stored[time_range]['genres'],
+            'albums': [
+                {**albums[album['id']], 'count': album['count']}
+                for album in stored[time_range]['albums'] if album['id'] in albums
+            ],
+            'track_genres': stored[time_range]['track_genres'],
+        }
+        for time_range in TIME_RANGES
+    }
+    bundle['snapshot'] = build_snapshot(bundle['short_term'])
+    return bundle
+
+
+def get_bundle(user, fetch):
+    """The user's bundle, rebuilt once per BUNDLE_TTL. Returns (bundle, error)."""
+    catalog = get_catalog()
+
+    def compute():
+        bundle, error = load_bundle(fetch)
+        if error:
+            return None, error
+        _catalog_bundle_objects(catalog, bundle)
+        return dehydrate(bundle), None
+
+    stored, error = cached_value(bundle_key(user), compute, BUNDLE_TTL)
+    if error:
+        return None, error
+    objects = {}
+    for kind, section in CATALOG_SECTIONS:
+        objects[kind], error = catalog.resolve(kind, _stored_ids(stored, section), fetch)
+        if error:
+            return None, error
+    return hydrate(stored, objects), None
+
+
+async def aget_bundle(user, fetch):
+    catalog = get_catalog()
+
+    async def compute():
+        bundle, error = await aload_bundle(fetch)
+        if error:
+            return None, error
+        await sync_to_async(_catalog_bundle_objects)(catalog, bundle)
+        return dehydrate(bundle), None
+
+    stored, error = await acached_value(bundle_key(user), compute, BUNDLE_TTL)
+    if error:
+        return None, error
+    objects = {}
+    for kind, section in CATALOG_SECTIONS:
+        objects[kind], error = await catalog.aresolve(kind, _stored_ids(stored, section), fetch)
+        if error:
+            return None, error
+    return hydrate(stored, objects), None
@@ -0,0 +1,54 @@
+"""
+Resolve artist ids found on tracks to full artist objects (for their genres)
+through the catalog and its batched `/artists?ids=` lookups.
+"""
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+
+from .catalog import get_catalog
+
+
+def artist_ids(tracks):
+    """Distinct artist ids across track objects, in first-seen order."""
+    return list(dict.fromkeys(
+        artist['id']
+        for track in tracks if track
+        for artist in track.get('artists', []) if artist.get('id')
+    ))
+
+
+def resolve_artists(fetch, ids, known=None, max_workers=None):
+    """
+    Map each of `ids` to its artist object through the shared catalog, which
+    fetches what it lacks 50 per call with the batches in parallel. Artists
+    already in hand (e.g. a top-artists payload) go into the catalog first
+    instead of being fetched again. Returns (artists_by_id, error).
+    """
+    catalog = get_catalog()
+    if known:
+        catalog.put_many('artist', known)
+    return catalog.resolve('artist', ids, fetch, max_workers=max_workers)
+
+
+async def aresolve_artists(fetch, ids, known=None, max_workers=None):
+    """`resolve_artists` for an async `fetch`."""
+    catalog = get_catalog()
+    if known:
+        await sync_to_async(catalog.put_many)('artist', known)
+    return await catalog.aresolve('artist', ids, fetch, max_workers=max_workers)
+
+
+def track_genres(track, artists_by_id):
+    """A track's genres: the union of its artists' genres, in order."""
+    return list(dict.fromkeys(
+        genre
+        for artist in track.get('artists', [])
+        for genre in artists_by_id.get(artist.get('id'), {}).get('genres', [])
+    ))
+
+
+def genre_breakdown(tracks, artists_by_id, limit=None):
+    """How many of `tracks` carry each genre, most common first."""
+    counts = Counter(genre for track in tracks if track for genre in track_genres(track, artists_by_id))
+    return [{'genre': genre, 'count': count} for genre, count in counts.most_common(limit)]
@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from django.conf import settings
+
+DEFAULTS = {
+    'TTL': 60 * 5,
+    'MAX_ENTRIES': 2048,
+}
+
+
+def get_response_cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'SPOTIFY_RESPONSE_CACHE', {})}
+
+
+class ResponseCache:
+    """
+    In-process LRU of raw Spotify response bodies, keyed by
+    (Spotify user, endpoint, params) and expired after a TTL.
+
+    Bodies are stored as the bytes Spotify sent and decoded on every hit, so
+    callers always get their own objects and can't corrupt the cached copy.
+    Concurrent misses on one key share a single upstream call: the first
+    registers a future for the key (`begin_fetch`), the rest wait on it.
+    Nothing is locked during the fetch itself, so unrelated keys never
+    wait on each other.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        config = get_response_cache_settings()
+        self.max_entries = max_entries or config['MAX_ENTRIES']
+        self.ttl = ttl if ttl is not None else config['TTL']
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(user_key, url, params=None):
+        return (user_key, url, tuple(sorted((params or {}).items())))
+
+    def begin_fetch(self, key):
+        """
+        (future, owner) for a miss on `key`. The owner fetches and calls
+        `end_fetch`; everyone else waits on the future for (data, body).
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def count_coalesced(self):
+        """Count a miss that joined a fetch already under way elsewhere (e.g. another coroutine's)."""
+        with self._lock:
+            self.coalesced += 1
+
+    def end_fetch(self, key, future, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            body, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, key, body, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (body, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, user_key):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == user_key]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide `ResponseCache`, shared by the sync and async clients."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
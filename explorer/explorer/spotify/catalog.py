@@ -0,0 +1,253 @@
+"""
+Shared store of non-personal Spotify objects (tracks, albums, artists),
+keyed by Spotify id rather than by user.
+
+Lookups go through an in-process LRU first and then a shared tier: the
+Django cache by default, or the `CatalogEntry` table with
+SPOTIFY_CATALOG['SHARED'] = 'database'. Objects are stored in their
+compact projection (see projections.py). Whatever neither has is fetched
+through Spotify's batched `?ids=` endpoints. Cached objects are shared
+between callers and must be treated as read-only.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from ..models import CatalogEntry
+from .client import get_http_settings, pooled
+from .library import bulk_upsert
+from .projections import PROJECTIONS
+
+DEFAULTS = {
+    'TTL': 60 * 60 * 24,
+    'MAX_ENTRIES': 20000,
+    'SHARED': 'cache',  # 'cache', 'database' or None
+    'CACHE_ALIAS': 'default',
+}
+
+# kind -> (batch endpoint, response key, max ids per call)
+ENDPOINTS = {
+    'track': ('/tracks', 'tracks', 50),
+    'artist': ('/artists', 'artists', 50),
+    'album': ('/albums', 'albums', 20),
+}
+
+# Bump when the projections change so old shapes in the shared tier are ignored.
+FORMAT_VERSION = 2
+
+
+def get_catalog_settings():
+    return {**DEFAULTS, **getattr(settings, 'SPOTIFY_CATALOG', {})}
+
+
+class SpotifyCatalog:
+    def __init__(self, max_entries=None, ttl=None, shared=None, cache_alias=None):
+        config = get_catalog_settings()
+        self.max_entries = max_entries or config['MAX_ENTRIES']
+        self.ttl = ttl if ttl is not None else config['TTL']
+        self.shared = shared if shared is not None else config['SHARED']
+        self.cache_alias = cache_alias or config['CACHE_ALIAS']
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.fetched = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _shared_key(kind, spotify_id):
+        return f'catalog:v{FORMAT_VERSION}:{kind}:{spotify_id}'
+
+    def _remember(self, kind, objects):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for obj in objects:
+                key = (kind, obj['id'])
+                self._entries[key] = (obj, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _local(self, kind, ids):
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for spotify_id in ids:
+                entry = self._entries.get((kind, spotify_id))
+                if entry is None or entry[1] <= now:
+                    missing.append(spotify_id)
+                    continue
+                self._entries.move_to_end((kind, spotify_id))
+                found[spotify_id] = entry[0]
+            self.hits += len(found)
+        return found, missing
+
+    def _shared_get(self, kind, ids):
+        if self.shared == 'cache':
+            cached = caches[self.cache_alias].get_many([self._shared_key(kind, spotify_id) for spotify_id in ids])
+            return {obj['id']: obj for obj in cached.values()}
+        if self.shared == 'database':
+            cutoff = timezone.now() - timedelta(seconds=self.ttl)
+            rows = CatalogEntry.objects.filter(kind=kind, spotify_id__in=ids, updated_at__gte=cutoff)
+            # Rows outlive FORMAT_VERSION bumps, so project them on the way out.
+            project = PROJECTIONS[kind]
+            return {spotify_id: project(data) for spotify_id, data in rows.values_list('spotify_id', 'data')}
+        return {}
+
+    def _shared_put(self, kind, objects):
+        if self.shared == 'cache':
+            caches[self.cache_alias].set_many({self._shared_key(kind, obj['id']): obj for obj in objects}, self.ttl)
+        elif self.shared == 'database':
+            bulk_upsert(
+                CatalogEntry,
+                [CatalogEntry(kind=kind, spotify_id=obj['id'], data=obj) for obj in objects],
+                ['kind', 'spotify_id'], ['data', 'updated_at'],
+            )
+
+    def get_many(self, kind, ids):
+        """Whatever of `ids` the catalog already holds, as {id: object}."""
+        found, missing = self._local(kind, list(dict.fromkeys(ids)))
+        if missing and self.shared:
+            shared = self._shared_get(kind, missing)
+            self._remember(kind, shared.values())
+            found.update(shared)
+            with self._lock:
+                self.shared_hits += len(shared)
+                self.misses += len(missing) - len(shared)
+        elif missing:
+            with self._lock:
+                self.misses += len(missing)
+        return found
+
+    def put_many(self, kind, objects):
+        """
+        Store objects, e.g. ones that arrived inside a personalized payload.
+        Only their compact projection is kept.
+        """
+        project = PROJECTIONS[kind]
+        objects = list({obj['id']: project(obj) for obj in objects if obj and obj.get('id')}.values())
+        if objects:
+            self._remember(kind, objects)
+            if self.shared:
+                self._shared_put(kind, objects)
+        return objects
+
+    def _batches(self, kind, ids):
+        size = ENDPOINTS[kind][2]
+        return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+    def _store_batch(self, kind, data):
+        objects = self.put_many(kind, data.get(ENDPOINTS[kind][1], []))
+        with self._lock:
+            self.fetched += len(objects)
+        return objects
+
+    def _missing_batches(self, kind, ids, found):
+        return self._batches(kind, [spotify_id for spotify_id in dict.fromkeys(ids) if spotify_id not in found])
+
+    def _submit_batches(self, kind, found, batches, fetch, executor):
+        endpoint = ENDPOINTS[kind][0]
+        return kind, found, [executor.submit(pooled(fetch), endpoint, {'ids': ','.join(batch)}) for batch in batches]
+
+    def submit(self, kind, ids, fetch, executor):
+        """
+        Start resolving `ids`: what the catalog holds is looked up here, and
+        only the batches it lacks are fetched on `executor`, a pool the
+        caller already has. Hand the result to `collect` on this same
+        thread, so the catalog's database tier is never used from the pool.
+        """
+        found = self.get_many(kind, ids)
+        return self._submit_batches(kind, found, self._missing_batches(kind, ids, found), fetch, executor)
+
+    def collect(self, pending):
+        """Wait for a `submit` and store what it fetched. Returns (objects_by_id, error)."""
+        kind, found, futures = pending
+        error = None
+        for future in futures:
+            data = future.result()
+            if 'error' in data:
+                error = error or data
+                continue
+            found.update((obj['id'], obj) for obj in self._store_batch(kind, data))
+        return (None, error) if error else (found, None)
+
+    def resolve(self, kind, ids, fetch, max_workers=None):
+        """
+        {id: object} for every one of `ids`, fetching what the catalog lacks
+        in batches, concurrently. `fetch` follows the `spotify_request`
+        contract. Returns (objects_by_id, error).
+        """
+        found = self.get_many(kind, ids)
+        batches = self._missing_batches(kind, ids, found)
+        if not batches:
+            return found, None
+        workers = min(max_workers or get_http_settings()['PAGE_CONCURRENCY'], len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return self.collect(self._submit_batches(kind, found, batches, fetch, executor))
+
+    async def aresolve(self, kind, ids, fetch, max_workers=None):
+        """`resolve` for an async `fetch`."""
+        found = await sync_to_async(self.get_many)(kind, ids)
+        batches = self._missing_batches(kind, ids, found)
+        endpoint = ENDPOINTS[kind][0]
+        semaphore = asyncio.Semaphore(max_workers or get_http_settings()['PAGE_CONCURRENCY'])
+
+        async def fetch_batch(batch):
+            async with semaphore:
+                return await fetch(endpoint, {'ids': ','.join(batch)})
+
+        for data in await asyncio.gather(*(fetch_batch(batch) for batch in batches)):
+            if 'error' in data:
+                return None, data
+            objects = await sync_to_async(self._store_batch)(kind, data)
+            found.update((obj['id'], obj) for obj in objects)
+        return found, None
+
+    def prune(self):
+        """Drop expired rows from the database tier. Returns how many."""
+        if self.shared != 'database':
+            return 0
+        cutoff = timezone.now() - timedelta(seconds=self.ttl)
+        deleted, _ = CatalogEntry.objects.filter(updated_at__lt=cutoff).delete()
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'shared': self.shared,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'fetched': self.fetched,
+                'evictions': self.evictions,
+                'hit_ratio': round((self.hits + self.shared_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Process-wide `SpotifyCatalog`, built lazily from `settings.SPOTIFY_CATALOG`."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = SpotifyCatalog()
+    return _catalog
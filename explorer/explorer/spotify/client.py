@@ -0,0 +1,267 @@
+import json
+import os
+import threading
+from functools import wraps
+
+import requests
+from django.conf import settings
+from django.db import connections
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cache import get_response_cache
+from .ratelimit import get_limiter, get_rate_limit_settings, parse_retry_after
+
+API_BASE_URL = 'https://api.spotify.com/v1'
+TOKEN_URL = 'https://accounts.spotify.com/api/token'
+
+DEFAULTS = {
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 10,
+    'MAX_RETRIES': 2,
+    'BACKOFF_FACTOR': 0.3,
+    'POOL_CONNECTIONS': 4,
+    'POOL_MAXSIZE': 32,
+    'PAGE_CONCURRENCY': 8,
+}
+
+
+def get_http_settings():
+    return {**DEFAULTS, **getattr(settings, 'SPOTIFY_HTTP', {})}
+
+
+def pooled(func):
+    """
+    `func` for a worker thread of a short-lived pool. A `fetch` may touch
+    the database (a token refresh, the catalog), and nothing closes a pool
+    thread's connections, so they're closed once `func` returns.
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return run
+
+
+def api_url(endpoint):
+    """Spotify hands back absolute URLs for `next`/`href`, so accept both forms."""
+    if endpoint.startswith('http'):
+        return endpoint
+    return f'{API_BASE_URL}{endpoint}'
+
+
+class SpotifyClient:
+    """
+    Keep-alive HTTP client for the Spotify Web and Accounts APIs.
+
+    One `requests.Session` is kept per process so TCP/TLS connections to
+    api.spotify.com and accounts.spotify.com are pooled and reused between
+    requests. The session is rebuilt after a fork, since pooled sockets must
+    not be shared between worker processes.
+    """
+
+    def __init__(self, connect_timeout=None, read_timeout=None, max_retries=None,
+                 backoff_factor=None, pool_connections=None, pool_maxsize=None, limiter=None,
+                 response_cache=None):
+        config = get_http_settings()
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else config['CONNECT_TIMEOUT'],
+            read_timeout if read_timeout is not None else config['READ_TIMEOUT'],
+        )
+        self.max_retries = max_retries if max_retries is not None else config['MAX_RETRIES']
+        self.backoff_factor = backoff_factor if backoff_factor is not None else config['BACKOFF_FACTOR']
+        self.pool_connections = pool_connections or config['POOL_CONNECTIONS']
+        self.pool_maxsize = pool_maxsize or config['POOL_MAXSIZE']
+        self.limiter = limiter or get_limiter()
+        self.throttle_retries = get_rate_limit_settings()['MAX_THROTTLE_RETRIES']
+        self.response_cache = response_cache or get_response_cache()
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._adapter = None
+        self._pid = None
+        self._requests = 0
+        self._errors = 0
+
+    def _build_session(self):
+        # Only idempotent requests are retried; the authorization code
+        # exchange must never be replayed. 429s are left to the shared rate
+        # limiter so every worker backs off, not just this connection.
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+            respect_retry_after_header=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self._adapter = adapter
+        return session
+
+    @property
+    def session(self):
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session. Raises `requests.RequestException`."""
+        kwargs.setdefault('timeout', self.timeout)
+        self._requests += 1
+        try:
+            return self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self._errors += 1
+            raise
+
+    def api_get(self, endpoint, access_token, params=None, cache_as=None, cache_ttl=None):
+        """
+        GET a Web API endpoint and return the decoded JSON body.
+
+        Failures are returned as ``{'error': ..., 'status_code': ...}`` rather
+        than raised, which is what the views pass back to the frontend. Calls
+        are paced by the shared rate limiter, and a 429 is waited out and
+        retried rather than handed to the caller.
+
+        With `cache_as` (the Spotify user the data belongs to) the raw body
+        is served from, or stored in, the shared response cache, so views
+        deriving different things from one resource make one upstream call.
+        """
+        url = api_url(endpoint)
+        if cache_as is None:
+            return self._api_get(url, access_token, params)[0]
+
+        cache = self.response_cache
+        key = cache.make_key(cache_as, url, params)
+        body = cache.get(key)
+        if body is not None:
+            return json.loads(body)
+
+        future, owner = cache.begin_fetch(key)
+        if not owner:
+            data, body = future.result()
+            return data if body is None else json.loads(body)
+        try:
+            data, body = self._api_get(url, access_token, params)
+            if body is not None:
+                cache.set(key, body, ttl=cache_ttl)
+        except BaseException as e:
+            cache.end_fetch(key, future, error=e)
+            raise
+        cache.end_fetch(key, future, (data, body))
+        return data
+
+    def _api_get(self, url, access_token, params):
+        """Returns (data, raw body); the body is None when `data` is an error."""
+        headers = {'Authorization': f'Bearer {access_token}'}
+        try:
+            for attempt in range(self.throttle_retries + 1):
+                if not self.limiter.acquire():
+                    return {'error': 'Spotify rate limit exceeded.', 'status_code': 429}, None
+                response = self.request('GET', url, headers=headers, params=params)
+                if response.status_code != 429:
+                    break
+                self.limiter.backoff(parse_retry_after(response))
+            response.raise_for_status()
+            return response.json(), response.content
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 401:
+                return {'error': 'Spotify token may have expired.', 'status_code': 401}, None
+            return {'error': str(e), 'status_code': e.response.status_code}, None
+        except requests.exceptions.RequestException as e:
+            return {'error': f'Network error: {str(e)}', 'status_code': 503}, None
+
+    def exchange_code(self, code, verifier, redirect_uri):
+        response = self.request(
+            'POST',
+            TOKEN_URL,
+            data={
+                'grant_type': 'authorization_code',
+                'code': code,
+                'redirect_uri': redirect_uri,
+                'client_id': os.getenv('SPOTIFY_CLIENT_ID'),
+                'code_verifier': verifier,
+            },
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def refresh_access_token(self, refresh_token):
+        response = self.request(
+            'POST',
+            TOKEN_URL,
+            data={
+                'grant_type': 'refresh_token',
+                'refresh_token': refresh_token,
+                'client_id': os.getenv('SPOTIFY_CLIENT_ID'),
+                'client_secret': os.getenv('SPOTIFY_CLIENT_SECRET'),
+            },
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+        )
+        if response.status_code != 200:
+            raise Exception('Failed to refresh token')
+        return response.json()
+
+    def stats(self):
+        """
+        Pool counters for this process. urllib3 counts every new socket in
+        `num_connections` and every request in `num_requests`; the difference
+        is the number of requests that reused a kept-alive connection.
+        """
+        pools = {}
+        adapter = self._adapter
+        if adapter is not None and self._pid == os.getpid():
+            manager = adapter.poolmanager
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                pools[f'{pool.scheme}://{pool.host}'] = {
+                    'connections_opened': pool.num_connections,
+                    'requests': pool.num_requests,
+                    'reused': max(pool.num_requests - pool.num_connections, 0),
+                }
+
+        opened = sum(p['connections_opened'] for p in pools.values())
+        reused = sum(p['reused'] for p in pools.values())
+        return {
+            'pid': os.getpid(),
+            'requests': self._requests,
+            'errors': self._errors,
+            'connections_opened': opened,
+            'connections_reused': reused,
+            'reuse_ratio': round(reused / (opened + reused), 3) if opened + reused else 0.0,
+            'pools': pools,
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide `SpotifyClient`, built lazily from `settings.SPOTIFY_HTTP`."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SpotifyClient()
+    return _client
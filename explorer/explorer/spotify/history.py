@@ -0,0 +1,190 @@
+"""
+History of each user's top tracks, artists and genres, recorded by
+`manage.py snapshot_top_items` and read back by the trend endpoint without
+going to Spotify.
+
+Every (user, kind, time_range) is a series of `TopItemsSnapshot` rows whose
+`ids` hold the ranking (rank = index + 1). Rows are delta-encoded against
+the previous row of the series: a token [start, length] copies that run of
+the previous ranking and a string is an id placed individually, so an
+unchanged top 50 is stored as [[0, 50]]. Every KEYFRAME_INTERVAL rows the
+full id list is stored again, which bounds how far back decoding reads.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from ..models import TopItemsSnapshot
+from .analytics import TIME_RANGES
+
+DEFAULTS = {
+    'KEYFRAME_INTERVAL': 30,
+    # `snapshot_top_items` skips users snapshotted more recently than this.
+    'MIN_INTERVAL': 60 * 60 * 12,
+}
+
+KINDS = ('tracks', 'artists', 'genres')
+# Bounds for the trend endpoint's ?days= and ?limit=.
+MAX_DAYS = 365 * 10
+
+
+def get_history_settings():
+    return {**DEFAULTS, **getattr(settings, 'SPOTIFY_HISTORY', {})}
+
+
+def encode(ids, previous):
+    """Delta-encode the ranking `ids` against the `previous` ranking."""
+    positions = {item_id: index for index, item_id in enumerate(previous)}
+    tokens = []
+    for item_id in ids:
+        index = positions.get(item_id)
+        if index is None:
+            tokens.append(item_id)
+        elif tokens and isinstance(tokens[-1], list) and sum(tokens[-1]) == index:
+            tokens[-1][1] += 1
+        else:
+            tokens.append([index, 1])
+    return tokens
+
+
+def decode(tokens, previous):
+    """Inverse of `encode`."""
+    ids = []
+    for token in tokens:
+        if isinstance(token, str):
+            ids.append(token)
+        else:
+            start, length = token
+            ids.extend(previous[start:start + length])
+    return ids
+
+
+def bundle_series(bundle):
+    """{(kind, time_range): (ids, counts)} for a top-items bundle."""
+    series = {}
+    for time_range in TIME_RANGES:
+        section = bundle[time_range]
+        series['tracks', time_range] = ([track['id'] for track in section['tracks']], None)
+        series['artists', time_range] = ([artist['id'] for artist in section['artists']], None)
+        series['genres', time_range] = (
+            [entry['genre'] for entry in section['genres']],
+            [entry['count'] for entry in section['genres']],
+        )
+    return series
+
+
+def _decoded(rows):
+    """(row, ids) for consecutive rows of one series, from its first keyframe on."""
+    previous = None
+    for row in rows:
+        if row.keyframe:
+            ids = list(row.ids)
+        elif previous is None:
+            continue
+        else:
+            ids = decode(row.ids, previous)
+        previous = ids
+        yield row, ids
+
+
+def _latest(user):
+    """{(kind, time_range): (ids, rows since the last keyframe)} for `user`."""
+    keyframes = (
+        TopItemsSnapshot.objects.filter(user=user, keyframe=True)
+        .values('kind', 'time_range').annotate(last=Max('taken_at'))
+    )
+    starts = {(keyframe['kind'], keyframe['time_range']): keyframe['last'] for keyframe in keyframes}
+    if not starts:
+        return {}
+
+    by_series = defaultdict(list)
+    for row in TopItemsSnapshot.objects.filter(user=user, taken_at__gte=min(starts.values())).order_by('taken_at', 'pk'):
+        key = (row.kind, row.time_range)
+        if key in starts and row.taken_at >= starts[key]:
+            by_series[key].append(row)
+
+    latest = {}
+    for key, rows in by_series.items():
+        ids = None
+        for _, ids in _decoded(rows):
+            pass
+        latest[key] = (ids, len(rows))
+    return latest
+
+
+def last_snapshot_at(user):
+    return TopItemsSnapshot.objects.filter(user=user).aggregate(last=Max('taken_at'))['last']
+
+
+def is_due(user):
+    last = last_snapshot_at(user)
+    return last is None or timezone.now() - last >= timedelta(seconds=get_history_settings()['MIN_INTERVAL'])
+
+
+def record_snapshot(user, bundle, taken_at=None):
+    """Append one row per (kind, time_range) of `bundle` to `user`'s history."""
+    taken_at = taken_at or timezone.now()
+    interval = get_history_settings()['KEYFRAME_INTERVAL']
+    latest = _latest(user)
+
+    rows = []
+    for (kind, time_range), (ids, counts) in bundle_series(bundle).items():
+        previous, since_keyframe = latest.get((kind, time_range), (None, 0))
+        keyframe = previous is None or since_keyframe >= interval
+        rows.append(TopItemsSnapshot(
+            user=user, kind=kind, time_range=time_range, taken_at=taken_at, keyframe=keyframe,
+            ids=ids if keyframe else encode(ids, previous), counts=counts,
+        ))
+    return TopItemsSnapshot.objects.bulk_create(rows)
+
+
+def history(user, kind, time_range, since=None, until=None):
+    """Decoded snapshots of one series, oldest first, as (taken_at, ids, counts)."""
+    rows = TopItemsSnapshot.objects.filter(user=user, kind=kind, time_range=time_range)
+    if until:
+        rows = rows.filter(taken_at__lte=until)
+    if since:
+        # Decoding starts at the last keyframe before the window.
+        start = (
+            rows.filter(keyframe=True, taken_at__lte=since)
+            .order_by('-taken_at').values_list('taken_at', flat=True).first()
+        )
+        rows = rows.filter(taken_at__gte=start or since)
+    return [
+        (row.taken_at, ids, row.counts)
+        for row, ids in _decoded(rows.order_by('taken_at', 'pk'))
+        if not since or row.taken_at >= since
+    ]
+
+
+def trend(user, kind, time_range, since=None, limit=10):
+    """
+    Chart data for one series: the snapshot times, and for every item that
+    made the top `limit` at any point its rank (and count, for genres) at
+    each of them, or None where it was outside the top items.
+    """
+    points = history(user, kind, time_range, since=since)
+    ranks = [{item_id: rank for rank, item_id in enumerate(ids, 1)} for _, ids, _ in points]
+    counts = [dict(zip(ids, point_counts)) if point_counts else {} for _, ids, point_counts in points]
+
+    charted = list(dict.fromkeys(item_id for _, ids, _ in reversed(points) for item_id in ids[:limit]))
+    latest = ranks[-1] if ranks else {}
+    charted.sort(key=lambda item_id: (latest.get(item_id, float('inf')), min(
+        point.get(item_id, float('inf')) for point in ranks
+    )))
+
+    series = []
+    for item_id in charted:
+        entry = {'id': item_id, 'ranks': [point.get(item_id) for point in ranks]}
+        if kind == 'genres':
+            entry['counts'] = [point.get(item_id) for point in counts]
+        series.append(entry)
+    return {
+        'kind': kind,
+        'time_range': time_range,
+        'taken_at': [taken_at for taken_at, _, _ in points],
+        'series': series,
+    }
@@ -0,0 +1,250 @@
+"""
+Mirror of each user's Spotify playlists and their tracks in the `Playlist`
+and `Track` tables.
+
+A sync reads the playlist listing, upserts it, and then re-fetches tracks
+only for playlists whose `snapshot_id` moved since their tracks were last
+stored (`tracks_snapshot_id`). Reads are served from the tables in the same
+shape as Spotify's objects, so the frontend can't tell the difference.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ..models import Playlist, SpotifyUser, Track
+from . import playlists as playlist_cache
+from .client import get_http_settings
+from .pagination import collect_items, iter_pages
+from .tokens import request_as
+
+DEFAULTS = {
+    # How long after a sync the playlist list is served from the database
+    # without re-reading the listing from Spotify.
+    'MAX_AGE': 60 * 5,
+    'BATCH_SIZE': 500,
+}
+
+PLAYLIST_UPDATE_FIELDS = [
+    'name', 'description', 'image_url', 'external_url', 'owner_name', 'position', 'track_count', 'snapshot_id',
+]
+# Stored playlists are rendered with fewer fields than `load_playlist` gives,
+# so their ETags must differ from the snapshot cache's.
+ETAG_VARIANT = 'library'
+
+TRACK_UPDATE_FIELDS = [
+    'spotify_track_id', 'title', 'artist', 'artists', 'album', 'image_url', 'duration_ms', 'spotify_added_at',
+    'status', 'youtube_video_id', 'downloaded_path',
+]
+
+
+def get_library_settings():
+    return {**DEFAULTS, **getattr(settings, 'SPOTIFY_LIBRARY', {})}
+
+
+def _first_image(images):
+    return images[0].get('url') if images else None
+
+
+def _clip(value, length=255):
+    return (value or '')[:length]
+
+
+def bulk_upsert(model, rows, unique_fields, update_fields):
+    """`bulk_create` that updates rows which already exist."""
+    kwargs = {}
+    # MySQL upserts on any unique key and refuses an explicit conflict target.
+    if connection.features.supports_update_conflicts_with_target:
+        kwargs['unique_fields'] = unique_fields
+    model.objects.bulk_create(
+        rows, batch_size=get_library_settings()['BATCH_SIZE'],
+        update_conflicts=True, update_fields=update_fields, **kwargs,
+    )
+
+
+def is_fresh(user):
+    synced_at = user.library_synced_at
+    return bool(synced_at) and (timezone.now() - synced_at).total_seconds() < get_library_settings()['MAX_AGE']
+
+
+def store_playlists(user, items):
+    """
+    Upsert a `/me/playlists` listing for `user` and drop playlists no longer
+    in it. Returns the playlists whose stored tracks are out of date.
+    """
+    rows, seen = [], set()
+    for item in items:
+        if not item or not item.get('id') or item['id'] in seen:
+            continue
+        seen.add(item['id'])
+        rows.append(Playlist(
+            user=user,
+            spotify_id=item['id'],
+            name=_clip(item.get('name')),
+            description=item.get('description') or '',
+            image_url=_first_image(item.get('images')),
+            external_url=(item.get('external_urls') or {}).get('spotify'),
+            owner_name=_clip((item.get('owner') or {}).get('display_name')),
+            position=len(rows),
+            track_count=(item.get('tracks') or {}).get('total') or 0,
+            snapshot_id=item.get('snapshot_id') or '',
+        ))
+
+    now = timezone.now()
+    with transaction.atomic():
+        bulk_upsert(Playlist, rows, ['user', 'spotify_id'], PLAYLIST_UPDATE_FIELDS)
+        Playlist.objects.filter(user=user).exclude(spotify_id__in=seen).delete()
+        SpotifyUser.objects.filter(pk=user.pk).update(library_synced_at=now)
+    user.library_synced_at = now
+    playlist_cache.remember_snapshots(user.spotify_id, items)
+    return list(Playlist.objects.filter(user=user).exclude(tracks_snapshot_id=F('snapshot_id')))
+
+
+def store_tracks(playlist, items, snapshot_id, save=True):
+    """
+    Replace `playlist`'s stored tracks with `items` and mark them as
+    reflecting `snapshot_id`. Every item is kept at its position, local
+    files and repeats included, and download state follows a track to
+    wherever it moved. With `save=False` the caller is expected to
+    `bulk_update` the playlist.
+    """
+    state = {
+        track_id: (status, video_id, path)
+        for track_id, status, video_id, path in playlist.tracks.exclude(spotify_track_id=None).values_list(
+            'spotify_track_id', 'status', 'youtube_video_id', 'downloaded_path',
+        )
+    }
+    rows = []
+    for position, item in enumerate(items):
+        track = (item or {}).get('track')
+        if not track:
+            continue
+        album = track.get('album') or {}
+        artists = [{'id': artist.get('id'), 'name': artist.get('name') or ''} for artist in track.get('artists', [])]
+        status, video_id, path = state.get(track.get('id'), ('pending', None, None))
+        rows.append(Track(
+            playlist=playlist,
+            spotify_track_id=track.get('id'),
+            title=_clip(track.get('name')),
+            artist=_clip(', '.join(artist['name'] for artist in artists)),
+            artists=artists,
+            album=_clip(album.get('name')),
+            image_url=_first_image(album.get('images')),
+            duration_ms=track.get('duration_ms') or 0,
+            position=position,
+            spotify_added_at=parse_datetime(item['added_at']) if item.get('added_at') else None,
+            status=status,
+            youtube_video_id=video_id,
+            downloaded_path=path,
+        ))
+
+    with transaction.atomic():
+        bulk_upsert(Track, rows, ['playlist', 'position'], TRACK_UPDATE_FIELDS)
+        playlist.tracks.exclude(position__in=[row.position for row in rows]).delete()
+
+    playlist.snapshot_id = playlist.tracks_snapshot_id = snapshot_id
+    playlist.track_count = len(items)
+    playlist.synced_at = timezone.now()
+    if save:
+        playlist.save(update_fields=['snapshot_id', 'tracks_snapshot_id', 'track_count', 'synced_at'])
+    return playlist
+
+
+def sync_playlists(user, fetch):
+    """Re-read and store the playlist listing. Returns (stale playlists, error)."""
+    items, error = collect_items(iter_pages(fetch, '/me/playlists'))
+    if error:
+        return None, error
+    return store_playlists(user, items), None
+
+
+def sync_library(user, fetch=None, force=False):
+    """
+    Bring `user`'s mirror up to date. Tracks are fetched for playlists whose
+    snapshot changed (every playlist with `force`), several playlists at a
+    time; writes stay on the calling thread. Returns (summary, error).
+    """
+    fetch = fetch or partial(request_as, user)
+    stale, error = sync_playlists(user, fetch)
+    if error:
+        return None, error
+    if force:
+        stale = list(user.playlists.all())
+
+    synced, failed = [], []
+    if stale:
+        workers = min(get_http_settings()['PAGE_CONCURRENCY'], len(stale))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # One page at a time within a playlist; the concurrency is across playlists.
+            results = executor.map(lambda playlist: playlist_cache.load_tracks(fetch, playlist.spotify_id, max_workers=1), stale)
+            for playlist, (items, error) in zip(stale, results):
+                if error:
+                    print(f"Failed to sync playlist {playlist.spotify_id}: {error.get('error')}")
+                    failed.append(playlist.spotify_id)
+                    continue
+                synced.append(store_tracks(playlist, items, playlist.snapshot_id, save=False))
+        Playlist.objects.bulk_update(
+            synced, ['snapshot_id', 'tracks_snapshot_id', 'track_count', 'synced_at'],
+            batch_size=get_library_settings()['BATCH_SIZE'],
+        )
+
+    return {
+        'playlists': user.playlists.count(),
+        'synced': len(synced),
+        'failed': failed,
+    }, None
+
+
+def find_playlist(user, playlist_id):
+    return Playlist.objects.filter(user=user, spotify_id=playlist_id).first()
+
+
+def known_snapshot(user, playlist, playlist_id):
+    """The snapshot we can trust without asking Spotify, if any."""
+    if playlist and is_fresh(user):
+        return playlist.snapshot_id or None
+    return playlist_cache.known_snapshot(user.spotify_id, playlist_id)
+
+
+def _playlist_json(playlist):
+    return {
+        'id': playlist.spotify_id,
+        'name': playlist.name,
+        'description': playlist.description,
+        'snapshot_id': playlist.snapshot_id,
+        'images': [{'url': playlist.image_url}] if playlist.image_url else [],
+        'external_urls': {'spotify': playlist.external_url},
+        'owner': {'display_name': playlist.owner_name},
+        'tracks': {'total': playlist.track_count},
+    }
+
+
+def list_playlists(user):
+    """The stored listing, shaped like `/me/playlists` items."""
+    return [_playlist_json(playlist) for playlist in user.playlists.order_by('position')]
+
+
+def playlist_detail(playlist):
+    """A stored playlist and its tracks, shaped like `load_playlist`'s result."""
+    items = [
+        {
+            'added_at': added_at.isoformat() if added_at else None,
+            'track': {
+                'id': track_id,
+                'name': title,
+                'artists': artists or [{'name': artist}],
+                'album': {'name': album, 'images': [{'url': image_url}] if image_url else []},
+                'duration_ms': duration_ms,
+            },
+        }
+        for track_id, title, artist, artists, album, image_url, duration_ms, added_at in playlist.tracks.order_by('position').values_list(
+            'spotify_track_id', 'title', 'artist', 'artists', 'album', 'image_url', 'duration_ms', 'spotify_added_at',
+        )
+    ]
+    data = _playlist_json(playlist)
+    data['tracks'] = {'total': playlist.track_count, 'items': items}
+    return data
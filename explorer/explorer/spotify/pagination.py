@@ -0,0 +1,87 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .client import get_http_settings
+
+
+def _page_params(params, page_size, offset):
+    return {**(params or {}), 'limit': page_size, 'offset': offset}
+
+
+def _remaining_offsets(first_page, page_size):
+    return range(page_size, first_page.get('total') or 0, page_size)
+
+
+def iter_pages(fetch, endpoint, params=None, page_size=50, max_workers=None, first_page=None):
+    """
+    Yield every page of an offset-paginated Spotify endpoint, in order.
+
+    The first page's `total` gives every remaining offset up front, so the
+    rest are fetched concurrently (at most `max_workers` at a time) instead
+    of by following `next` one round trip at a time. `fetch(endpoint, params)`
+    follows the `spotify_request` contract; iteration stops after the first
+    page that comes back as an error. Pass `first_page` when it was already
+    returned embedded in another object, e.g. a playlist's `tracks`.
+    """
+    max_workers = max_workers or get_http_settings()['PAGE_CONCURRENCY']
+    first = first_page if first_page is not None else fetch(endpoint, _page_params(params, page_size, 0))
+    yield first
+    if 'error' in first:
+        return
+
+    offsets = _remaining_offsets(first, page_size)
+    if not offsets:
+        return
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(offsets)))
+    try:
+        for page in executor.map(lambda offset: fetch(endpoint, _page_params(params, page_size, offset)), offsets):
+            yield page
+            if 'error' in page:
+                return
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def aiter_pages(fetch, endpoint, params=None, page_size=50, max_workers=None, first_page=None):
+    """`iter_pages` for an async `fetch`, bounded by a semaphore."""
+    max_workers = max_workers or get_http_settings()['PAGE_CONCURRENCY']
+    first = first_page if first_page is not None else await fetch(endpoint, _page_params(params, page_size, 0))
+    yield first
+    if 'error' in first:
+        return
+
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def fetch_page(offset):
+        async with semaphore:
+            return await fetch(endpoint, _page_params(params, page_size, offset))
+
+    tasks = [asyncio.ensure_future(fetch_page(offset)) for offset in _remaining_offsets(first, page_size)]
+    try:
+        for task in tasks:
+            page = await task
+            yield page
+            if 'error' in page:
+                return
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def collect_items(pages):
+    """Flatten pages into one item list. Returns (items, error)."""
+    items = []
+    for page in pages:
+        if 'error' in page:
+            return None, page
+        items.extend(page.get('items', []))
+    return items, None
+
+
+async def acollect_items(pages):
+    items = []
+    async for page in pages:
+        if 'error' in page:
+            return None, page
+        items.extend(page.get('items', []))
+    return items, None
@@ -0,0 +1,130 @@
+import hashlib
+
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from .pagination import acollect_items, aiter_pages, collect_items, iter_pages
+
+# How long a snapshot id seen in a user's playlist list is trusted without
+# asking Spotify again. PlaylistsView refreshes these on every dashboard load.
+# Kept short, since an edit made in Spotify meanwhile is served stale; a
+# conditional request always revalidates (see PlaylistDetailView).
+SNAPSHOT_INDEX_TTL = 60
+
+# A (playlist, snapshot) pair never changes, so the body can live until evicted.
+PLAYLIST_TTL = 60 * 60 * 24
+
+# Only what the playlist page and the downloader read. Without a projection
+# every track drags along its full album and `available_markets` lists.
+TRACK_FIELDS = 'added_at,track(id,name,uri,duration_ms,explicit,artists(id,name),album(id,name,images))'
+PLAYLIST_FIELDS = f'id,name,description,snapshot_id,images,external_urls,owner(id,display_name),tracks(total,items({TRACK_FIELDS}))'
+TRACK_PAGE_FIELDS = f'total,items({TRACK_FIELDS})'
+TRACK_PAGE_SIZE = 100
+
+# Part of every cache key and ETag, so changing the projection can never serve
+# a body (or a 304) of the old shape.
+BODY_VERSION = hashlib.md5(PLAYLIST_FIELDS.encode()).hexdigest()[:8]
+
+
+def _index_key(user_key, playlist_id):
+    return f'playlist-snapshot:{user_key}:{playlist_id}'
+
+
+def _content_key(playlist_id, snapshot_id):
+    return f'playlist:{BODY_VERSION}:{playlist_id}:{snapshot_id}'
+
+
+def remember_snapshots(user_key, playlists):
+    """Record the snapshot ids from a `/me/playlists` listing for `user_key`."""
+    cache.set_many({
+        _index_key(user_key, playlist['id']): playlist['snapshot_id']
+        for playlist in playlists
+        if playlist and playlist.get('id') and playlist.get('snapshot_id')
+    }, SNAPSHOT_INDEX_TTL)
+
+
+def known_snapshot(user_key, playlist_id):
+    return cache.get(_index_key(user_key, playlist_id))
+
+
+def get_cached_playlist(playlist_id, snapshot_id):
+    return cache.get(_content_key(playlist_id, snapshot_id))
+
+
+def store_playlist(user_key, playlist):
+    """
+    Cache a full playlist under its snapshot id. The index entry is per user,
+    so a cached body is only served to users who have been shown that
+    snapshot by Spotify themselves.
+    """
+    playlist_id, snapshot_id = playlist.get('id'), playlist.get('snapshot_id')
+    if not playlist_id or not snapshot_id:
+        return
+    cache.set(_content_key(playlist_id, snapshot_id), playlist, PLAYLIST_TTL)
+    cache.set(_index_key(user_key, playlist_id), snapshot_id, SNAPSHOT_INDEX_TTL)
+
+
+def playlist_etag(playlist_id, snapshot_id, variant=''):
+    digest = hashlib.md5(f'{BODY_VERSION}:{playlist_id}:{snapshot_id}:{variant}'.encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    # Weak comparison: compressed responses carry the ETag as W/"...".
+    candidates = [candidate.strip().removeprefix('W/') for candidate in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+def not_modified(etag):
+    return Response(status=304, headers=cache_headers(etag))
+
+
+def cache_headers(etag):
+    # `no-cache` makes the browser revalidate every time, which with a strong
+    # ETag costs a 304 and one `fields=snapshot_id` call upstream.
+    return {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+
+def load_tracks(fetch, playlist_id, first_page=None, max_workers=None):
+    """Every track item of a playlist, projected. Returns (items, error)."""
+    return collect_items(iter_pages(
+        fetch, f'/playlists/{playlist_id}/tracks', {'fields': TRACK_PAGE_FIELDS},
+        page_size=TRACK_PAGE_SIZE, max_workers=max_workers, first_page=first_page,
+    ))
+
+
+async def aload_tracks(fetch, playlist_id, first_page=None, max_workers=None):
+    return await acollect_items(aiter_pages(
+        fetch, f'/playlists/{playlist_id}/tracks', {'fields': TRACK_PAGE_FIELDS},
+        page_size=TRACK_PAGE_SIZE, max_workers=max_workers, first_page=first_page,
+    ))
+
+
+def _with_items(playlist, items):
+    playlist['tracks'] = {**playlist.get('tracks', {}), 'items': items}
+    return playlist
+
+
+def load_playlist(fetch, playlist_id):
+    """
+    Fetch a playlist with every one of its tracks, not just the first 100
+    Spotify embeds. The remaining track pages are fetched concurrently.
+    `fetch` follows the `spotify_request` contract, and so does the result.
+    """
+    playlist = fetch(f'/playlists/{playlist_id}', {'fields': PLAYLIST_FIELDS})
+    if 'error' in playlist:
+        return playlist
+    items, error = load_tracks(fetch, playlist_id, first_page=playlist.get('tracks') or {})
+    return error or _with_items(playlist, items)
+
+
+async def aload_playlist(fetch, playlist_id):
+    """`load_playlist` for an async `fetch`."""
+    playlist = await fetch(f'/playlists/{playlist_id}', {'fields': PLAYLIST_FIELDS})
+    if 'error' in playlist:
+        return playlist
+    items, error = await aload_tracks(fetch, playlist_id, first_page=playlist.get('tracks') or {})
+    return error or _with_items(playlist, items)
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    'RATE': 10.0,
+    'BURST': 20,
+    'MAX_WAIT': 30.0,
+    'MAX_THROTTLE_RETRIES': 3,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_rate_limit_settings():
+    return {**DEFAULTS, **getattr(settings, 'SPOTIFY_RATE_LIMIT', {})}
+
+
+class SpotifyRateLimiter:
+    """
+    Rate limit for Web API calls, keyed on the app's SPOTIFY_CLIENT_ID since
+    that is what Spotify rate limits on.
+
+    Time is cut into windows of BURST / RATE seconds, each good for BURST
+    calls, counted in the configured Django cache, so every worker process
+    pointed at the same cache draws from one budget. A call takes a place
+    with the cache's atomic `incr` (Redis INCR), in the current window or
+    the first later one with room, and is told how long to wait for it
+    instead of being refused. That spreads bursts out rather than tripping
+    Spotify's 429s, and needs no lock. When Spotify does answer 429,
+    `backoff()` holds every window back until `Retry-After` has passed.
+    """
+
+    def __init__(self, client_id=None, rate=None, burst=None, max_wait=None, cache_alias=None):
+        config = get_rate_limit_settings()
+        client_id = client_id or os.getenv('SPOTIFY_CLIENT_ID') or 'default'
+        self.rate = float(rate or config['RATE'])
+        self.burst = int(burst or config['BURST'])
+        self.max_wait = float(max_wait if max_wait is not None else config['MAX_WAIT'])
+        self.cache_alias = cache_alias or config['CACHE_ALIAS']
+        self.window = self.burst / self.rate  # seconds
+
+        self.key_prefix = f'spotify-ratelimit:{client_id}'
+        self.blocked_key = f'{self.key_prefix}:blocked-until'
+
+        self._metrics_lock = threading.Lock()
+        self._acquired = 0
+        self._delayed = 0
+        self._rejected = 0
+        self._throttled = 0
+        self._total_wait = 0.0
+        self._max_wait_seen = 0.0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _take(self, window):
+        """Count a call against `window`. Returns whether it had room."""
+        key = f'{self.key_prefix}:{window}'
+        # Kept until the furthest window a reservation can land in is over.
+        timeout = int(self.max_wait + 2 * self.window) + 1
+        while True:
+            self.cache.add(key, 0, timeout=timeout)
+            try:
+                return self.cache.incr(key) <= self.burst
+            except ValueError:  # expired between add and incr
+                continue
+
+    def reserve(self):
+        """
+        Take one call's place and return how many seconds the caller must
+        wait before using it, or None if that would exceed MAX_WAIT (nothing
+        is taken). Never waits itself.
+        """
+        now = time.time()
+        start = max(now, self.cache.get(self.blocked_key) or 0.0)
+        window, last = int(start // self.window), int((now + self.max_wait) // self.window)
+        while window <= last:
+            if self._take(window):
+                wait = max(window * self.window, start) - now
+                self._record(wait)
+                return wait
+            window += 1
+        self._record(None)
+        return None
+
+    def acquire(self):
+        """Block until a request may be sent. Returns False if the wait would exceed MAX_WAIT."""
+        wait = self.reserve()
+        if wait is None:
+            return False
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    async def acquire_async(self):
+        # A couple of cache round trips; kept off the shared thread that
+        # sync_to_async otherwise runs everything in.
+        wait = await sync_to_async(self.reserve, thread_sensitive=False)()
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
+
+    def backoff(self, retry_after):
+        """Record a 429 from Spotify: nobody may send until Retry-After has passed."""
+        with self._metrics_lock:
+            self._throttled += 1
+        until = time.time() + retry_after
+        # Two 429s at once can only race to set about the same moment, so a
+        # plain compare and set is enough here.
+        if until > (self.cache.get(self.blocked_key) or 0.0):
+            self.cache.set(self.blocked_key, until, timeout=int(retry_after) + 1)
+
+    def _record(self, wait):
+        with self._metrics_lock:
+            if wait is None:
+                self._rejected += 1
+                return
+            self._acquired += 1
+            if wait > 0:
+                self._delayed += 1
+                self._total_wait += wait
+                self._max_wait_seen = max(self._max_wait_seen, wait)
+
+    def stats(self):
+        """Wait-time metrics for this process; bucket state itself is shared."""
+        with self._metrics_lock:
+            return {
+                'pid': os.getpid(),
+                'acquired': self._acquired,
+                'delayed': self._delayed,
+                'rejected': self._rejected,
+                'throttled': self._throttled,
+                'total_wait_seconds': round(self._total_wait, 3),
+                'avg_wait_seconds': round(self._total_wait / self._delayed, 3) if self._delayed else 0.0,
+                'max_wait_seconds': round(self._max_wait_seen, 3),
+            }
+
+
+def parse_retry_after(response, default=1):
+    try:
+        return max(float(response.headers.get('Retry-After', default)), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Process-wide `SpotifyRateLimiter`, built lazily from `settings.SPOTIFY_RATE_LIMIT`."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = SpotifyRateLimiter()
+    return _limiter
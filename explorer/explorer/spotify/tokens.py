@@ -0,0 +1,262 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.utils import timezone
+
+from ..models import SpotifyUser
+from .aio import get_async_client
+from .client import get_client
+
+DEFAULTS = {
+    'REFRESH_AHEAD': 300,
+    'LOCK_TIMEOUT': 15,
+    'CACHE_ALIAS': 'default',
+}
+
+POLL_INTERVAL = 0.05
+
+
+def get_token_settings():
+    return {**DEFAULTS, **getattr(settings, 'SPOTIFY_TOKENS', {})}
+
+
+def _off_loop(func):
+    """
+    `func` for the event loop, on a pool thread rather than the single
+    thread sync_to_async shares between everything by default: a refresh can
+    wait up to LOCK_TIMEOUT for another process's. Nothing else closes the
+    pool thread's database connection, so it's closed afterwards.
+    """
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+class SpotifyTokenManager:
+    """
+    Hands out Spotify access tokens for a `SpotifyUser`.
+
+    The current token and its expiry are cached per user, so the hot path is a
+    single cache read. Tokens inside the REFRESH_AHEAD window are refreshed on
+    a background thread while the still-valid token is returned. An expired
+    token is refreshed inline, but only once per user across all processes:
+    the refresh runs under a cache lock and everyone else waits for the
+    result. Only the token columns are written back.
+    """
+
+    def __init__(self, refresh_ahead=None, lock_timeout=None, cache_alias=None):
+        config = get_token_settings()
+        self.refresh_ahead = refresh_ahead if refresh_ahead is not None else config['REFRESH_AHEAD']
+        self.lock_timeout = lock_timeout or config['LOCK_TIMEOUT']
+        self.cache_alias = cache_alias or config['CACHE_ALIAS']
+
+        self._local_locks = {}
+        self._local_locks_guard = threading.Lock()
+        self._scheduled = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='spotify-token-refresh')
+
+        self.refreshes = 0
+        self.coalesced = 0
+        self.background_refreshes = 0
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _cache_key(self, user_id):
+        return f'spotify-token:{user_id}'
+
+    def _lock_key(self, user_id):
+        return f'spotify-token:{user_id}:lock'
+
+    def _local_lock(self, user_id):
+        with self._local_locks_guard:
+            return self._local_locks.setdefault(user_id, threading.Lock())
+
+    def store(self, user):
+        """Cache the token currently on `user`, e.g. right after login."""
+        expires_at = user.token_expires_at.timestamp() if user.token_expires_at else 0
+        entry = (user.access_token, expires_at)
+        self.cache.set(self._cache_key(user.pk), entry, timeout=max(int(expires_at - time.time()), 1))
+        return entry
+
+    def invalidate(self, user):
+        self.cache.delete(self._cache_key(user.pk))
+
+    def _entry(self, user):
+        entry = self.cache.get(self._cache_key(user.pk))
+        if entry is None:
+            # `user` was just loaded by the JWT authentication, so its columns
+            # are as fresh as anything we could read from the database.
+            entry = self.store(user)
+        return entry
+
+    def get_access_token(self, user):
+        token, expires_at = self._entry(user)
+        remaining = expires_at - time.time()
+        if remaining <= 0:
+            return self.refresh(user, stale_token=token)
+        if remaining < self.refresh_ahead:
+            self.schedule_refresh(user, token)
+        return token
+
+    async def aget_access_token(self, user):
+        entry = await self.cache.aget(self._cache_key(user.pk))
+        if entry is not None and entry[1] - time.time() >= self.refresh_ahead:
+            return entry[0]
+        return await _off_loop(self.get_access_token)(user)
+
+    def refresh(self, user, stale_token=None):
+        """
+        Refresh `user`'s token unless someone already replaced `stale_token`.
+        Concurrent callers for the same user share one network round trip.
+        """
+        with self._local_lock(user.pk):
+            fresh = self._fresh_token(user, stale_token)
+            if fresh:
+                self.coalesced += 1
+                return fresh
+
+            lock_key = self._lock_key(user.pk)
+            owner = uuid.uuid4().hex
+            deadline = time.monotonic() + self.lock_timeout
+            while not self.cache.add(lock_key, owner, timeout=self.lock_timeout):
+                # Another process is refreshing; wait for its result.
+                time.sleep(POLL_INTERVAL)
+                fresh = self._fresh_token(user, stale_token)
+                if fresh:
+                    self.coalesced += 1
+                    return fresh
+                if time.monotonic() > deadline:
+                    break
+
+            try:
+                fresh = self._fresh_token(user, stale_token)
+                if fresh:
+                    self.coalesced += 1
+                    return fresh
+                return self._refresh(user)
+            finally:
+                if self.cache.get(lock_key) == owner:
+                    self.cache.delete(lock_key)
+
+    def _fresh_token(self, user, stale_token):
+        entry = self.cache.get(self._cache_key(user.pk))
+        if entry is None:
+            return None
+        token, expires_at = entry
+        if token != stale_token and expires_at - time.time() > 0:
+            user.access_token = token
+            return token
+        return None
+
+    def _refresh(self, user):
+        print(f"Refreshing Spotify access token for user {user.pk}")
+        # Spotify may rotate refresh tokens, so use the latest one on record
+        # rather than whatever this (possibly stale) instance holds.
+        refresh_token = (
+            SpotifyUser.objects.filter(pk=user.pk).values_list('refresh_token', flat=True).first()
+            or user.refresh_token
+        )
+        token_data = get_client().refresh_access_token(refresh_token)
+
+        user.access_token = token_data['access_token']
+        user.token_expires_in = token_data.get('expires_in', 3600)
+        user.token_expires_at = timezone.now() + timedelta(seconds=user.token_expires_in)
+        columns = {
+            'access_token': user.access_token,
+            'token_expires_in': user.token_expires_in,
+            'token_expires_at': user.token_expires_at,
+        }
+        if token_data.get('refresh_token'):
+            user.refresh_token = columns['refresh_token'] = token_data['refresh_token']
+        SpotifyUser.objects.filter(pk=user.pk).update(**columns)
+
+        self.store(user)
+        self.refreshes += 1
+        return user.access_token
+
+    def schedule_refresh(self, user, stale_token):
+        with self._local_locks_guard:
+            if user.pk in self._scheduled:
+                return
+            self._scheduled.add(user.pk)
+        self._executor.submit(self._background_refresh, user.pk, stale_token)
+
+    def _background_refresh(self, user_id, stale_token):
+        try:
+            user = SpotifyUser.objects.get(pk=user_id)
+            self.refresh(user, stale_token=stale_token)
+            self.background_refreshes += 1
+        except Exception as e:
+            print(f"Background token refresh failed for user {user_id}: {e}")
+        finally:
+            with self._local_locks_guard:
+                self._scheduled.discard(user_id)
+            close_old_connections()
+
+    def stats(self):
+        return {
+            'refreshes': self.refreshes,
+            'coalesced': self.coalesced,
+            'background_refreshes': self.background_refreshes,
+            'scheduled': len(self._scheduled),
+        }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_token_manager():
+    """Process-wide `SpotifyTokenManager`, built lazily from `settings.SPOTIFY_TOKENS`."""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = SpotifyTokenManager()
+    return _manager
+
+
+def request_as(user, endpoint, params=None, cache=False):
+    """
+    GET a Spotify endpoint with `user`'s token, following the `api_get`
+    error contract. A 401 means the token was revoked or rotated underneath
+    us, so it is refreshed once and the call retried.
+    """
+    tokens = get_token_manager()
+    cache_as = user.spotify_id if cache else None
+    access_token = tokens.get_access_token(user)
+    data = get_client().api_get(endpoint, access_token, params=params, cache_as=cache_as)
+    if data.get('status_code') == 401 and 'error' in data:
+        try:
+            access_token = tokens.refresh(user, stale_token=access_token)
+        except Exception:
+            return data
+        data = get_client().api_get(endpoint, access_token, params=params, cache_as=cache_as)
+    return data
+
+
+async def arequest_as(user, endpoint, params=None, cache=False):
+    """`request_as` on the event loop's `AsyncSpotifyClient`."""
+    tokens = get_token_manager()
+    cache_as = user.spotify_id if cache else None
+    access_token = await tokens.aget_access_token(user)
+    data = await get_async_client().api_get(endpoint, access_token, params=params, cache_as=cache_as)
+    if data.get('status_code') == 401 and 'error' in data:
+        try:
+            access_token = await _off_loop(tokens.refresh)(user, stale_token=access_token)
+        except Exception:
+            return data
+        data = await get_async_client().api_get(endpoint, access_token, params=params, cache_as=cache_as)
+    return data
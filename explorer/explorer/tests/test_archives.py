@@ -0,0 +1,80 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from ..downloads.archives import archive_response, parse_range
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_no_range_sends_the_whole_file(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('', 100))
+        self.assertIsNone(parse_range('bytes=-', 100))
+
+    def test_unsupported_forms_send_the_whole_file(self):
+        self.assertIsNone(parse_range('bytes=0-9,20-29', 100))
+        self.assertIsNone(parse_range('items=0-9', 100))
+        self.assertIsNone(parse_range('bytes=a-b', 100))
+
+    def test_closed_and_open_ranges(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range(' bytes=10-19 ', 100), (10, 19))
+        self.assertEqual(parse_range('bytes=40-', 100), (40, 99))
+
+    def test_end_is_clamped_to_the_file(self):
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+
+    def test_suffix_ranges(self):
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(parse_range('bytes=100-', 100), False)
+        self.assertIs(parse_range('bytes=20-10', 100), False)
+        self.assertIs(parse_range('bytes=-0', 100), False)
+
+
+class ArchiveResponseTests(SimpleTestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.zip')
+        os.write(handle, bytes(range(100)))
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.factory = RequestFactory()
+
+    def get(self, on_sent=None, **headers):
+        response = archive_response(self.factory.get('/', headers=headers), self.path, 'playlist.zip', on_sent=on_sent)
+        body = b''.join(response.streaming_content) if response.status_code != 416 else b''
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, bytes(range(100)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_resumed_download(self):
+        on_sent = mock.Mock()
+        response, body = self.get(on_sent, Range='bytes=90-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 90-99/100')
+        self.assertEqual(body, bytes(range(90, 100)))
+        on_sent.assert_called_once_with()
+
+    def test_range_short_of_the_end_is_not_a_delivery(self):
+        on_sent = mock.Mock()
+        response, body = self.get(on_sent, Range='bytes=0-9')
+        self.assertEqual((response.status_code, body), (206, bytes(range(10))))
+        on_sent.assert_not_called()
+
+    def test_unsatisfiable_range(self):
+        response, _ = self.get(Range='bytes=200-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_stale_if_range_sends_the_whole_file(self):
+        response, body = self.get(Range='bytes=90-', If_Range='"0-0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body), 100)
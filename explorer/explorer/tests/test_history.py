@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ..models import TopItemsSnapshot
+from ..spotify import history
+from ..spotify.analytics import TIME_RANGES
+from .test_playlists import make_user
+
+
+def make_bundle(track_ids, genres=()):
+    section = {
+        'tracks': [{'id': track_id} for track_id in track_ids],
+        'artists': [{'id': f'artist-{track_id}'} for track_id in track_ids],
+        'genres': [{'genre': genre, 'count': count} for genre, count in genres],
+    }
+    return {time_range: section for time_range in TIME_RANGES}
+
+
+class EncodeTests(SimpleTestCase):
+    def assertRoundTrips(self, ids, previous):
+        self.assertEqual(history.decode(history.encode(ids, previous), previous), ids)
+
+    def test_unchanged_ranking_is_one_run(self):
+        ids = [f't{index}' for index in range(50)]
+        self.assertEqual(history.encode(ids, ids), [[0, 50]])
+        self.assertRoundTrips(ids, ids)
+
+    def test_new_entries_are_stored_individually(self):
+        self.assertEqual(history.encode(['a', 'x', 'b', 'c'], ['a', 'b', 'c']), [[0, 1], 'x', [1, 2]])
+        self.assertRoundTrips(['a', 'x', 'b', 'c'], ['a', 'b', 'c'])
+
+    def test_reordered_and_dropped_entries(self):
+        self.assertRoundTrips(['c', 'a', 'd'], ['a', 'b', 'c', 'd'])
+        self.assertRoundTrips([], ['a', 'b'])
+        self.assertRoundTrips(['a', 'b'], [])
+
+
+@override_settings(SPOTIFY_HISTORY={'KEYFRAME_INTERVAL': 3})
+class SnapshotHistoryTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.start = timezone.now() - timedelta(days=30)
+        self.rankings = [
+            ['a', 'b', 'c'], ['a', 'c', 'b'], ['d', 'a', 'c'], ['d', 'a', 'c'], ['e', 'd'], ['e', 'd', 'f'], ['f'],
+        ]
+        for day, ids in enumerate(self.rankings):
+            history.record_snapshot(self.user, make_bundle(ids, [('rock', day + 1)]), taken_at=self.start + timedelta(days=day))
+
+    def rows(self, kind='tracks'):
+        return TopItemsSnapshot.objects.filter(user=self.user, kind=kind, time_range='short_term').order_by('taken_at')
+
+    def test_keyframes_every_interval(self):
+        self.assertEqual([row.keyframe for row in self.rows()], [True, False, False, True, False, False, True])
+        self.assertEqual(self.rows()[1].ids, [[0, 1], [2, 1], [1, 1]])
+
+    def test_history_decodes_every_snapshot(self):
+        points = history.history(self.user, 'tracks', 'short_term')
+        self.assertEqual([ids for _, ids, _ in points], self.rankings)
+        artists = history.history(self.user, 'artists', 'long_term')
+        self.assertEqual([ids for _, ids, _ in artists], [[f'artist-{i}' for i in ids] for ids in self.rankings])
+
+    def test_genre_counts_are_kept(self):
+        points = history.history(self.user, 'genres', 'medium_term')
+        self.assertEqual([(ids, counts) for _, ids, counts in points], [(['rock'], [day + 1]) for day in range(7)])
+
+    def test_window_starting_between_keyframes(self):
+        # Day 5 is a delta row: decoding has to start from day 3's keyframe.
+        points = history.history(self.user, 'tracks', 'short_term', since=self.start + timedelta(days=4, hours=12))
+        self.assertEqual([ids for _, ids, _ in points], self.rankings[5:])
+
+    def test_window_ending_early(self):
+        points = history.history(self.user, 'tracks', 'short_term', until=self.start + timedelta(days=1))
+        self.assertEqual([ids for _, ids, _ in points], self.rankings[:2])
@@ -0,0 +1,171 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from ..downloads import jobs
+from ..models import DownloadJob
+from .test_playlists import make_user
+
+
+def enqueue(user, name):
+    items = [{'track': {'id': f'{name}-1', 'name': 'Track', 'artists': [{'name': 'Artist'}]}}]
+    return jobs.enqueue(user, f'pl-{name}', name, items)
+
+
+class ClaimNextTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+
+    def test_claims_the_oldest_job(self):
+        first = enqueue(self.alice, 'first')
+        enqueue(self.bob, 'second')
+        job = jobs.claim_next('host:1')
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.worker, job.attempts), (DownloadJob.DOWNLOADING, 'host:1', 1))
+
+    def test_nothing_to_claim(self):
+        self.assertIsNone(jobs.claim_next('host:1'))
+
+    def test_a_job_is_claimed_once(self):
+        enqueue(self.alice, 'only')
+        self.assertIsNotNone(jobs.claim_next('host:1'))
+        self.assertIsNone(jobs.claim_next('host:2'))
+
+    @override_settings(DOWNLOADS={'MAX_JOBS_PER_USER': 2})
+    def test_users_take_turns(self):
+        a1, a2, a3 = (enqueue(self.alice, name) for name in ('a1', 'a2', 'a3'))
+        b1 = enqueue(self.bob, 'b1')
+        claimed = [jobs.claim_next('host:1').pk for _ in range(3)]
+        self.assertEqual(claimed, [a1.pk, b1.pk, a2.pk])
+        # Both of alice's slots are taken and bob has nothing left.
+        self.assertIsNone(jobs.claim_next('host:1'))
+        self.assertEqual(DownloadJob.objects.get(pk=a3.pk).status, DownloadJob.PENDING)
+
+    def test_per_user_cap(self):
+        enqueue(self.alice, 'a1')
+        enqueue(self.alice, 'a2')
+        b1 = enqueue(self.bob, 'b1')
+        jobs.claim_next('host:1')
+        self.assertEqual(jobs.claim_next('host:1').pk, b1.pk)
+        self.assertIsNone(jobs.claim_next('host:1'))
+
+
+@override_settings(DOWNLOADS={'STALE_AFTER': 60, 'MAX_ATTEMPTS': 2})
+class RequeueStaleTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        enqueue(self.user, 'job')
+        self.job = jobs.claim_next('host:1')
+
+    def stop_heartbeating(self):
+        DownloadJob.objects.filter(pk=self.job.pk).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+
+    def test_live_jobs_are_left_alone(self):
+        self.assertEqual(jobs.requeue_stale(), (0, 0))
+        self.assertEqual(DownloadJob.objects.get(pk=self.job.pk).status, DownloadJob.DOWNLOADING)
+
+    def test_stale_job_is_requeued_and_its_worker_cut_off(self):
+        self.stop_heartbeating()
+        self.assertEqual(jobs.requeue_stale(), (1, 0))
+        row = DownloadJob.objects.get(pk=self.job.pk)
+        self.assertEqual((row.status, row.worker), (DownloadJob.PENDING, ''))
+
+        reclaimed = jobs.claim_next('host:2')
+        self.assertEqual((reclaimed.pk, reclaimed.attempts), (self.job.pk, 2))
+        # The first worker's late writes no longer land.
+        self.assertFalse(jobs.update_progress(self.job, 1))
+        self.assertFalse(jobs.complete(self.job, '/tmp/archive.zip'))
+        self.assertTrue(jobs.update_progress(reclaimed, 1))
+
+    def test_stale_job_fails_after_max_attempts(self):
+        self.stop_heartbeating()
+        jobs.requeue_stale()
+        self.job = jobs.claim_next('host:2')
+        self.stop_heartbeating()
+        self.assertEqual(jobs.requeue_stale(), (0, 1))
+        row = DownloadJob.objects.get(pk=self.job.pk)
+        self.assertEqual(row.status, DownloadJob.FAILED)
+        self.assertEqual(row.message, 'The download worker stopped responding.')
+
+
+class JobTokenTests(TestCase):
+    def setUp(self):
+        user = make_user()
+        self.job = enqueue(user, 'mine')
+        self.other = enqueue(user, 'other')
+
+    def test_token_allows_its_own_job(self):
+        self.assertTrue(jobs.token_allows(jobs.job_token(self.job), self.job))
+
+    def test_token_is_only_good_for_one_job(self):
+        self.assertFalse(jobs.token_allows(jobs.job_token(self.other), self.job))
+
+    def test_tampered_token(self):
+        token = jobs.job_token(self.job)
+        self.assertFalse(jobs.token_allows(token[:-1] + ('A' if token[-1] != 'A' else 'B'), self.job))
+        self.assertFalse(jobs.token_allows(str(self.job.pk), self.job))
+        self.assertFalse(jobs.token_allows('', self.job))
+
+    @override_settings(DOWNLOADS={'TOKEN_TTL': 60})
+    def test_expired_token(self):
+        with mock.patch('time.time', return_value=time.time() - 120):
+            token = jobs.job_token(self.job)
+        self.assertFalse(jobs.token_allows(token, self.job))
+
+    def test_download_link_checks_the_token(self):
+        client = APIClient()
+        url = f'/api/download/retrieve/{self.job.pk}/'
+        self.assertEqual(client.get(url, {'token': jobs.job_token(self.other)}).status_code, 403)
+        # A valid token stands in for the owner's credentials.
+        self.assertEqual(client.get(url, {'token': jobs.job_token(self.job)}).status_code, 202)
+        self.assertEqual(client.get(url).status_code, 401)
+
+
+def item(track_id, name=None):
+    return {'track': {'id': track_id, 'name': name or track_id, 'artists': [{'name': 'Artist'}]}}
+
+
+class SplitDeltaTests(TestCase):
+    def delivered(self, *track_ids):
+        return {track_id: {'id': track_id, 'name': track_id, 'artists': ['Artist']} for track_id in track_ids}
+
+    def test_first_download_takes_everything(self):
+        items = [item('a'), item('b')]
+        self.assertEqual(jobs.split_delta(items, {}), (items, []))
+
+    def test_delivered_tracks_are_left_out(self):
+        added, removed = jobs.split_delta([item('a'), item('b'), item('c')], self.delivered('a', 'c'))
+        self.assertEqual([entry['track']['id'] for entry in added], ['b'])
+        self.assertEqual(removed, [])
+
+    def test_delivered_tracks_gone_from_the_playlist_are_removed(self):
+        added, removed = jobs.split_delta([item('b')], self.delivered('a', 'b'))
+        self.assertEqual(added, [])
+        self.assertEqual(removed, [{'id': 'a', 'name': 'a', 'artists': ['Artist']}])
+
+    def test_local_files_and_unavailable_items_are_kept(self):
+        local = {'track': {'id': None, 'name': 'Local file', 'artists': []}}
+        unavailable = {'track': None}
+        added, removed = jobs.split_delta([local, unavailable, item('a')], self.delivered('a'))
+        self.assertEqual(added, [local, unavailable])
+        self.assertEqual(removed, [])
+
+    def test_deliveries_feed_the_next_delta(self):
+        user = make_user()
+        job = jobs.enqueue(user, 'pl', 'Playlist', [item('a'), item('b'), item('c')])
+        jobs.record_delivery(job, [0, 2])  # 'b' didn't make it into the download
+        delivered = jobs.delivered_tracks(user, 'pl')
+        self.assertEqual(set(delivered), {'a', 'c'})
+
+        added, removed = jobs.split_delta([item('b'), item('c'), item('d')], delivered)
+        self.assertEqual([entry['track']['id'] for entry in added], ['b', 'd'])
+        self.assertEqual([track['id'] for track in removed], ['a'])
+
+        delta = jobs.enqueue(user, 'pl', 'Playlist', added, delta=True, removed=removed)
+        jobs.record_delivery(delta, [0, 1])
+        self.assertEqual(set(jobs.delivered_tracks(user, 'pl')), {'b', 'c', 'd'})
@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ..models import SpotifyUser
+from ..views.spotify import SpotifyAPIView
+
+
+def make_user(spotify_id='listener'):
+    return SpotifyUser.objects.create(
+        username=spotify_id, spotify_id=spotify_id, display_name=spotify_id, email='listener@example.com',
+        access_token='token', refresh_token='refresh', scope='',
+    )
+
+
+class FakeSpotify:
+    """Answers `spotify_request` for one playlist and records what was asked."""
+    def __init__(self, snapshot_id='snap-1'):
+        self.snapshot_id = snapshot_id
+        self.calls = []
+
+    def __call__(self, endpoint, params=None, cache=False):
+        fields = (params or {}).get('fields', '')
+        self.calls.append((endpoint, fields))
+        if fields == 'snapshot_id':
+            return {'snapshot_id': self.snapshot_id}
+        if endpoint.endswith('/tracks'):
+            return {'items': [], 'total': 1}
+        return {
+            'id': 'pl1', 'name': 'Playlist', 'snapshot_id': self.snapshot_id,
+            'tracks': {'items': [{'track': {'id': 't1', 'name': 'Track', 'artists': []}}], 'total': 1},
+        }
+
+    def full_fetches(self):
+        return [call for call in self.calls if call[1] != 'snapshot_id']
+
+
+class PlaylistDetailConditionalGetTests(TestCase):
+    url = '/api/spotify/playlists/pl1/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user())
+        self.spotify = FakeSpotify()
+        patcher = mock.patch.object(
+            SpotifyAPIView, 'spotify_request', lambda view, *args, **kwargs: self.spotify(*args, **kwargs),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_visit_returns_the_playlist_with_an_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['snapshot_id'], 'snap-1')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    def test_unchanged_snapshot_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.spotify.calls.clear()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        # Only the cheap revalidation went upstream.
+        self.assertEqual(self.spotify.calls, [('/playlists/pl1', 'snapshot_id')])
+
+    def test_weak_etag_from_a_compressed_response_matches(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, 304)
+
+    def test_conditional_request_revalidates_a_remembered_snapshot(self):
+        etag = self.client.get(self.url)['ETag']
+        self.spotify.snapshot_id = 'snap-2'  # edited in Spotify since
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['snapshot_id'], 'snap-2')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_repeat_visit_is_served_from_the_snapshot_cache(self):
+        self.client.get(self.url)
+        fetched = len(self.spotify.full_fetches())
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.spotify.full_fetches()), fetched)
@@ -7,7 +7,8 @@ from datetime import timedelta
 from rest_framework_simplejwt.tokens import RefreshToken
 from ..models import SpotifyUser
 from ..serializers import SpotifyUserSerializer
-import os
+from ..spotify import get_client
+from ..spotify.tokens import get_token_manager
 
 
 class SpotifyLogin(APIView):
@@ -22,19 +23,8 @@ class SpotifyLogin(APIView):
 
         try:
             # 1. Exchange code + verifier for tokens from Spotify
-            token_response = requests.post(
-                "https://accounts.spotify.com/api/token",
-                data={
-                    "grant_type": "authorization_code",
-                    "code": code,
-                    "redirect_uri": "http://127.0.0.1:5173/callback",
-                    "client_id": os.getenv("SPOTIFY_CLIENT_ID"),
-                    "code_verifier": verifier,
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
-            token_response.raise_for_status()
-            token_data = token_response.json()
+            client = get_client()
+            token_data = client.exchange_code(code, verifier, "http://127.0.0.1:5173/callback")
 
             access_token = token_data["access_token"]
             refresh_token = token_data["refresh_token"]
@@ -42,7 +32,8 @@ class SpotifyLogin(APIView):
             scope = token_data["scope"]
 
             # 2. Get Spotify profile
-            profile_response = requests.get(
+            profile_response = client.request(
+                "GET",
                 "https://api.spotify.com/v1/me",
                 headers={"Authorization": f"Bearer {access_token}"},
             )
@@ -64,6 +55,8 @@ class SpotifyLogin(APIView):
                 },
             )
 
+            get_token_manager().store(user)
+
             # 4. Generate SimpleJWT tokens
             refresh = RefreshToken()
             refresh["user_id"] = user.id
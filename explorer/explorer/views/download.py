@@ -1,211 +1,196 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 import os
-from yt_dlp import YoutubeDL
-import requests
-from django.utils import timezone
-from datetime import timedelta
-from django.http import HttpResponse
-import io
-import zipfile
-import tempfile
-import shutil
-import threading
-import uuid
-
-download_tasks = {}
-
-def _download_and_zip_tracks(task_id, tracks, playlist_name):
-    task = download_tasks[task_id]
-    task['status'] = 'DOWNLOADING'
-    task['total'] = len(tracks)
-    task['completed'] = 0
-
-    temp_dir = tempfile.mkdtemp()
-    downloaded_files = []
-
-    try:
-        ydl_opts = {
-            'format': 'bestaudio/best',
-            'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
-            'quiet': True,
-            'noplaylist': True,
-        }
-
-        with YoutubeDL(ydl_opts) as ydl:
-            for i, item in enumerate(tracks):
-                track = item.get('track')
-                if not track:
-                    continue
-
-                track_name = track.get('name')
-                artist_name = ', '.join([artist.get('name') for artist in track.get('artists', [])])
-                query = f"{track_name} {artist_name} audio"
-
-                try:
-                    info = ydl.extract_info(f"ytsearch:{query}", download=True)['entries'][0]
-                    filename, _ = os.path.splitext(ydl.prepare_filename(info))
-                    downloaded_files.append(filename + '.mp3')
-                except Exception as e:
-                    print(f"Failed to download {track_name}: {e}")
-                
-                task['completed'] = i + 1
-
-        if not downloaded_files:
-            task['status'] = 'FAILED'
-            task['message'] = 'Could not download any tracks.'
-            return
-
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file_path in downloaded_files:
-                if os.path.exists(file_path):
-                    zip_file.write(file_path, os.path.basename(file_path))
-
-        zip_buffer.seek(0)
-        task['zip_content'] = zip_buffer.read()
-        task['playlist_name'] = playlist_name
-        task['status'] = 'COMPLETED'
-
-    except Exception as e:
-        task['status'] = 'FAILED'
-        task['message'] = str(e)
-    finally:
-        shutil.rmtree(temp_dir)
-
-
-class DownloadPlaylist(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def refresh_access_token_if_needed(self, user):
-        if user.token_expires_at > timezone.now():
-            return
-
-        print("Refreshing expired Spotify access token")
-        response = requests.post(
-            'https://accounts.spotify.com/api/token',
-            data={
-                'grant_type': 'refresh_token',
-                'refresh_token': user.refresh_token,
-                'client_id': os.getenv('SPOTIFY_CLIENT_ID'),
-                'client_secret': os.getenv('SPOTIFY_CLIENT_SECRET'),
-            },
-            headers={'Content-Type': 'application/x-www-form-urlencoded'}
-        )
-
-        if response.status_code != 200:
-            raise Exception('Failed to refresh token')
-
-        token_data = response.json()
-        user.access_token = token_data['access_token']
-        user.token_expires_in = token_data.get('expires_in', 3600)
-        user.token_expires_at = timezone.now() + timedelta(seconds=user.token_expires_in)
-        user.save()
-
-    def get_spotify_api_headers(self):
-        self.refresh_access_token_if_needed(self.request.user)
-        return {
-            'Authorization': f'Bearer {self.request.user.access_token}'
-        }
-
-    def spotify_request(self, endpoint, params=None):
-        self.refresh_access_token_if_needed(self.request.user)
-        headers = self.get_spotify_api_headers()
-        try:
-            response = requests.get(f'https://api.spotify.com/v1{endpoint}', headers=headers, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 401:
-                return {'error': 'Spotify token may have expired.', 'status_code': 401}
-            return {'error': str(e), 'status_code': e.response.status_code}
-        except requests.exceptions.RequestException as e:
-            return {'error': f'Network error: {str(e)}', 'status_code': 503}
-
+from functools import partial
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from .spotify import SpotifyAPIView
+from ..downloads import archives, events, jobs
+from ..downloads.transcode import FORMATS
+from ..models import DownloadJob
+from ..spotify import library, playlists as playlist_cache
+
+
+def _get_job(request, task_id):
+    """(job, None) for the requesting user's job, or (None, error response)."""
+    job = jobs.find_job(task_id)
+    if not job:
+        return None, Response({'message': 'Task not found.'}, status=404)
+    if job.user_id != request.user.id:
+        return None, Response({'message': 'Forbidden.'}, status=403)
+    return job, None
+
+
+class DownloadPlaylist(SpotifyAPIView):
+    """
+    Queue a playlist download for `manage.py download_worker`. `format`
+    picks the output, a key of downloads.transcode.FORMATS: 'opus' and 'm4a'
+    keep YouTube's stream as is, the MP3s are re-encoded.
+
+    With `delta`, only tracks not delivered by an earlier download are
+    fetched, and delivered tracks since removed from the playlist are
+    listed under `removed`. A track counts as delivered once the user has
+    the file (see jobs.record_delivery), not when the worker made it.
+    """
     def post(self, request, playlist_id):
-        playlist_data = self.spotify_request(f'/playlists/{playlist_id}')
-        if 'error' in playlist_data:
-            return Response(playlist_data, status=playlist_data.get('status_code', 502))
+        fmt = request.data.get('format') or request.query_params.get('format')
+        if fmt and fmt not in FORMATS:
+            return Response({'message': f"Unknown format. Choose one of: {', '.join(FORMATS)}."}, status=400)
+
+        delta = bool(request.data.get('delta') or request.query_params.get('delta'))
+        user_key = request.user.spotify_id
+        if delta:
+            # What's new is only as current as the playlist it's taken
+            # against: ask Spotify (a tiny `fields=snapshot_id` call) instead
+            # of trusting a remembered snapshot.
+            current = self.spotify_request(f'/playlists/{playlist_id}', {'fields': 'snapshot_id'})
+            if 'error' in current:
+                return Response(current, status=current.get('status_code', 502))
+            snapshot_id = current.get('snapshot_id')
+            playlist_cache.remember_snapshots(user_key, [{'id': playlist_id, 'snapshot_id': snapshot_id}])
+        else:
+            snapshot_id = playlist_cache.known_snapshot(user_key, playlist_id)
+        playlist_data = snapshot_id and playlist_cache.get_cached_playlist(playlist_id, snapshot_id)
+        if not playlist_data:
+            playlist_data = playlist_cache.load_playlist(self.spotify_request, playlist_id)
+            if 'error' in playlist_data:
+                return Response(playlist_data, status=playlist_data.get('status_code', 502))
+            playlist_cache.store_playlist(user_key, playlist_data)
 
         tracks = playlist_data.get('tracks', {}).get('items', [])
         if not tracks:
             return Response({'message': 'No tracks found in the playlist.'}, status=404)
 
-        playlist_name = playlist_data.get('name', 'spotify_playlist')
-        task_id = str(uuid.uuid4())
-
-        download_tasks[task_id] = {
-            'status': 'PENDING',
-            'user_id': request.user.id,
-        }
+        removed = []
+        if delta:
+            tracks, removed = jobs.split_delta(tracks, jobs.delivered_tracks(request.user, playlist_id))
+        playlist = library.find_playlist(request.user, playlist_id)
+        if playlist and playlist.tracks_snapshot_id != playlist_data.get('snapshot_id'):
+            library.store_tracks(playlist, playlist_data.get('tracks', {}).get('items', []), playlist_data.get('snapshot_id') or '')
+        if not tracks:
+            return Response({'message': 'No tracks added since the last download.', 'delta': True, 'removed': removed})
 
-        thread = threading.Thread(
-            target=_download_and_zip_tracks,
-            args=(task_id, tracks, playlist_name)
+        playlist_name = playlist_data.get('name', 'spotify_playlist')
+        # ?stream=1: GetDownload streams the zip while tracks are still downloading.
+        job = jobs.enqueue(
+            request.user, playlist_id, playlist_name, tracks, stream=bool(request.query_params.get('stream')), fmt=fmt,
+            delta=delta, removed=removed,
         )
-        thread.start()
 
         return Response(
-            {'task_id': task_id, 'message': 'Playlist download started.'},
+            {
+                'task_id': str(job.pk), 'token': jobs.job_token(job), 'message': 'Playlist download queued.',
+                'total': job.total, 'stream': job.stream, 'delta': delta, 'removed': removed,
+            },
             status=202
         )
 
 
-class DownloadStatus(APIView):
+class DownloadFormats(APIView):
+    """The output formats a download can ask for, and the one it gets when it doesn't."""
     permission_classes = [IsAuthenticated]
 
-    def get(self, request, task_id):
-        task = download_tasks.get(task_id)
+    def get(self, request):
+        return Response({'formats': list(FORMATS), 'default': jobs.get_download_settings()['DEFAULT_FORMAT']})
 
-        if not task:
-            return Response({'message': 'Task not found.'}, status=404)
 
-        if task.get('user_id') != request.user.id:
-            return Response({'message': 'Forbidden.'}, status=403)
+class DownloadStatus(APIView):
+    permission_classes = [IsAuthenticated]
 
-        response_data = {
-            'status': task.get('status'),
-            'completed': task.get('completed', 0),
-            'total': task.get('total', 0),
-        }
-        
-        if task.get('status') == 'FAILED':
-            response_data['message'] = task.get('message', 'An unknown error occurred.')
+    def get(self, request, task_id):
+        job, error = _get_job(request, task_id)
+        if error:
+            return error
 
-        return Response(response_data)
+        # A fresh token for fetching the file once it's ready.
+        return Response({**jobs.job_status(job), 'token': jobs.job_token(job)})
 
 
 class GetDownload(APIView):
     """
-    Retrieves the downloaded and zipped playlist file.
+    Retrieves the downloaded and zipped playlist file. Supports Range
+    requests, so an interrupted download can resume; the archive stays
+    available until DOWNLOADS['ARCHIVE_TTL'] expires. Streaming jobs are
+    sent as a zip that grows as tracks finish, starting right away; each
+    track is sent once.
+
+    The page links here directly, so the browser itself saves the file,
+    streams it and resumes it. A link can't carry the Authorization header,
+    so it carries the job's `?token=` (see jobs.job_token) instead.
     """
-    permission_classes = [IsAuthenticated]
+    permission_classes = [AllowAny]
 
     def get(self, request, task_id):
-        task = download_tasks.get(task_id)
-
-        if not task:
-            return Response({'message': 'Task not found.'}, status=404)
-
-        if task.get('user_id') != request.user.id:
-            return Response({'message': 'Forbidden.'}, status=403)
-
-        if task.get('status') != 'COMPLETED':
+        token = request.query_params.get('token')
+        if token:
+            job = jobs.find_job(task_id)
+            if not job:
+                return Response({'message': 'Task not found.'}, status=404)
+            if not jobs.token_allows(token, job):
+                return Response({'message': 'Invalid or expired token.'}, status=403)
+        elif not request.user.is_authenticated:
+            return Response({'message': 'Authentication credentials were not provided.'}, status=401)
+        else:
+            job, error = _get_job(request, task_id)
+            if error:
+                return error
+
+        if job.status == DownloadJob.EXPIRED:
+            return Response({'message': 'This download has expired.'}, status=410)
+
+        if job.stream:
+            return self.stream(request, job)
+
+        if job.status != DownloadJob.COMPLETED:
             return Response({'message': 'Download is not complete.'}, status=202)
 
-        zip_content = task.get('zip_content')
-        if not zip_content:
+        if not job.archive_path or not os.path.exists(job.archive_path):
             return Response({'message': 'File not found or an error occurred.'}, status=500)
 
-        response = HttpResponse(zip_content, content_type='application/zip')
-        response['Content-Disposition'] = f'attachment; filename="{task.get("playlist_name", "playlist")}.zip"'
-        
-        del download_tasks[task_id]
-        
-        return response
\ No newline at end of file
+        # Whichever response sends the end of the file, whole or resumed, completes the delivery.
+        return archives.archive_response(
+            request, job.archive_path, f'{job.playlist_name}.zip',
+            on_sent=partial(jobs.record_delivery, job, job.fetched), asynchronous=isinstance(request._request, ASGIRequest),
+        )
+
+    def stream(self, request, job):
+        if job.status == DownloadJob.FAILED:
+            return Response({'message': job.message or 'Download failed.'}, status=500)
+        if job.status == DownloadJob.COMPLETED and not os.path.isdir(archives.job_dir(job)):
+            return Response({'message': 'This download was already delivered.'}, status=410)
+        # Django buffers an iterator of the wrong kind for the server whole.
+        if isinstance(request._request, ASGIRequest):
+            chunks = archives.astream_archive(job, on_sent=partial(jobs.record_delivery, job))
+        else:
+            chunks = archives.stream_archive(job, on_sent=partial(jobs.record_delivery, job))
+        response = StreamingHttpResponse(chunks, content_type='application/zip')
+        response['Content-Disposition'] = content_disposition_header(True, f'{job.playlist_name}.zip')
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+def download_events(request, task_id):
+    """
+    A job's progress as Server-Sent Events (see downloads/events.py), so the
+    page doesn't have to poll DownloadStatus. Only served under ASGI, where an
+    open stream holds no thread; under WSGI it would tie up a worker for as
+    long as the job runs, so the page gets a 503 and polls instead.
+
+    EventSource can't send an Authorization header, so the job's `?token=`
+    (see jobs.job_token) stands in for it. It's short-lived and only good for
+    this job, so unlike an access token it's harmless in a server log.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'message': 'Progress events need an ASGI server; poll the status instead.'}, status=503)
+    job = jobs.find_job(task_id)
+    if not job:
+        return JsonResponse({'message': 'Task not found.'}, status=404)
+    if not jobs.token_allows(request.GET.get('token', ''), job):
+        return JsonResponse({'message': 'Invalid or expired token.'}, status=403)
+
+    response = StreamingHttpResponse(events.astream(job), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx hold events back
+    return response
@@ -0,0 +1,29 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from ..caching import get_value_cache_stats
+from ..downloads.cache import get_audio_cache
+from ..downloads.jobs import queue_stats
+from ..spotify import get_client, get_async_client
+from ..spotify.cache import get_response_cache
+from ..spotify.catalog import get_catalog
+from ..spotify.ratelimit import get_limiter
+from ..spotify.tokens import get_token_manager
+
+
+class SpotifyMetricsView(APIView):
+    """Per-process counters for the shared Spotify client."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'http': get_client().stats(),
+            'http_async': get_async_client().stats(),
+            'rate_limit': get_limiter().stats(),
+            'tokens': get_token_manager().stats(),
+            'response_cache': get_response_cache().stats(),
+            'catalog': get_catalog().stats(),
+            'value_cache': get_value_cache_stats(),
+            'downloads': queue_stats(),
+            'audio_cache': get_audio_cache().stats(),
+        })
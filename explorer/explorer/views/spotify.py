@@ -1,200 +1,238 @@
 from rest_framework.views import APIView
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
-from datetime import timedelta
-from django.utils import timezone
 from django.conf import settings
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from django.views.decorators.vary import vary_on_headers
-import requests
-from collections import Counter
-import os
-import time
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from datetime import timedelta
+import json
+from ..spotify.pagination import iter_pages
+from ..spotify import analytics, artists, history, library
+from ..spotify.catalog import get_catalog
+from ..spotify import playlists as playlist_cache
+from ..spotify.projections import parse_fields, project_playlist, select_fields
+from ..spotify.tokens import request_as
 
 
 class SpotifyAPIView(APIView):
-    """Base class to handle authenticated requests to the Spotify API."""
+    """
+    Base class to handle authenticated requests to the Spotify API.
+    Successful responses can be trimmed with ?fields=id,name,album.name.
+    """
     permission_classes = [IsAuthenticated]
 
-    def refresh_access_token_if_needed(self, user):
-        if user.token_expires_at > timezone.now():
-            return
-
-        print("Refreshing expired Spotify access token")
-        response = requests.post(
-            'https://accounts.spotify.com/api/token',
-            data={
-                'grant_type': 'refresh_token',
-                'refresh_token': user.refresh_token,
-                'client_id': os.getenv('SPOTIFY_CLIENT_ID'),
-                'client_secret': os.getenv('SPOTIFY_CLIENT_SECRET'),
-            },
-            headers={'Content-Type': 'application/x-www-form-urlencoded'}
-        )
-
-        if response.status_code != 200:
-            raise Exception('Failed to refresh token')
-
-        token_data = response.json()
-        user.access_token = token_data['access_token']
-        user.token_expires_in = token_data.get('expires_in', 3600)
-        user.token_expires_at = timezone.now() + timedelta(seconds=user.token_expires_in)
-        user.save()
-
-    def get_spotify_api_headers(self): 
-        self.refresh_access_token_if_needed(self.request.user)
-        return {
-            'Authorization': f'Bearer {self.request.user.access_token}'
-        }
-
-    def spotify_request(self, endpoint, params=None):
-        self.refresh_access_token_if_needed(self.request.user)
-        headers = self.get_spotify_api_headers()
-        try:
-            response = requests.get(f'https://api.spotify.com/v1{endpoint}', headers=headers, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 401:
-                print("bad token")
-                return {'error': 'Spotify token may have expired.', 'status_code': 401}
-            return {'error': str(e), 'status_code': e.response.status_code}
-        except requests.exceptions.RequestException as e:
-            return {'error': f'Network error: {str(e)}', 'status_code': 503}
+    def finalize_response(self, request, response, *args, **kwargs):
+        fields = request.query_params.get('fields') if isinstance(request, Request) else None
+        if fields and isinstance(response, Response) and response.status_code == 200 and response.data is not None:
+            response.data = select_fields(response.data, parse_fields(fields))
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def spotify_request(self, endpoint, params=None, cache=False):
+        return request_as(self.request.user, endpoint, params=params, cache=cache)
 
 
 class SnapshotView(SpotifyAPIView):
-    @method_decorator(cache_page(60 * 5))
-    @method_decorator(vary_on_headers('Authorization'))
+    """Dashboard summary: the top five of everything for the last four weeks."""
     def get(self, request, *args, **kwargs):
-        print("Re-fetching SnapshotView")
-
-        top_tracks_data = self.spotify_request('/me/top/tracks', {'limit': 50, 'time_range': 'short_term'})
-        top_artists_data = self.spotify_request('/me/top/artists', {'limit': 50, 'time_range': 'short_term'})
-
-        # print(top_tracks_data)
-        # print(top_artists_data)
-
-        # if 'error' in top_tracks_data or 'error' in top_artists_data:
-        #     print("fuck")
-        #     return Response({'error': 'Failed to fetch data from Spotify.'}, status=status.HTTP_502_BAD_GATEWAY)
+        bundle, error = analytics.get_bundle(request.user, self.spotify_request)
+        if error:
+            return Response(error, status=error.get('status_code', 502))
+        return Response(bundle['snapshot'])
 
-        top_tracks = top_tracks_data.get('items', [])
-        top_artists = top_artists_data.get('items', [])
 
-        all_genres = [genre for artist in top_artists for genre in artist.get('genres', [])]
-        top_genres = [genre[0] for genre in Counter(all_genres).most_common(5)]
-
-        all_albums = [track['album'] for track in top_tracks if 'album' in track]
-        album_counts = Counter(album['id'] for album in all_albums)
-        unique_albums = {album['id']: album for album in all_albums}
-        sorted_album_ids = [album_id for album_id, count in album_counts.most_common(5)]
-        top_albums = [unique_albums[album_id] for album_id in sorted_album_ids]
-
-        response_data = {
-            'top_tracks': top_tracks[:5],
-            'top_artists': top_artists[:5],
-            'top_genres': top_genres,
-            'top_albums': top_albums,
-        }
-        return Response(response_data)
+class TopBundleView(SpotifyAPIView):
+    """
+    Top tracks, artists, genres and albums for every time range plus the
+    snapshot, in one response. The other top-item views are slices of it.
+    """
+    def get(self, request, *args, **kwargs):
+        bundle, error = analytics.get_bundle(request.user, self.spotify_request)
+        if error:
+            return Response(error, status=error.get('status_code', 502))
+        return Response(bundle)
 
 
 class TopItemsBaseView(SpotifyAPIView):
+    section = None  # 'tracks', 'artists', 'genres', 'track_genres' or 'albums'
+
     def get_time_range(self):
         time_range = self.request.query_params.get('time_range', 'medium_term')
-        if time_range not in ['short_term', 'medium_term', 'long_term']:
+        if time_range not in analytics.TIME_RANGES:
             return 'medium_term'
         return time_range
 
-class TopTracksView(TopItemsBaseView):
-    @method_decorator(cache_page(60 * 5)) # 5 mins
-    @method_decorator(vary_on_headers('Authorization'))
     def get(self, request, *args, **kwargs):
-        print("Re-fetching TopTracksView")
+        bundle, error = analytics.get_bundle(request.user, self.spotify_request)
+        if error:
+            return Response(error, status=error.get('status_code', 502))
+        return Response(bundle[self.get_time_range()][self.get_section()])
+
+    def get_section(self):
+        return self.section
 
-        time_range = self.get_time_range()
-        data = self.spotify_request('/me/top/tracks', {'limit': 50, 'time_range': time_range})
-        if 'error' in data:
-            return Response(data, status=data.get('status_code', 502))
-        return Response(data.get('items', []))
+class TopTracksView(TopItemsBaseView):
+    section = 'tracks'
 
 class TopArtistsView(TopItemsBaseView):
-    @method_decorator(cache_page(60 * 5))
-    @method_decorator(vary_on_headers('Authorization'))
-    def get(self, request, *args, **kwargs):
-        print("Re-fetching TopArtistsView")
-        
-        time_range = self.get_time_range()
-        data = self.spotify_request('/me/top/artists', {'limit': 50, 'time_range': time_range})
-        if 'error' in data:
-            return Response(data, status=data.get('status_code', 502))
-        return Response(data.get('items', []))
+    section = 'artists'
 
 class TopGenresView(TopItemsBaseView):
-    @method_decorator(cache_page(60 * 5))
-    @method_decorator(vary_on_headers('Authorization'))
-    def get(self, request, *args, **kwargs):
-        print("Re-calculating TopGenresView")
-        
-        time_range = self.get_time_range()
-        artists_data = self.spotify_request('/me/top/artists', {'limit': 50, 'time_range': time_range})
-        if 'error' in artists_data:
-            return Response(artists_data, status=artists_data.get('status_code', 502))
+    section = 'genres'
 
-        all_genres = [genre for artist in artists_data.get('items', []) for genre in artist.get('genres', [])]
-        top_genres = [{'genre': genre, 'count': count} for genre, count in Counter(all_genres).most_common(50)]
-        return Response(top_genres)
+    def get_section(self):
+        # ?source=tracks weights genres by top tracks instead of top artists.
+        return 'track_genres' if self.request.query_params.get('source') == 'tracks' else self.section
 
 class TopAlbumsView(TopItemsBaseView):
-    @method_decorator(cache_page(60 * 5))
-    @method_decorator(vary_on_headers('Authorization'))
-    def get(self, request, *args, **kwargs):
-        print("Re-calculating TopAlbumsView")
-        
-        time_range = self.get_time_range()
-        tracks_data = self.spotify_request('/me/top/tracks', {'limit': 50, 'time_range': time_range})
-        if 'error' in tracks_data:
-            return Response(tracks_data, status=tracks_data.get('status_code', 502))
-        
-        all_albums = [track['album'] for track in tracks_data.get('items', []) if 'album' in track]
-        album_counts = Counter(album['id'] for album in all_albums)
-        unique_albums = {album['id']: album for album in all_albums}
-
-        sorted_albums = []
-        for album_id, count in album_counts.most_common(50):
-            album_data = unique_albums[album_id]
-            album_data['count'] = count
-            sorted_albums.append(album_data)
-            
-        return Response(sorted_albums)
+    section = 'albums'
+
+class TopHistoryView(TopItemsBaseView):
+    """
+    How the user's top tracks, artists or genres moved over the last ?days=
+    (default 90), from the snapshots `manage.py snapshot_top_items` records.
+    Answered from the database alone; tracks and artists come with whatever
+    objects the catalog already holds, without fetching the rest.
+    """
+    def get(self, request, kind, *args, **kwargs):
+        if kind not in history.KINDS:
+            return Response({'error': f'Unknown kind: {kind}', 'status_code': 404}, status=404)
+        try:
+            days = int(request.query_params.get('days', 90))
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'error': 'days and limit must be integers', 'status_code': 400}, status=400)
+        if not 1 <= days <= history.MAX_DAYS or not 1 <= limit <= analytics.TOP_LIMIT:
+            return Response({
+                'error': f'days must be between 1 and {history.MAX_DAYS}, limit between 1 and {analytics.TOP_LIMIT}',
+                'status_code': 400,
+            }, status=400)
+
+        since = timezone.now() - timedelta(days=days)
+        data = history.trend(request.user, kind, self.get_time_range(), since=since, limit=limit)
+        if kind != 'genres':
+            data['objects'] = get_catalog().get_many(kind[:-1], [entry['id'] for entry in data['series']])
+        return Response(data)
 
 class PlaylistsView(SpotifyAPIView):
-    """View to get all of a user's playlists, handling pagination."""
+    """
+    View to get all of a user's playlists, served from the library mirror.
+    The listing is re-read from Spotify (pages concurrently) once the mirror
+    is older than SPOTIFY_LIBRARY['MAX_AGE'] or on ?refresh=1. With ?stream=1
+    playlists are sent straight from Spotify as NDJSON as pages arrive.
+    """
     def get(self, request, *args, **kwargs):
-        playlists = []
-        endpoint = '/me/playlists'
-        params = {'limit': 50}
-
-        while endpoint:
-            data = self.spotify_request(endpoint, params=params)
-            if 'error' in data:
-                return Response(data, status=data.get('status_code', 502))
-            
-            playlists.extend(data.get('items', []))
-            endpoint = data.get('next') 
-            params = None 
-
-        return Response(playlists)
+        if request.query_params.get('stream'):
+            pages = iter_pages(self.spotify_request, '/me/playlists')
+            return StreamingHttpResponse(self.stream_playlists(pages), content_type='application/x-ndjson')
+
+        if request.query_params.get('refresh') or not library.is_fresh(request.user):
+            _, error = library.sync_playlists(request.user, self.spotify_request)
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+        return Response(library.list_playlists(request.user))
+
+    def stream_playlists(self, pages):
+        for page in pages:
+            if 'error' in page:
+                yield json.dumps(page) + '\n'
+                return
+            items = page.get('items', [])
+            playlist_cache.remember_snapshots(self.request.user.spotify_id, items)
+            yield ''.join(json.dumps(project_playlist(item)) + '\n' for item in items)
     
 class PlaylistDetailView(SpotifyAPIView):
+    """
+    Playlists in the user's library are served from the mirror, re-fetching
+    tracks only when the snapshot moved. Others are cached by
+    (playlist_id, snapshot_id). Either way the response carries a strong
+    ETag, so a repeat visit with an unchanged snapshot costs a 304. A
+    conditional request always asks Spotify for the current snapshot id
+    (a tiny `fields=snapshot_id` call) rather than trusting a remembered
+    one, so edits made in Spotify show up on the next visit.
+    """
+    def current_snapshot(self, playlist, playlist_id, revalidate=False):
+        """Returns (snapshot_id, error)."""
+        snapshot_id = None if revalidate else library.known_snapshot(self.request.user, playlist, playlist_id)
+        if snapshot_id is None:
+            data = self.spotify_request(f'/playlists/{playlist_id}', {'fields': 'snapshot_id'})
+            if 'error' in data:
+                return None, data
+            snapshot_id = data.get('snapshot_id')
+            playlist_cache.remember_snapshots(self.request.user.spotify_id, [{'id': playlist_id, 'snapshot_id': snapshot_id}])
+        return snapshot_id, None
+
+    def playlist_data(self, playlist, playlist_id, snapshot_id):
+        """The full playlist, from the mirror when it has it. Returns (data, error)."""
+        if playlist:
+            if playlist.tracks_snapshot_id != snapshot_id:
+                items, error = playlist_cache.load_tracks(self.spotify_request, playlist_id)
+                if error:
+                    return None, error
+                library.store_tracks(playlist, items, snapshot_id)
+            return library.playlist_detail(playlist), None
+
+        playlist_data = playlist_cache.get_cached_playlist(playlist_id, snapshot_id)
+        if playlist_data is None:
+            playlist_data = playlist_cache.load_playlist(self.spotify_request, playlist_id)
+            if 'error' in playlist_data:
+                return None, playlist_data
+            playlist_cache.store_playlist(self.request.user.spotify_id, playlist_data)
+        return playlist_data, None
+
+    def etag(self, playlist, playlist_id, snapshot_id):
+        # Each source and each ?fields= selection is a different representation.
+        variant = f"{library.ETAG_VARIANT if playlist else ''}:{self.request.query_params.get('fields', '')}"
+        return playlist_cache.playlist_etag(playlist_id, snapshot_id, variant)
+
+    def get(self, request, playlist_id):
+        try:
+            playlist = library.find_playlist(request.user, playlist_id)
+            snapshot_id, error = self.current_snapshot(playlist, playlist_id, revalidate='If-None-Match' in request.headers)
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+
+            etag = self.etag(playlist, playlist_id, snapshot_id)
+            if playlist_cache.etag_matches(request, etag):
+                return playlist_cache.not_modified(etag)
+
+            playlist_data, error = self.playlist_data(playlist, playlist_id, snapshot_id)
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+            etag = self.etag(playlist, playlist_id, playlist_data.get('snapshot_id') or snapshot_id)
+        except Exception as e:
+            print("Spotify API error:", e)
+            return Response({'error': 'Failed to fetch from Spotify'}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response(playlist_data, status=status.HTTP_200_OK, headers=playlist_cache.cache_headers(etag))
+
+
+def playlist_genres(tracks, artists_by_id):
+    return {
+        'genres': artists.genre_breakdown(tracks, artists_by_id),
+        'tracks': [{'id': track.get('id'), 'genres': artists.track_genres(track, artists_by_id)} for track in tracks],
+    }
+
+
+class PlaylistGenresView(PlaylistDetailView):
+    """
+    Genre breakdown of a playlist, from the genres of every artist on its
+    tracks, plus each track's own genres. Artists are resolved 50 per call.
+    """
     def get(self, request, playlist_id):
         try:
-            playlist_data = self.spotify_request(f'/playlists/{playlist_id}')
+            playlist = library.find_playlist(request.user, playlist_id)
+            snapshot_id, error = self.current_snapshot(playlist, playlist_id)
+            if not error:
+                playlist_data, error = self.playlist_data(playlist, playlist_id, snapshot_id)
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+
+            tracks = [item['track'] for item in playlist_data['tracks']['items'] if item.get('track')]
+            artists_by_id, error = artists.resolve_artists(self.spotify_request, artists.artist_ids(tracks))
+            if error:
+                return Response(error, status=error.get('status_code', 502))
         except Exception as e:
             print("Spotify API error:", e)
             return Response({'error': 'Failed to fetch from Spotify'}, status=status.HTTP_502_BAD_GATEWAY)
-        return Response(playlist_data, status=status.HTTP_200_OK)
-    
\ No newline at end of file
+        return Response(playlist_genres(tracks, artists_by_id))
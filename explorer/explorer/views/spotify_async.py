@@ -0,0 +1,166 @@
+"""
+Async versions of the views in `views/spotify.py`.
+
+Routed instead of the sync views when `SPOTIFY_ASYNC_VIEWS` is enabled and
+the app is served through `explorer.asgi`. Upstream calls go through the
+per-loop `AsyncSpotifyClient`, so a worker waiting on Spotify does not hold
+a thread.
+"""
+import json
+
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from ..spotify.pagination import acollect_items, aiter_pages
+from ..spotify import analytics, artists, library
+from ..spotify import playlists as playlist_cache
+from ..spotify.projections import project_playlist
+from ..spotify.tokens import arequest_as
+from . import spotify
+
+
+class AsyncSpotifyAPIView(AsyncAPIView, spotify.SpotifyAPIView):
+    """`SpotifyAPIView` with an awaitable `spotify_request`."""
+
+    async def spotify_request(self, endpoint, params=None, cache=False):
+        return await arequest_as(self.request.user, endpoint, params=params, cache=cache)
+
+
+class SnapshotView(AsyncSpotifyAPIView):
+    async def get(self, request, *args, **kwargs):
+        bundle, error = await analytics.aget_bundle(request.user, self.spotify_request)
+        if error:
+            return Response(error, status=error.get('status_code', 502))
+        return Response(bundle['snapshot'])
+
+
+class TopBundleView(AsyncSpotifyAPIView):
+    async def get(self, request, *args, **kwargs):
+        bundle, error = await analytics.aget_bundle(request.user, self.spotify_request)
+        if error:
+            return Response(error, status=error.get('status_code', 502))
+        return Response(bundle)
+
+
+class TopItemsBaseView(AsyncSpotifyAPIView, spotify.TopItemsBaseView):
+    async def get(self, request, *args, **kwargs):
+        bundle, error = await analytics.aget_bundle(request.user, self.spotify_request)
+        if error:
+            return Response(error, status=error.get('status_code', 502))
+        return Response(bundle[self.get_time_range()][self.get_section()])
+
+
+class TopTracksView(TopItemsBaseView):
+    section = 'tracks'
+
+
+class TopArtistsView(TopItemsBaseView):
+    section = 'artists'
+
+
+class TopGenresView(TopItemsBaseView, spotify.TopGenresView):
+    pass
+
+
+class TopAlbumsView(TopItemsBaseView):
+    section = 'albums'
+
+
+class PlaylistsView(AsyncSpotifyAPIView):
+    """View to get all of a user's playlists; see `spotify.PlaylistsView`."""
+    async def get(self, request, *args, **kwargs):
+        if request.query_params.get('stream'):
+            pages = aiter_pages(self.spotify_request, '/me/playlists')
+            return StreamingHttpResponse(self.stream_playlists(pages), content_type='application/x-ndjson')
+
+        if request.query_params.get('refresh') or not library.is_fresh(request.user):
+            playlists, error = await acollect_items(aiter_pages(self.spotify_request, '/me/playlists'))
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+            await sync_to_async(library.store_playlists)(request.user, playlists)
+        return Response(await sync_to_async(library.list_playlists)(request.user))
+
+    async def stream_playlists(self, pages):
+        async for page in pages:
+            if 'error' in page:
+                yield json.dumps(page) + '\n'
+                return
+            items = page.get('items', [])
+            await sync_to_async(playlist_cache.remember_snapshots)(self.request.user.spotify_id, items)
+            yield ''.join(json.dumps(project_playlist(item)) + '\n' for item in items)
+
+
+class PlaylistDetailView(AsyncSpotifyAPIView, spotify.PlaylistDetailView):
+    async def current_snapshot(self, playlist, playlist_id, revalidate=False):
+        snapshot_id = None
+        if not revalidate:
+            snapshot_id = await sync_to_async(library.known_snapshot)(self.request.user, playlist, playlist_id)
+        if snapshot_id is None:
+            data = await self.spotify_request(f'/playlists/{playlist_id}', {'fields': 'snapshot_id'})
+            if 'error' in data:
+                return None, data
+            snapshot_id = data.get('snapshot_id')
+            await sync_to_async(playlist_cache.remember_snapshots)(
+                self.request.user.spotify_id, [{'id': playlist_id, 'snapshot_id': snapshot_id}],
+            )
+        return snapshot_id, None
+
+    async def playlist_data(self, playlist, playlist_id, snapshot_id):
+        if playlist:
+            if playlist.tracks_snapshot_id != snapshot_id:
+                items, error = await playlist_cache.aload_tracks(self.spotify_request, playlist_id)
+                if error:
+                    return None, error
+                await sync_to_async(library.store_tracks)(playlist, items, snapshot_id)
+            return await sync_to_async(library.playlist_detail)(playlist), None
+
+        playlist_data = await sync_to_async(playlist_cache.get_cached_playlist)(playlist_id, snapshot_id)
+        if playlist_data is None:
+            playlist_data = await playlist_cache.aload_playlist(self.spotify_request, playlist_id)
+            if 'error' in playlist_data:
+                return None, playlist_data
+            await sync_to_async(playlist_cache.store_playlist)(self.request.user.spotify_id, playlist_data)
+        return playlist_data, None
+
+    async def get(self, request, playlist_id):
+        try:
+            playlist = await sync_to_async(library.find_playlist)(request.user, playlist_id)
+            snapshot_id, error = await self.current_snapshot(playlist, playlist_id, revalidate='If-None-Match' in request.headers)
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+
+            etag = self.etag(playlist, playlist_id, snapshot_id)
+            if playlist_cache.etag_matches(request, etag):
+                return playlist_cache.not_modified(etag)
+
+            playlist_data, error = await self.playlist_data(playlist, playlist_id, snapshot_id)
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+            etag = self.etag(playlist, playlist_id, playlist_data.get('snapshot_id') or snapshot_id)
+        except Exception as e:
+            print("Spotify API error:", e)
+            return Response({'error': 'Failed to fetch from Spotify'}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response(playlist_data, status=status.HTTP_200_OK, headers=playlist_cache.cache_headers(etag))
+
+
+class PlaylistGenresView(PlaylistDetailView):
+    async def get(self, request, playlist_id):
+        try:
+            playlist = await sync_to_async(library.find_playlist)(request.user, playlist_id)
+            snapshot_id, error = await self.current_snapshot(playlist, playlist_id)
+            if not error:
+                playlist_data, error = await self.playlist_data(playlist, playlist_id, snapshot_id)
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+
+            tracks = [item['track'] for item in playlist_data['tracks']['items'] if item.get('track')]
+            artists_by_id, error = await artists.aresolve_artists(self.spotify_request, artists.artist_ids(tracks))
+            if error:
+                return Response(error, status=error.get('status_code', 502))
+        except Exception as e:
+            print("Spotify API error:", e)
+            return Response({'error': 'Failed to fetch from Spotify'}, status=status.HTTP_502_BAD_GATEWAY)
+        return Response(spotify.playlist_genres(tracks, artists_by_id))
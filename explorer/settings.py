@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'explorer.explorer.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.common.CommonMiddleware',
@@ -149,15 +150,157 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'explorer.explorer.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Read by explorer.explorer.middleware.CompressionMiddleware.
+    'COMPRESSION': {
+        'MIN_SIZE': int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),
+        'ENCODINGS': ['br', 'gzip'],
+        'GZIP_LEVEL': 6,
+        'BROTLI_QUALITY': int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4)),
+    },
 }
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'uniqname',
+# Shared by every worker process: view responses, the Spotify rate limiter and
+# token locks all rely on it. Without REDIS_URL we fall back to a per-process
+# LocMemCache, which is only correct for a single `runserver` process.
+REDIS_URL = os.getenv('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'explorer',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'uniqname',
+        }
     }
+
+# Shared keep-alive client for api.spotify.com / accounts.spotify.com
+# (see explorer/explorer/spotify/client.py). Timeouts are in seconds.
+SPOTIFY_HTTP = {
+    'CONNECT_TIMEOUT': float(os.getenv('SPOTIFY_CONNECT_TIMEOUT', '3.05')),
+    'READ_TIMEOUT': float(os.getenv('SPOTIFY_READ_TIMEOUT', '10')),
+    'MAX_RETRIES': int(os.getenv('SPOTIFY_MAX_RETRIES', '2')),
+    'BACKOFF_FACTOR': 0.3,
+    'POOL_CONNECTIONS': 4,
+    'POOL_MAXSIZE': int(os.getenv('SPOTIFY_POOL_MAXSIZE', '32')),
+    # Pages of one paginated listing fetched at once.
+    'PAGE_CONCURRENCY': int(os.getenv('SPOTIFY_PAGE_CONCURRENCY', '8')),
+}
+
+# Rate limit shared by every worker through the cache alias below, counted
+# with its atomic incr; it only spans processes when that alias is a
+# cross-process backend. RATE is requests/second for the whole app, BURST the
+# most sent at once, MAX_WAIT the longest a request will be delayed
+# (including Retry-After) before failing with 429.
+SPOTIFY_RATE_LIMIT = {
+    'RATE': float(os.getenv('SPOTIFY_RATE_LIMIT_RATE', '10')),
+    'BURST': int(os.getenv('SPOTIFY_RATE_LIMIT_BURST', '20')),
+    'MAX_WAIT': 30.0,
+    'MAX_THROTTLE_RETRIES': 3,
+    'CACHE_ALIAS': 'default',
+}
+
+# Raw upstream JSON shared by every view that reads the same Spotify resource,
+# keyed by (Spotify user, endpoint, params). In-process LRU; TTL in seconds.
+SPOTIFY_RESPONSE_CACHE = {
+    'TTL': 60 * 5,
+    'MAX_ENTRIES': 2048,
+}
+
+# Tracks, albums and artists are the same for everyone, so they are cached
+# once by Spotify id for all users: an in-process LRU in front of a shared
+# tier, SHARED = 'cache' (the default cache), 'database' (CatalogEntry) or
+# None (see explorer/explorer/spotify/catalog.py).
+SPOTIFY_CATALOG = {
+    'TTL': 60 * 60 * 24,
+    'MAX_ENTRIES': 20000,
+    'SHARED': os.getenv('SPOTIFY_CATALOG_SHARED', 'cache') or None,
+}
+
+# Spotify access tokens are cached per user and refreshed REFRESH_AHEAD
+# seconds before they expire (see explorer/explorer/spotify/tokens.py).
+SPOTIFY_TOKENS = {
+    'REFRESH_AHEAD': 300,
+    'LOCK_TIMEOUT': 15,
+    'CACHE_ALIAS': 'default',
+}
+
+# Playlists are mirrored into the Playlist/Track tables and served from
+# there for MAX_AGE seconds after each sync (see
+# explorer/explorer/spotify/library.py and `manage.py sync_library`).
+SPOTIFY_LIBRARY = {
+    'MAX_AGE': int(os.getenv('SPOTIFY_LIBRARY_MAX_AGE', '300')),
+    'BATCH_SIZE': 500,
+}
+
+# Top-items history: `manage.py snapshot_top_items` (run from cron) records
+# each user at most once per MIN_INTERVAL seconds, storing a full ranking
+# every KEYFRAME_INTERVAL rows and deltas in between (see
+# explorer/explorer/spotify/history.py).
+SPOTIFY_HISTORY = {
+    'KEYFRAME_INTERVAL': 30,
+    'MIN_INTERVAL': int(os.getenv('SPOTIFY_HISTORY_MIN_INTERVAL', 60 * 60 * 12)),
+}
+
+# Playlist downloads are queued in the DownloadJob table and run by
+# `manage.py download_worker` processes, each with WORKERS concurrent jobs
+# and at most MAX_JOBS_PER_USER per user across all workers (see
+# explorer/explorer/downloads/jobs.py).
+DOWNLOADS = {
+    'ROOT': os.getenv('DOWNLOADS_ROOT', BASE_DIR / 'downloads'),
+    # Finished archives are served from ROOT (resumable) until they expire.
+    'ARCHIVE_TTL': int(os.getenv('DOWNLOAD_ARCHIVE_TTL', 60 * 60 * 24)),
+    'WORKERS': int(os.getenv('DOWNLOAD_WORKERS', 4)),
+    'MAX_JOBS_PER_USER': 1,
+    'POLL_INTERVAL': 2,
+    'STALE_AFTER': 60 * 10,
+    'HEARTBEAT_INTERVAL': 30,
+    'MAX_ATTEMPTS': 3,
+    # Stage limits for the per-track pipeline, shared by a worker's jobs.
+    # Transcodes run in a process pool; None means one per core.
+    'SEARCH_CONCURRENCY': int(os.getenv('DOWNLOAD_SEARCH_CONCURRENCY', 4)),
+    'DOWNLOAD_CONCURRENCY': int(os.getenv('DOWNLOAD_CONCURRENCY', 4)),
+    'TRANSCODE_CONCURRENCY': int(os.getenv('DOWNLOAD_TRANSCODE_CONCURRENCY', 0)) or None,
+    # How many of one job's tracks may be in those pools at once.
+    'TRACKS_IN_FLIGHT': int(os.getenv('DOWNLOAD_TRACKS_IN_FLIGHT', 6)),
+    # Output format when a download doesn't ask for one (see FORMATS in
+    # explorer/explorer/downloads/transcode.py). 'opus' and 'm4a' keep
+    # YouTube's own stream and skip the re-encode.
+    'DEFAULT_FORMAT': os.getenv('DOWNLOAD_DEFAULT_FORMAT', 'mp3-192k'),
+    # Tracks are searched for on YouTube once and the match kept; a search
+    # that found nothing is retried after MATCH_MISS_TTL seconds.
+    'MATCH_MISS_TTL': int(os.getenv('DOWNLOAD_MATCH_MISS_TTL', 60 * 60 * 24 * 7)),
+    'FFMPEG': os.getenv('FFMPEG', 'ffmpeg'),
+    # Lifetime of the per-job tokens in download links, which can't carry
+    # the JWT.
+    'TOKEN_TTL': int(os.getenv('DOWNLOAD_TOKEN_TTL', 60 * 60)),
 }
 
+# Finished tracks are kept in a content-addressed cache shared by every job,
+# keyed by Spotify track id and output format, and evicted least recently
+# used first once it grows past QUOTA bytes (see
+# explorer/explorer/downloads/cache.py). Kept outside DOWNLOADS['ROOT'],
+# whose contents expire with the archives.
+AUDIO_CACHE = {
+    'ROOT': os.getenv('AUDIO_CACHE_ROOT', BASE_DIR / 'audio-cache'),
+    'QUOTA': int(os.getenv('AUDIO_CACHE_QUOTA', 10 * 1024 ** 3)),
+}
+
+# Route /api/spotify/* to the async views in views/spotify_async.py. Only
+# enable this when serving through an ASGI server, e.g.
+#   uvicorn explorer.asgi:application
+SPOTIFY_ASYNC_VIEWS = os.getenv('SPOTIFY_ASYNC_VIEWS', '0') == '1'
+
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
 
 AUTH_USER_MODEL = 'explorer.SpotifyUser'
@@ -1,8 +1,9 @@
+from django.conf import settings
 from django.urls import path, include
 from explorer.explorer.models import SpotifyUser
 from django.contrib import admin
 from rest_framework import routers, serializers, viewsets
-from explorer.explorer.views import auth, user, spotify, download
+from explorer.explorer.views import auth, user, spotify, spotify_async, download, metrics
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -23,6 +24,9 @@ class UserViewSet(viewsets.ModelViewSet):
 router = routers.DefaultRouter()
 router.register(r'users', UserViewSet)
 
+# Async views only pay off under an ASGI server (see explorer/asgi.py).
+spotify_views = spotify_async if settings.SPOTIFY_ASYNC_VIEWS else spotify
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
@@ -32,16 +36,23 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     path('api/me/', user.MeView.as_view(), name='me'),
-
-    path('api/spotify/snapshot/', spotify.SnapshotView.as_view(), name='spotify_snapshot'),
-    path('api/spotify/top-tracks/', spotify.TopTracksView.as_view(), name='spotify_top_tracks'),
-    path('api/spotify/top-artists/', spotify.TopArtistsView.as_view(), name='spotify_top_artists'),
-    path('api/spotify/top-albums/', spotify.TopAlbumsView.as_view(), name='spotify_top_albums'),
-    path('api/spotify/top-genres/', spotify.TopGenresView.as_view(), name='spotify_top_genres'),
-    path('api/spotify/playlists/', spotify.PlaylistsView.as_view(), name='spotify_playlists'),
-    path('api/spotify/playlists/<str:playlist_id>/', spotify.PlaylistDetailView.as_view()),
+    path('api/metrics/spotify/', metrics.SpotifyMetricsView.as_view(), name='spotify_metrics'),
+
+    path('api/spotify/snapshot/', spotify_views.SnapshotView.as_view(), name='spotify_snapshot'),
+    path('api/spotify/top/', spotify_views.TopBundleView.as_view(), name='spotify_top_bundle'),
+    path('api/spotify/top-tracks/', spotify_views.TopTracksView.as_view(), name='spotify_top_tracks'),
+    path('api/spotify/top-artists/', spotify_views.TopArtistsView.as_view(), name='spotify_top_artists'),
+    path('api/spotify/top-albums/', spotify_views.TopAlbumsView.as_view(), name='spotify_top_albums'),
+    path('api/spotify/top-genres/', spotify_views.TopGenresView.as_view(), name='spotify_top_genres'),
+    # Database-only, so the sync view serves both modes.
+    path('api/spotify/top-history/<str:kind>/', spotify.TopHistoryView.as_view(), name='spotify_top_history'),
+    path('api/spotify/playlists/', spotify_views.PlaylistsView.as_view(), name='spotify_playlists'),
+    path('api/spotify/playlists/<str:playlist_id>/', spotify_views.PlaylistDetailView.as_view()),
+    path('api/spotify/playlists/<str:playlist_id>/genres/', spotify_views.PlaylistGenresView.as_view(), name='spotify_playlist_genres'),
 
     path('api/download/playlist/<str:playlist_id>/', download.DownloadPlaylist.as_view(), name='download-playlist'),
+    path('api/download/formats/', download.DownloadFormats.as_view(), name='download-formats'),
     path('api/download/status/<str:task_id>/', download.DownloadStatus.as_view(), name='download-status'),
     path('api/download/retrieve/<str:task_id>/', download.GetDownload.as_view(), name='get-download'),
+    path('api/download/events/<str:task_id>/', download.download_events, name='download-events'),
 ]
\ No newline at end of file
@@ -3,9 +3,13 @@ import { useParams } from "react-router-dom";
 import { fetchPlaylist } from "../services/spotifyService";
 import {
 	startDownloadPlaylist,
+	getDownloadFormats,
 	getDownloadStatus,
-	getDownloadedFile,
+	saveDownloadedFile,
+	openDownloadEvents,
+	DOWNLOAD_FORMATS,
 } from "../services/youtubeService";
+import type { DownloadFormat, RemovedTrack } from "../services/youtubeService";
 import type { Playlist } from "../types/spotify";
 
 export default function DownloadPage() {
@@ -15,9 +19,17 @@ export default function DownloadPage() {
 	const [error, setError] = useState<string | null>(null);
 
 	const [taskId, setTaskId] = useState<string | null>(null);
+	const [jobToken, setJobToken] = useState<string | null>(null);
 	const [downloadStatus, setDownloadStatus] = useState<string | null>(null);
 	const [downloadProgress, setDownloadProgress] = useState(0);
 	const [totalTracks, setTotalTracks] = useState(0);
+	// Null until the server says which format it defaults to.
+	const [format, setFormat] = useState<DownloadFormat | null>(null);
+	const [onlyNew, setOnlyNew] = useState(false);
+	const [saveWhileDownloading, setSaveWhileDownloading] = useState(false);
+	const [streaming, setStreaming] = useState(false);
+	const [notice, setNotice] = useState<string | null>(null);
+	const [removedTracks, setRemovedTracks] = useState<RemovedTrack[]>([]);
 
 	useEffect(() => {
 		if (!playlistId) return;
@@ -37,31 +49,19 @@ export default function DownloadPage() {
 		fetchPlaylistData();
 	}, [playlistId]);
 
+	useEffect(() => {
+		getDownloadFormats()
+			.then((data) => setFormat((current) => current ?? data.default))
+			.catch((err) => console.error("Failed to fetch download formats:", err));
+	}, []);
+
 	useEffect(() => {
 		if (!taskId) return;
 
 		const pollStatus = async () => {
 			try {
 				const statusData = await getDownloadStatus(taskId);
-				setDownloadStatus(statusData.status);
-				setDownloadProgress(statusData.completed);
-				setTotalTracks(statusData.total);
-
-				if (statusData.status === "COMPLETED") {
-					const response = await getDownloadedFile(taskId);
-					const blob = new Blob([response.data], { type: "application/zip" });
-					const url = window.URL.createObjectURL(blob);
-					const a = document.createElement("a");
-					a.href = url;
-					a.download = `${playlist?.name || "playlist"}.zip`;
-					document.body.appendChild(a);
-					a.click();
-					a.remove();
-					setTaskId(null); // Reset task ID after completion
-				} else if (statusData.status === "FAILED") {
-					setError("Download failed. Please try again.");
-					setTaskId(null);
-				}
+				await handleStatus(statusData);
 			} catch (err) {
 				console.error("Failed to get download status:", err);
 				setError("Failed to get download status.");
@@ -69,16 +69,76 @@ export default function DownloadPage() {
 			}
 		};
 
-		const interval = setInterval(pollStatus, 3000);
-		return () => clearInterval(interval);
-	}, [taskId, playlist?.name]);
+		const handleStatus = async (statusData: { status: string; completed: number; total: number; token: string }) => {
+			setDownloadStatus(statusData.status);
+			setDownloadProgress(statusData.completed);
+			setTotalTracks(statusData.total);
+
+			if (statusData.status === "COMPLETED") {
+				// A streaming download is already being saved.
+				if (!streaming) saveDownloadedFile(taskId, statusData.token);
+				setTaskId(null); // Reset task ID after completion
+			} else if (statusData.status === "FAILED") {
+				setError("Download failed. Please try again.");
+				setTaskId(null);
+			} else if (statusData.status === "EXPIRED") {
+				setError("This download has expired. Please start it again.");
+				setTaskId(null);
+			}
+		};
+
+		// Progress is pushed over Server-Sent Events; if they aren't available
+		// (the server refuses them outside ASGI) or the connection drops, fall
+		// back to polling every 3 seconds.
+		let interval: ReturnType<typeof setInterval> | null = null;
+		const startPolling = () => {
+			if (!interval) interval = setInterval(pollStatus, 3000);
+		};
+
+		const events = jobToken ? openDownloadEvents(taskId, jobToken) : null;
+		if (events) {
+			const onProgress = (e: MessageEvent) => {
+				const data = JSON.parse(e.data);
+				setDownloadProgress(data.completed);
+				setTotalTracks(data.total);
+				if (data.status) setDownloadStatus(data.status);
+			};
+			events.addEventListener("status", onProgress);
+			events.addEventListener("track", onProgress);
+			events.addEventListener("done", () => {
+				events.close();
+				pollStatus(); // the final state, and the file if it completed
+			});
+			events.onerror = () => {
+				events.close();
+				startPolling();
+			};
+		} else {
+			startPolling();
+		}
+
+		return () => {
+			events?.close();
+			if (interval) clearInterval(interval);
+		};
+	}, [taskId, jobToken, streaming]);
 
 	const startDownload = async () => {
 		if (!playlistId) return;
 		setError(null);
+		setNotice(null);
 		setDownloadStatus("PENDING");
 		try {
-			const taskData = await startDownloadPlaylist(playlistId);
+			const taskData = await startDownloadPlaylist(playlistId, format ?? undefined, onlyNew, saveWhileDownloading);
+			setRemovedTracks(taskData.removed ?? []);
+			if (!taskData.task_id || !taskData.token) {
+				setNotice(taskData.message);
+				setDownloadStatus(null);
+				return;
+			}
+			setStreaming(!!taskData.stream);
+			setJobToken(taskData.token);
+			if (taskData.stream) saveDownloadedFile(taskData.task_id, taskData.token);
 			setTaskId(taskData.task_id);
 		} catch (err) {
 			console.error("Failed to start download:", err);
@@ -91,7 +151,7 @@ export default function DownloadPage() {
 	if (error) return <div>Error: {error}</div>;
 	if (!playlist) return <div>No playlist found.</div>;
 
-	const isDownloading = downloadStatus && !['COMPLETED', 'FAILED'].includes(downloadStatus);
+	const isDownloading = downloadStatus && !['COMPLETED', 'FAILED', 'EXPIRED'].includes(downloadStatus);
 
 	return (
 		<div className="p-8 bg-black text-white min-h-screen">
@@ -99,6 +159,40 @@ export default function DownloadPage() {
 				<div className="mb-8 flex flex-row justify-between items-center">
 					<h1 className="text-4xl font-bold mb-2">{playlist.name}</h1>
 					<div className="flex flex-col items-end">
+						<select
+							value={format ?? ""}
+							onChange={(e) => setFormat(e.target.value as DownloadFormat)}
+							disabled={!!isDownloading}
+							className="bg-gray-900 border border-green-400 rounded px-3 py-2 mb-2"
+						>
+							{format === null && <option value="">Default format</option>}
+							{DOWNLOAD_FORMATS.map((option) => (
+								<option key={option.value} value={option.value}>
+									{option.label}
+								</option>
+							))}
+						</select>
+						<p className="text-xs text-gray-400 mb-2">
+							{DOWNLOAD_FORMATS.find((option) => option.value === format)?.note}
+						</p>
+						<label className="text-sm text-gray-300 mb-2 flex items-center gap-2">
+							<input
+								type="checkbox"
+								checked={onlyNew}
+								onChange={(e) => setOnlyNew(e.target.checked)}
+								disabled={!!isDownloading}
+							/>
+							Only tracks added since my last download
+						</label>
+						<label className="text-sm text-gray-300 mb-2 flex items-center gap-2">
+							<input
+								type="checkbox"
+								checked={saveWhileDownloading}
+								onChange={(e) => setSaveWhileDownloading(e.target.checked)}
+								disabled={!!isDownloading}
+							/>
+							Start saving the zip right away
+						</label>
 						<button
 							onClick={startDownload}
 							disabled={!!isDownloading}
@@ -111,9 +205,23 @@ export default function DownloadPage() {
 								{downloadProgress} of {totalTracks} tracks downloaded.
 							</p>
 						)}
+						{notice && <p className="text-sm text-gray-400 mt-2">{notice}</p>}
 					</div>
 				</div>
 
+				{removedTracks.length > 0 && (
+					<div className="mt-4 text-sm text-gray-400">
+						<p className="text-green-400 mb-1">Removed from the playlist since your last download:</p>
+						<ul>
+							{removedTracks.map((track) => (
+								<li key={track.id}>
+									{track.name} - {track.artists.join(", ")}
+								</li>
+							))}
+						</ul>
+					</div>
+				)}
+
 				<div className="mt-8 border-2 border-green-400 rounded-xl p-2">
 					<div className="grid grid-cols-12 gap-2 text-green-400 border-b border-green-400 px-2 pb-2 mb-2">
 						<div className="col-span-1">#</div>
@@ -123,7 +231,7 @@ export default function DownloadPage() {
 
 					{playlist.tracks.items.map((item, index) => (
 						<div
-							key={item.track.id}
+							key={index}
 							className="grid grid-cols-12 gap-2 items-center p-2 rounded-lg"
 						>
 							<div className="col-span-1 text-gray-300">{index + 1}</div>
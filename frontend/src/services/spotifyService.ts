@@ -6,7 +6,10 @@ import type {
 	TopAlbum,
 	Genre,
 	SnapshotData,
+	TopBundle,
 	Playlist,
+	PlaylistGenres,
+	TopHistory,
 } from "../types/spotify";
 
 export const fetchUserProfile = async (): Promise<UserProfile> => {
@@ -21,6 +24,12 @@ export const fetchSnapshotData = async (): Promise<SnapshotData> => {
 
 type TimeRange = "short_term" | "medium_term" | "long_term";
 
+// Every time range in one response; prefer this over one call per range.
+export const fetchTopBundle = async (): Promise<TopBundle> => {
+	const response = await api.get("/spotify/top/");
+	return response.data;
+};
+
 export const fetchTopTracks = async (
 	timeRange: TimeRange
 ): Promise<TopTrack[]> => {
@@ -67,3 +76,21 @@ export const fetchPlaylist = async (playlistId: string): Promise<Playlist> => {
 	return response.data;
 };
 
+export const fetchPlaylistGenres = async (
+	playlistId: string
+): Promise<PlaylistGenres> => {
+	const response = await api.get(`/spotify/playlists/${playlistId}/genres/`);
+	return response.data;
+};
+
+// Rank over time from recorded snapshots; never hits Spotify.
+export const fetchTopHistory = async (
+	kind: TopHistory["kind"],
+	timeRange: TimeRange,
+	days = 90
+): Promise<TopHistory> => {
+	const response = await api.get(`/spotify/top-history/${kind}/`, {
+		params: { time_range: timeRange, days },
+	});
+	return response.data;
+};
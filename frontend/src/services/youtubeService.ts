@@ -1,8 +1,54 @@
 import { api } from "./authService";
 
-export const startDownloadPlaylist = async (playlistId: string) => {
-  const response = await api.post(`/download/playlist/${playlistId}/`);
-  return response.data;
+// Output formats offered by the download worker (downloads/transcode.py).
+// Opus and M4A keep YouTube's own audio stream and only change its container;
+// MP3s are re-encoded, which is most of a download's CPU time.
+export const DOWNLOAD_FORMATS = [
+  { value: "opus", label: "Opus (original)", note: "Usually no re-encode: fastest, lowest CPU, original quality." },
+  { value: "m4a", label: "M4A / AAC (original)", note: "Usually no re-encode: fastest, lowest CPU, plays on Apple devices." },
+  { value: "mp3-128k", label: "MP3 128 kbps", note: "Re-encoded: several times the CPU and slower, smallest files." },
+  { value: "mp3-192k", label: "MP3 192 kbps", note: "Re-encoded: several times the CPU and slower, plays anywhere." },
+  { value: "mp3-320k", label: "MP3 320 kbps", note: "Re-encoded: several times the CPU and slower, largest files." },
+] as const;
+
+export type DownloadFormat = (typeof DOWNLOAD_FORMATS)[number]["value"];
+
+// The formats the server offers and the one it uses when none is asked for
+// (DOWNLOADS['DEFAULT_FORMAT']).
+export const getDownloadFormats = async () => {
+  const response = await api.get("/download/formats/");
+  return response.data as { formats: DownloadFormat[]; default: DownloadFormat };
+};
+
+export interface RemovedTrack {
+  id: string;
+  name: string;
+  artists: string[];
+}
+
+// `delta`: only tracks not delivered by an earlier download. The response has
+// no task_id when nothing was added; `removed` lists delivered tracks since
+// taken off the playlist. `stream`: the zip can be saved right away and grows
+// as tracks finish. `token` authorizes the job's download link.
+export const startDownloadPlaylist = async (
+  playlistId: string,
+  format?: DownloadFormat,
+  delta = false,
+  stream = false,
+) => {
+  const response = await api.post(
+    `/download/playlist/${playlistId}/`,
+    { ...(format ? { format } : {}), delta },
+    { params: stream ? { stream: 1 } : {} },
+  );
+  return response.data as {
+    task_id?: string;
+    token?: string;
+    message: string;
+    stream?: boolean;
+    delta: boolean;
+    removed: RemovedTrack[];
+  };
 };
 
 export const getDownloadStatus = async (taskId: string) => {
@@ -10,7 +56,21 @@ export const getDownloadStatus = async (taskId: string) => {
   return response.data;
 };
 
-export const getDownloadedFile = async (taskId: string) => {
-  const response = await api.get(`/download/retrieve/${taskId}/`, { responseType: 'blob' });
-  return response;
+// Hands the download to the browser rather than buffering it in a blob, so a
+// streaming zip is saved as it arrives and an interrupted one can resume.
+// A link can't carry the Authorization header; the job's token stands in.
+export const saveDownloadedFile = (taskId: string, token: string) => {
+  const a = document.createElement("a");
+  a.href = `${api.defaults.baseURL}/download/retrieve/${taskId}/?token=${encodeURIComponent(token)}`;
+  document.body.appendChild(a);
+  a.click();
+  a.remove();
+};
+
+// Server-Sent Events for a download's progress. EventSource can't send an
+// Authorization header, so the job's own short-lived token (from
+// startDownloadPlaylist) goes in the query string instead.
+export const openDownloadEvents = (taskId: string, token: string): EventSource | null => {
+  if (typeof EventSource === "undefined") return null;
+  return new EventSource(`${api.defaults.baseURL}/download/events/${taskId}/?token=${encodeURIComponent(token)}`);
 };
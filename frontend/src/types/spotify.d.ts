@@ -72,3 +72,37 @@ export interface SnapshotData {
     top_genres: string[];
     top_albums: TopAlbum[];
 }
+
+export interface TopItems {
+    tracks: TopTrack[];
+    artists: TopArtist[];
+    genres: Genre[];
+    track_genres: Genre[];
+    albums: TopAlbum[];
+}
+
+export interface TopBundle {
+    short_term: TopItems;
+    medium_term: TopItems;
+    long_term: TopItems;
+    snapshot: SnapshotData;
+}
+
+export interface PlaylistGenres {
+    genres: Genre[];
+    tracks: { id: string; genres: string[] }[];
+}
+
+export interface TopHistorySeries {
+    id: string;
+    ranks: (number | null)[];
+    counts?: (number | null)[];
+}
+
+export interface TopHistory {
+    kind: "tracks" | "artists" | "genres";
+    time_range: string;
+    taken_at: string[];
+    series: TopHistorySeries[];
+    objects?: Record<string, TopTrack | TopArtist>;
+}
@@ -6,16 +6,26 @@ set -e
 # Activate virtualenv
 source venv/bin/activate
 
-# Start Django backend in the background
+# Start Django backend in the background. The async Spotify views need an
+# ASGI server, so serve through uvicorn when they are enabled.
 echo "Starting Django backend..."
-python manage.py runserver &
+if [ "$SPOTIFY_ASYNC_VIEWS" = "1" ]; then
+  uvicorn explorer.asgi:application --port 8000 &
+else
+  python manage.py runserver &
+fi
 DJANGO_PID=$!
 
+# Playlist downloads run in a separate worker process.
+echo "Starting download worker..."
+python manage.py download_worker &
+WORKER_PID=$!
+
 # Trap SIGINT (Ctrl+C) and SIGTERM to clean up background processes
 cleanup() {
   echo "Shutting down..."
-  kill $DJANGO_PID
-  wait $DJANGO_PID 2>/dev/null
+  kill $DJANGO_PID $WORKER_PID
+  wait $DJANGO_PID $WORKER_PID 2>/dev/null
   exit
 }
 trap cleanup SIGINT SIGTERM